@@ -3,24 +3,18 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from ..models.user import User, UserType
-from ..core.database import get_db
+from ..core.database import run_in_db
 from ..core.logger import logger
 from pydantic import BaseModel
 from typing import Optional
 from ..core.config import settings
+from ..core.security import hash_password, verify_password
+from ..core.token_cache import decode_token
+from ..core.user_cache import user_cache
 
 router = APIRouter()
 
-# 密码加密配置
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-    bcrypt__rounds=12,
-    bcrypt__ident="2b"
-)
-
 # OAuth2 配置
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -32,41 +26,54 @@ class UserRegister(BaseModel):
     role: UserType
     age: Optional[int] = None
 
+# 以下同步函数通过 run_in_db 在数据库线程池中执行
+def _get_user_by_username(db: Session, username: str) -> Optional[User]:
+    return db.query(User).filter(User.username == username).first()
+
+def _check_user_available(db: Session, username: str, email: str) -> None:
+    # 检查用户名是否已存在
+    if db.query(User).filter(User.username == username).first():
+        logger.error(f"Username already exists: {username}")
+        raise HTTPException(
+            status_code=400,
+            detail="Brukernavnet er allerede i bruk"
+        )
+        
+    # 检查邮箱是否已存在
+    if db.query(User).filter(User.email == email).first():
+        logger.error(f"Email already exists: {email}")
+        raise HTTPException(
+            status_code=400,
+            detail="E-postadressen er allerede i bruk"
+        )
+
+def _create_user(db: Session, user_data: "UserRegister", hashed_password: str) -> None:
+    user = User(
+        username=user_data.username,
+        email=user_data.email,
+        hashed_password=hashed_password,
+        role=user_data.role,
+        age=user_data.age
+    )
+    db.add(user)
+    db.commit()
+
+def _update_password_hash(db: Session, user_id: int, hashed_password: str) -> None:
+    db.query(User).filter(User.id == user_id).update({User.hashed_password: hashed_password})
+    db.commit()
+
 # 用户注册
 @router.post("/auth/register", status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister):
     try:
         logger.debug(f"Registration attempt for user: {user_data.username}")
         
-        # 检查用户名是否已存在
-        if db.query(User).filter(User.username == user_data.username).first():
-            logger.error(f"Username already exists: {user_data.username}")
-            raise HTTPException(
-                status_code=400,
-                detail="Brukernavnet er allerede i bruk"
-            )
-            
-        # 检查邮箱是否已存在
-        if db.query(User).filter(User.email == user_data.email).first():
-            logger.error(f"Email already exists: {user_data.email}")
-            raise HTTPException(
-                status_code=400,
-                detail="E-postadressen er allerede i bruk"
-            )
+        await run_in_db(_check_user_available, user_data.username, user_data.email)
             
         # 创建新用户
-        hashed_password = pwd_context.hash(user_data.password)
-        user = User(
-            username=user_data.username,
-            email=user_data.email,
-            hashed_password=hashed_password,
-            role=user_data.role,
-            age=user_data.age
-        )
-        
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        hashed_password = await hash_password(user_data.password)
+        await run_in_db(_create_user, user_data, hashed_password)
+        user_cache.invalidate(user_data.username)
         
         logger.debug(f"Registration successful for user: {user_data.username}")
         return {"message": "Registrering vellykket"}
@@ -84,15 +91,14 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
 @router.post("/auth/login")
 async def login(
     request: Request,
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends()
 ):
     try:
         logger.debug(f"Login attempt from: {form_data.username}")
         logger.debug(f"Request headers: {request.headers}")
         
         # 查找用户
-        user = db.query(User).filter(User.username == form_data.username).first()
+        user = await run_in_db(_get_user_by_username, form_data.username)
         if not user:
             logger.error(f"User not found: {form_data.username}")
             raise HTTPException(
@@ -102,7 +108,8 @@ async def login(
             )
             
         # 验证密码
-        if not pwd_context.verify(form_data.password, user.hashed_password):
+        valid, new_hash = await verify_password(form_data.password, user.hashed_password)
+        if not valid:
             logger.error(f"Invalid password for user: {form_data.username}")
             raise HTTPException(
                 status_code=401,
@@ -110,6 +117,12 @@ async def login(
                 headers={"WWW-Authenticate": "Bearer"},
             )
             
+        # 成本设置变化后，用新设置重新保存哈希
+        if new_hash:
+            await run_in_db(_update_password_hash, user.id, new_hash)
+            user_cache.invalidate(user.username)
+            logger.info(f"Rehashed password for user: {form_data.username}")
+            
         # 生成访问令牌
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
@@ -155,30 +168,42 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 # 获取当前用户
 async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    request: Request,
+    token: str = Depends(oauth2_scheme)
 ):
     credentials_exception = HTTPException(
         status_code=401,
         detail="Kunne ikke validere legitimasjon",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(
-            token, 
-            settings.SECRET_KEY, 
-            algorithms=[settings.ALGORITHM]
-        )
-        username: str = payload.get("sub")
-        if username is None:
+    # AuthMiddleware 已验证过令牌时直接使用其结果，避免重复解码
+    payload = getattr(request.state, "user", None)
+    if payload is None:
+        try:
+            payload = decode_token(token)
+        except JWTError as e:
+            logger.error(f"Token validation error: {e}")
             raise credentials_exception
-    except JWTError as e:
-        logger.error(f"Token validation error: {e}")
+            
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
         
-    user = db.query(User).filter(User.username == username).first()
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+        
+    user = await run_in_db(_get_user_by_username, username)
     if user is None:
         logger.error(f"User not found: {username}")
         raise credentials_exception
         
-    return user 
\ No newline at end of file
+    # 会话关闭后对象已分离，可以安全地跨请求共享
+    user_cache.set(user)
+    return user 
+
+# 仅管理员可访问的接口
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+    if current_user.role != UserType.ADMIN:
+        raise HTTPException(status_code=403, detail="Kun administratorer har tilgang")
+    return current_user
@@ -1,14 +1,29 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Union
 import random
-from ..core.grok_client import grok_client
+from ..core.grok_client import grok_client, GrokUnavailableError, RequestPriority
 from ..core.logger import logger
 from ..core.config import settings
-from ..core.database import get_db
+from ..core.database import run_in_db, engine
+from ..core.word_problem_pool import WordProblemPool
+from ..core.word_problem_batcher import WordProblemBatcher
+from ..core.attempt_writer import attempt_writer
+from ..core.answers import check_answer, format_answer, make_answer_key
+from ..core.basic_problems import generate_basic_problems, get_basic_settings, get_difficulty_by_age
+from ..core.word_templates import generate_word_problem, generate_word_problems
+from ..core.progress import classify_knowledge_point
+from ..core.adaptive import skill_model
+from ..core.dedup import ProblemDeduplicator, problem_history, question_hash
+from ..core.batch_store import create_batch_store
+from ..core.explanation_cache import ExplanationCache, make_explanation_key
 import json
 import time
 import asyncio
+import csv
+import io
+import uuid
 from ..api.auth import get_current_user
 from ..models.user import User
 from sqlalchemy.orm import Session
@@ -20,9 +35,19 @@ router = APIRouter()
 class MathAnswerRequest(BaseModel):
     """数学答案请求模型"""
     problem_id: int  # 题目ID
-    answer: float    # 用户答案
+    answer: Union[float, str]  # 用户答案，可以是数字或 "3,5"、"1/2" 这样的文本
     batch_id: str    # 添加批次ID
 
+class BulkAnswerItem(BaseModel):
+    """批量提交中的单个答案"""
+    problem_id: int
+    answer: Union[float, str]
+
+class MathBulkAnswerRequest(BaseModel):
+    """批量答案请求模型"""
+    batch_id: str
+    answers: List[BulkAnswerItem]
+
 class LanguageExercise(BaseModel):
     id: int
     question: str          # 问题内容
@@ -87,9 +112,16 @@ _generation_status = {
 }
 
 # 添加批次管理
-_batch_problems = {}  # 存储每个批次的题目
+batch_store = create_batch_store()  # 存储每个批次的题目（进程内或数据库共享）
 _active_batch = None  # 当前活动批次
 
+# 应用题解释缓存（内存 LRU + 数据库）
+explanation_cache = ExplanationCache(
+    max_entries=settings.EXPLANATION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EXPLANATION_CACHE_TTL_SECONDS,
+    engine=engine if settings.EXPLANATION_CACHE_PERSIST else None
+)
+
 # 添加响应模型
 class MathProblemsResponse(BaseModel):
     batch_id: str
@@ -108,38 +140,60 @@ async def get_math_problems(
         rules_list = json.loads(rules) if rules else None
         logger.info(f"Starting get_math_problems with age={age}, count={count}, rules={rules_list}")
         
-        # 生成新的批次ID
-        batch_id = str(hash(f"{age}_{count}_{time.time()}"))
+        # 按学生能力调整出题等级；指定了规则时规则与年龄绑定，保持不变
+        if settings.ADAPTIVE_ENABLED and not rules_list:
+            level = skill_model.choose_level(current_user.id, age)
+            if level != age:
+                logger.debug(f"Adaptive level for {current_user.username}: {age} -> {level}")
+            age = level
+        weights = (
+            skill_model.operation_weights(current_user.id, age, get_basic_settings(age)[1])
+            if settings.ADAPTIVE_ENABLED else None
+        )
+        
+        # 生成新的批次ID（多进程共享存储时需要全局唯一）
+        batch_id = uuid.uuid4().hex
         logger.debug(f"Generated batch_id: {batch_id}")
         
         # 创建新的批次存储
-        _batch_problems[batch_id] = {}
+        await batch_store.create(batch_id, current_user.username)
         
         # 生成初始题目（30%）
         initial_count = max(1, int(count * 0.3))
         logger.debug(f"Will generate {initial_count} initial problems and {count - initial_count} remaining problems")
         
         initial_problems = []
+        # 批次内不重复，并避开该用户最近做过的题
+        dedup = ProblemDeduplicator(problem_history, current_user.username)
         
-        # 生成初始题目
-        for i in range(initial_count):
-            try:
-                problem_id = i + 1
-                problem = generate_basic_problem(age, problem_id)
-                problem['batch_id'] = batch_id
-                problem['id'] = problem_id
-                
-                # 保存到批次存储
-                _batch_problems[batch_id][str(problem_id)] = problem.copy()
-                initial_problems.append(problem)
-                logger.debug(f"Generated problem {problem_id}: {problem}")
-            except Exception as e:
-                logger.error(f"Error generating problem {i+1}: {e}")
+        # 一次生成所有初始基础题，多生成一倍供去重挑选
+        try:
+            candidates = generate_basic_problems(age, initial_count * 2, weights=weights)
+        except Exception as e:
+            logger.error(f"Error generating basic problems: {e}")
+            candidates = [generate_basic_problem(age, i + 1) for i in range(initial_count * 2)]
+        for problem in dedup.select(candidates, initial_count):
+            # 保存到批次存储
+            await batch_store.add_problem(batch_id, problem)
+            initial_problems.append(problem)
         
-        # 启动异步生成剩余题目
-        asyncio.create_task(
-            generate_remaining_problems(age, count - initial_count, initial_count, batch_id, rules_list)
-        )
+        # 从预生成题池中直接取应用题
+        pooled_problems = word_problem_pool.take(age, rules_list, count - initial_count, accept=dedup.claim)
+        # 题池不足时用本地模板补足首屏的应用题，其余仍由 Grok 生成（模板只支持默认规则）
+        if settings.WORD_TEMPLATES_ENABLED and rules_list is None and len(pooled_problems) < initial_count:
+            missing = min(initial_count, count - initial_count) - len(pooled_problems)
+            pooled_problems += dedup.select(generate_word_problems(age, missing * 2), missing)
+        for problem in pooled_problems:
+            await batch_store.add_problem(batch_id, problem)
+            initial_problems.append(problem)
+        
+        # 题池不足时，启动异步生成剩余题目
+        if len(initial_problems) < count:
+            asyncio.create_task(
+                generate_remaining_problems(age, count - initial_count, initial_count, batch_id, rules_list, dedup, weights)
+            )
+        else:
+            await batch_store.mark_complete(batch_id)
         
         # 确保返回的是有效的响应格式
         response = MathProblemsResponse(
@@ -147,7 +201,7 @@ async def get_math_problems(
             problems=initial_problems or []
         )
         
-        logger.info(f"Returning initial {len(initial_problems)} problems with batch_id {batch_id}")
+        logger.info(f"Returning initial {len(initial_problems)} problems ({len(pooled_problems)} from pool) with batch_id {batch_id}")
         return response
         
     except Exception as e:
@@ -162,9 +216,13 @@ async def generate_remaining_problems(
     remaining_count: int, 
     start_id: int, 
     batch_id: str,
-    rules: list = None
+    rules: list = None,
+    dedup: Optional[ProblemDeduplicator] = None,
+    weights: Optional[dict] = None
 ):
     """异步生成剩余题目"""
+    if dedup is None:
+        dedup = ProblemDeduplicator(problem_history, None)
     try:
         # 计算题目分配
         total_count = remaining_count + start_id  # 总题目数
@@ -172,66 +230,158 @@ async def generate_remaining_problems(
         word_target = total_count - basic_target  # 应用题目标数量（70%）
         
         # 计算已有的基础题和应用题数量
-        current_basic_count = sum(1 for p in _batch_problems[batch_id].values() 
-                                if p.get('type') == 'basic')
-        current_word_count = sum(1 for p in _batch_problems[batch_id].values() 
-                               if p.get('type') == 'word_problem')
+        existing_problems = await batch_store.list_problems(batch_id)
+        if existing_problems is None:
+            logger.debug(f"Batch {batch_id} was evicted before generation started")
+            return
+        current_basic_count = sum(1 for p in existing_problems if p.get('type') == 'basic')
+        current_word_count = sum(1 for p in existing_problems if p.get('type') == 'word_problem')
         
         logger.debug(f"Problem generation status: basic={current_basic_count}/{basic_target}, word={current_word_count}/{word_target}")
         
         # 生成应用题（如果需要）
         if current_word_count < word_target:
+            word_count = word_target - current_word_count
+            added = 0
+            skipped = []
+            # Grok 超过截止时间仍未生成完，剩余部分改用本地题目补齐
+            deadline = time.monotonic() + settings.WORD_PROBLEM_DEADLINE_SECONDS
             try:
-                word_count = word_target - current_word_count
-                word_problems = await generate_problems_batch(age, word_count, rules)
-                logger.debug(f"Generated {len(word_problems)} word problems")
+                if not grok_client.available:
+                    # 熔断期间不等待 Grok，直接使用本地题目
+                    logger.debug(f"Grok unavailable, filling batch {batch_id} locally")
+                    word_problems = iter_problems([])
+                else:
+                    # 与同一时间窗口内相同年龄和规则的其他批次合并为一次生成请求
+                    word_problems = word_problem_batcher.stream(age, rules, word_count, deadline)
                 
                 # 为每个应用题添加ID和批次ID
-                for i, problem in enumerate(word_problems):
-                    problem_id = len(_batch_problems[batch_id]) + 1
-                    problem['id'] = problem_id
-                    problem['batch_id'] = batch_id
-                    problem['difficulty'] = get_difficulty_by_age(age)
-                    problem['age'] = age
-                    
-                    # 保存到批次存储
-                    _batch_problems[batch_id][str(problem_id)] = problem.copy()
-                    logger.debug(f"Added word problem {problem_id} to batch {batch_id}")
+                try:
+                    while True:
+                        try:
+                            problem = await asyncio.wait_for(
+                                word_problems.__anext__(), max(0.0, deadline - time.monotonic())
+                            )
+                        except StopAsyncIteration:
+                            break
+                        problem['difficulty'] = get_difficulty_by_age(age)
+                        problem['age'] = age
+                        if not dedup.claim(problem):
+                            skipped.append(problem)
+                            continue
+                        
+                        # 保存到批次存储
+                        problem_id = await batch_store.add_problem(batch_id, problem)
+                        if problem_id is None:
+                            logger.debug(f"Batch {batch_id} was evicted, stopping generation")
+                            return
+                        added += 1
+                        logger.debug(f"Added word problem {problem_id} to batch {batch_id}")
+                finally:
+                    # 提前结束时关闭上游流，释放调度槽位
+                    await word_problems.aclose()
+            except asyncio.TimeoutError:
+                logger.warning(f"Word problem generation for batch {batch_id} exceeded the deadline, got {added}/{word_count}")
             except Exception as e:
                 logger.error(f"Error generating word problems: {e}")
+            logger.debug(f"Generated {added} word problems, skipped {len(skipped)} duplicates")
+            
+            # 数量不足时先从题池补齐，再用本地模板，最后才使用用户做过的题，不再重新请求模型
+            if added < word_count:
+                fillers = word_problem_pool.take(age, rules, word_count - added, accept=dedup.claim)
+                missing = word_count - added - len(fillers)
+                if missing > 0:
+                    fallback = []
+                    if settings.WORD_TEMPLATES_ENABLED and rules is None:
+                        fallback = generate_word_problems(age, missing * 2)
+                        logger.info(f"Filling {missing} word problems for batch {batch_id} from templates")
+                    fillers += dedup.select(skipped + fallback, missing)
+                for problem in fillers:
+                    if await batch_store.add_problem(batch_id, problem) is None:
+                        logger.debug(f"Batch {batch_id} was evicted, stopping generation")
+                        return
         
         # 生成基础题（如果需要）
         if current_basic_count < basic_target:
             basic_count = basic_target - current_basic_count
             logger.debug(f"Generating {basic_count} basic problems")
             
-            for i in range(basic_count):
-                try:
-                    problem_id = len(_batch_problems[batch_id]) + 1
-                    problem = generate_basic_problem(age, problem_id)
-                    problem['batch_id'] = batch_id
-                    
-                    # 保存到批次存储
-                    _batch_problems[batch_id][str(problem_id)] = problem.copy()
-                    logger.debug(f"Added basic problem {problem_id} to batch {batch_id}")
-                except Exception as e:
-                    logger.error(f"Error generating basic problem {problem_id}: {e}")
+            try:
+                candidates = generate_basic_problems(age, basic_count * 2, weights=weights)
+            except Exception as e:
+                logger.error(f"Error generating basic problems: {e}")
+                candidates = [generate_basic_problem(age, i + 1) for i in range(basic_count * 2)]
+            for problem in dedup.select(candidates, basic_count):
+                # 保存到批次存储
+                problem_id = await batch_store.add_problem(batch_id, problem)
+                if problem_id is None:
+                    logger.debug(f"Batch {batch_id} was evicted, stopping generation")
+                    return
+                logger.debug(f"Added basic problem {problem_id} to batch {batch_id}")
         
         # 记录最终状态
-        final_basic_count = sum(1 for p in _batch_problems[batch_id].values() 
-                              if p.get('type') == 'basic')
-        final_word_count = sum(1 for p in _batch_problems[batch_id].values() 
-                             if p.get('type') == 'word_problem')
+        final_problems = await batch_store.list_problems(batch_id) or []
+        final_basic_count = sum(1 for p in final_problems if p.get('type') == 'basic')
+        final_word_count = sum(1 for p in final_problems if p.get('type') == 'word_problem')
         
         logger.debug("=== Final Batch Status ===")
         logger.debug(f"Batch ID: {batch_id}")
-        logger.debug(f"Total problems: {len(_batch_problems[batch_id])}")
+        logger.debug(f"Total problems: {len(final_problems)}")
         logger.debug(f"Basic problems: {final_basic_count}/{basic_target}")
         logger.debug(f"Word problems: {final_word_count}/{word_target}")
         
     except Exception as e:
         logger.error(f"Error in generate_remaining_problems: {e}")
-        logger.debug(f"Current batch status: {_batch_problems.get(batch_id, {})}")
+    finally:
+        # 通知订阅者本批次不会再有新题目
+        try:
+            await batch_store.mark_complete(batch_id)
+        except Exception as e:
+            logger.error(f"Error marking batch {batch_id} complete: {e}")
+
+def grade_answer(problem: dict, answer: Union[float, str]) -> dict:
+    """
+    用题目的答案键批改一个答案
+
+    返回:
+        dict: correct 为 None 表示答案无法解析
+    """
+    # 答案键在题目加入批次时已计算好，旧数据则现场计算
+    answer_key = problem.get('answer_key') or make_answer_key(problem['answer'])
+    is_correct = check_answer(answer_key, answer)
+    
+    # 生成反馈
+    if is_correct is None:
+        feedback = "Ugyldig svar format"
+    elif is_correct:
+        feedback = "Riktig! Bra jobbet! 🎉"
+    else:
+        feedback = f"Ikke riktig. Det riktige svaret er {format_answer(answer_key)}. Prøv igjen! 💪"
+        
+    return {
+        "correct": is_correct,
+        "feedback": feedback,
+        "correct_answer": float(problem['answer'])
+    }
+
+def record_answer(user: User, problem: dict, correct: bool) -> None:
+    """用答题结果更新学生的能力分"""
+    if settings.ADAPTIVE_ENABLED:
+        point = classify_knowledge_point(problem).value
+        skill_model.update(user.id, point, problem.get('age') or user.age or 6, correct)
+
+def make_attempt(user: User, batch_id: str, problem: dict, answer: Union[float, str], correct: bool) -> dict:
+    """构造一条答题记录"""
+    return {
+        "user_id": user.id,
+        "batch_id": batch_id,
+        "problem_id": problem['id'],
+        "problem_type": problem.get('type', 'basic'),
+        "sub_type": problem.get('sub_type'),
+        "knowledge_point": classify_knowledge_point(problem).value,
+        "answer": str(answer)[:64],
+        "correct": correct
+    }
 
 @router.post("/math/check")
 async def check_math_answer(
@@ -243,65 +393,115 @@ async def check_math_answer(
         # 添加详细日志
         logger.debug("=== Check Answer Request ===")
         logger.debug(f"Request: {request}")
-        logger.debug(f"Available batches: {_batch_problems.keys()}")
         
         # 从对应批次获取题目
-        batch = _batch_problems.get(request.batch_id)
-        if not batch:
+        if not await batch_store.exists(request.batch_id):
             logger.error(f"Batch {request.batch_id} not found")
-            logger.debug(f"All batches: {_batch_problems}")
             raise HTTPException(status_code=404, detail="Invalid batch")
             
-        problem = batch.get(str(request.problem_id))
+        problem = await batch_store.get_problem(request.batch_id, request.problem_id)
         if not problem:
             logger.error(f"Problem {request.problem_id} not found in batch {request.batch_id}")
-            logger.debug(f"Batch contents: {batch}")
             raise HTTPException(status_code=404, detail="Problem not found")
             
         logger.debug(f"Found problem: {problem}")
         logger.debug(f"User answer: {request.answer}")
         
-        # 验证答案
-        try:
-            user_answer = float(request.answer)
-            correct_answer = float(problem['answer'])
+        response = grade_answer(problem, request.answer)
+        if response["correct"] is None:
+            logger.error(f"Unparseable answer: {request.answer!r}")
+            raise HTTPException(status_code=400, detail="Ugyldig svar format")
             
-            # 对于基础运算题，直接比较整数值
-            if problem['type'] == 'basic':
-                user_int = int(user_answer)
-                correct_int = int(correct_answer)
-                is_correct = user_int == correct_int
-                logger.debug(f"Basic problem comparison: {user_int} == {correct_int} -> {is_correct}")
-            else:
-                # 对于应用题，使用相对误差
-                relative_error = abs(user_answer - correct_answer) / abs(correct_answer)
-                tolerance = 0.001
-                is_correct = relative_error <= tolerance
-                logger.debug(f"Word problem comparison: {relative_error} <= {tolerance} -> {is_correct}")
+        # 每道题只记录第一次批改的结果，重复提交不会重复更新能力分和进度
+        if await batch_store.mark_graded(request.batch_id, [problem['id']]):
+            record_answer(current_user, problem, response["correct"])
+            await attempt_writer.record(
+                make_attempt(current_user, request.batch_id, problem, request.answer, response["correct"])
+            )
+        logger.debug(f"Response: {response}")
+        return response
             
-            # 生成反馈
-            if is_correct:
-                feedback = "Riktig! Bra jobbet! 🎉"
-            else:
-                feedback = f"Ikke riktig. Det riktige svaret er {int(correct_answer) if problem['type'] == 'basic' else correct_answer:.2f}. Prøv igjen! 💪"
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in check_math_answer: {e}")
+        raise HTTPException(status_code=500, detail="Error checking answer")
+
+@router.post("/math/check/bulk")
+async def check_math_answers_bulk(
+    request: MathBulkAnswerRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    一次批改整个批次的答案
+    
+    只读取一次批次，逐题返回结果，并给出得分汇总。
+    同一道题提交多次时只批改第一个答案。
+    无法解析的答案和不存在的题目 correct 为 None，单独计入 invalid，
+    既不算对也不算错，不记录作答，也不会让整个请求失败；得分按全部题数计算。
+    之前已经批改过的题目（例如通过 /math/check）照常返回结果，但不再重复记录，
+    其余答题记录一次性放入写入队列。
+    """
+    try:
+        if len(request.answers) > settings.BULK_CHECK_MAX_ANSWERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"For mange svar, maks {settings.BULK_CHECK_MAX_ANSWERS}"
+            )
             
-            response = {
-                "correct": is_correct,
-                "feedback": feedback,
-                "correct_answer": correct_answer
-            }
-            logger.debug(f"Response: {response}")
-            return response
+        problems = await batch_store.list_problems(request.batch_id)
+        if problems is None:
+            logger.error(f"Batch {request.batch_id} not found")
+            raise HTTPException(status_code=404, detail="Invalid batch")
+        problems_by_id = {problem['id']: problem for problem in problems}
+        
+        # 同一道题只保留第一个答案
+        answers = {}
+        for item in request.answers:
+            answers.setdefault(item.problem_id, item.answer)
             
-        except ValueError as e:
-            logger.error(f"Error converting answer to float: {e}")
-            raise HTTPException(status_code=400, detail="Ugyldig svar format")
+        results = []
+        graded = []
+        for problem_id, answer in answers.items():
+            problem = problems_by_id.get(problem_id)
+            if problem is None:
+                result = {"correct": None, "feedback": "Problem not found", "correct_answer": None}
+            else:
+                result = grade_answer(problem, answer)
+                if result["correct"] is not None:
+                    graded.append((problem, answer, result["correct"]))
+            results.append({"problem_id": problem_id, **result})
+            
+        new_ids = set(await batch_store.mark_graded(request.batch_id, [problem['id'] for problem, _, _ in graded]))
+        attempts = []
+        for problem, answer, correct in graded:
+            if problem['id'] in new_ids:
+                record_answer(current_user, problem, correct)
+                attempts.append(make_attempt(current_user, request.batch_id, problem, answer, correct))
+        await attempt_writer.record_many(attempts)
             
+        correct = sum(1 for result in results if result["correct"])
+        invalid = sum(1 for result in results if result["correct"] is None)
+        total = len(results)
+        logger.debug(f"Bulk graded {total} answers for batch {request.batch_id}: {correct} correct")
+        
+        return {
+            "batch_id": request.batch_id,
+            "results": results,
+            "summary": {
+                "total": total,
+                "correct": correct,
+                "incorrect": total - correct - invalid,
+                "invalid": invalid,
+                "score": round(correct / total * 100, 1) if total else 0.0
+            }
+        }
+        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in check_math_answer: {e}")
-        raise HTTPException(status_code=500, detail="Error checking answer")
+        logger.error(f"Error in check_math_answers_bulk: {e}")
+        raise HTTPException(status_code=500, detail="Error checking answers")
 
 # 知识问答API端点
 @router.get("/quiz/questions", response_model=List[KnowledgeQuiz])
@@ -343,18 +543,7 @@ def generate_basic_problem(age: int, problem_id: int) -> dict:
     
     try:
         # 根据年龄设置数字和运算类型
-        if age <= 7:  # 6-7岁
-            max_num = 20 if age == 6 else 50
-            operations = ['+', '-']  # 仅加减法
-        elif age <= 9:  # 8-9岁
-            max_num = 100
-            operations = ['+', '-', '*']  # 加入乘法
-        elif age <= 10:  # 10岁
-            max_num = 1000
-            operations = ['+', '-', '*', '/']  # 加入除法
-        else:  # 11-12岁
-            max_num = 10000
-            operations = ['+', '-', '*', '/', 'fraction', 'decimal']  # 加入分数和小数
+        max_num, operations = get_basic_settings(age)
 
         # 随机选择运算符和生成数字
         op = random.choice(operations)
@@ -411,101 +600,8 @@ def generate_basic_problem(age: int, problem_id: int) -> dict:
         }
 
 def generate_word_problem_sync(age: int) -> dict:
-    """同步版本的应用题生成函数"""
-    import random
-    
-    # 根据年龄选择合适的题型
-    available_types = []
-    if age <= 7:  # 6-7岁
-        available_types = ['shopping', 'sharing']
-    elif age <= 9:  # 8-9岁
-        available_types = ['shopping', 'sharing', 'time']
-    else:  # 10岁以上
-        available_types = ['shopping', 'sharing', 'time', 'measurement']
-    
-    problem_type = random.choice(available_types)
-    templates = _word_problem_types[problem_type]['templates']
-    
-    # 根据年龄调整数字范围
-    if age <= 7:
-        num_range = (1, 20)
-    elif age <= 9:
-        num_range = (1, 100)
-    else:
-        num_range = (1, 1000)
-    
-    # 生成数字
-    num1 = random.randint(*num_range)
-    num2 = random.randint(*num_range)
-    
-    # 选择模板和填充内容
-    template = random.choice(templates)
-    name = random.choice(_norwegian_names)
-    
-    # 根据题型生成具体问题
-    if problem_type == 'shopping':
-        item = random.choice(_word_problem_types['shopping']['items'])
-        if 'kjøper' in template:
-            answer = num1 * num2  # 总价
-        else:
-            answer = num1 - num2  # 剩余金额
-            if answer < 0:  # 确保答案为正数
-                num1, num2 = num2, num1
-                answer = num1 - num2
-    
-    elif problem_type == 'sharing':
-        item = random.choice(_word_problem_types['sharing']['items'])
-        if num2 == 0:  # 避免除零
-            num2 = random.randint(1, 5)
-        answer = num1 / num2
-    
-    elif problem_type == 'time':
-        place1 = random.choice(_word_problem_types['time']['places'])
-        place2 = random.choice(_word_problem_types['time']['places'])
-        while place2 == place1:  # 确保两个地点不同
-            place2 = random.choice(_word_problem_types['time']['places'])
-        time = f"{random.randint(8, 16)}:00"
-        answer = num1  # 时间差
-    
-    elif problem_type == 'measurement':
-        if 'areal' in template:  # 面积问
-            answer = num1 * num2
-        else:  # 分割问题
-            if num2 == 0:  # 避免除零
-                num2 = random.randint(1, 5)
-            answer = num1 / num2
-    
-    # 填充模板
-    question = template.format(
-        name=name,
-        num1=num1,
-        num2=num2,
-        item=item if 'item' in template else '',
-        place1=place1 if 'place1' in template else '',
-        place2=place2 if 'place2' in template else '',
-        time=time if 'time' in template else ''
-    )
-    
-    return {
-        "question": question,
-        "answer": float(answer),
-        "type": "word_problem",
-        "sub_type": problem_type,
-        "hash": hash(question),
-        "difficulty": get_difficulty_by_age(age),
-        "age": age
-    }
-
-def get_difficulty_by_age(age: int) -> str:
-    """根据年龄返回难度等级"""
-    if age <= 7:
-        return "beginner"
-    elif age <= 9:
-        return "intermediate"
-    elif age <= 11:
-        return "advanced"
-    else:
-        return "expert"
+    """同步版本的应用题生成函数（使用本地模板，不调用 Grok）"""
+    return generate_word_problem(age)
 
 # 添加请求模型
 class ExplanationRequest(BaseModel):
@@ -602,6 +698,13 @@ async def generate_word_problem_explanation(request: ExplanationRequest) -> dict
         logger.debug("=== Starting Math Explanation Generation ===")
         logger.debug(f"Request: {request}")
         
+        # 相同的题目直接返回缓存的解释
+        cache_key = make_explanation_key(request.question, request.answer, request.type, request.age)
+        cached = await explanation_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Explanation cache hit: {cache_key}")
+            return cached
+        
         # 构建提示词，更注重知识点和解题思路
         prompt = f"""
         Forklar denne oppgaven for et barn ({request.age} år):
@@ -634,23 +737,35 @@ async def generate_word_problem_explanation(request: ExplanationRequest) -> dict
         """
         
         try:
-            response = await grok_client.generate_content(prompt)
+            if not grok_client.available:
+                # 熔断期间直接返回本地的默认解释
+                raise GrokUnavailableError("Grok circuit breaker is open")
+            response = await grok_client.generate_content(
+                prompt,
+                deadline=time.monotonic() + settings.EXPLANATION_DEADLINE_SECONDS,
+                call_site='explanations'
+            )
             logger.debug(f"Received response from Grok: {response}")
             
             try:
                 explanation_data = json.loads(response)
                 if explanation_data.get('problems') and len(explanation_data['problems']) > 0:
                     problem = explanation_data['problems'][0]
-                    return {
+                    explanation = {
                         'knowledge_point': problem.get('knowledge_point', ''),
                         'explanation': problem.get('explanation', ''),
                         'tips': problem.get('tips', []),
                         'solution_steps': problem.get('solution_steps', []),
                         'similar_problem': problem.get('similar_problem', {})
                     }
+                    # 只缓存 Grok 成功返回的解释，不缓存默认解释
+                    await explanation_cache.set(cache_key, explanation)
+                    return explanation
             except json.JSONDecodeError as e:
                 logger.error(f"Failed to parse Grok response: {e}")
                 
+        except GrokUnavailableError:
+            logger.debug("Grok unavailable, returning default explanation")
         except Exception as e:
             logger.error(f"Error calling Grok API: {e}")
             
@@ -687,16 +802,24 @@ async def get_similar_problems(
 ):
     """生成相似的题目"""
     try:
+        if type == 'basic':
+            generated = generate_basic_problems(age, count)
+        else:
+            generated = []
+            if grok_client.available:
+                generated = await generate_problems_batch(age, count, call_site='similar_problems')
+            if len(generated) < count:
+                # Grok 不可用或有效题目不足时用本地模板补齐
+                generated += generate_word_problems(age, count - len(generated))
+        
         problems = []
-        for i in range(count):
-            problem = await grok_client.generate_math_problem(age, type)
-            if problem:
-                problems.append({
-                    "id": f"similar_{i+1}",
-                    **problem,
-                    "age": age,
-                    "type": type
-                })
+        for i, problem in enumerate(generated[:count]):
+            problems.append({
+                **problem,
+                "id": f"similar_{i+1}",
+                "age": age,
+                "type": type
+            })
         return problems
     except Exception as e:
         logger.error(f"Error generating similar problems: {e}")
@@ -858,15 +981,19 @@ def create_word_problem_prompt(age: int, custom_rules: list = None) -> str:
 async def generate_problems_batch(
     age: int, 
     count: int, 
-    rules: list = None  # 接收列表类型的规则
+    rules: list = None,  # 接收列表类型的规则
+    deadline: Optional[float] = None,  # 调用方的截止时间（time.monotonic()）
+    call_site: str = 'word_problems'  # 用量统计中的调用点
 ) -> List[dict]:
     """批量生成应用题"""
     try:
         # 直接传递列表类型的规则
         prompt = create_word_problem_prompt(age, custom_rules=rules)
         
-        # 调用 Grok API 生成题目
-        response = await grok_client.generate_content(prompt, count)
+        # 调用 Grok API 生成题目（后台补充，优先级低于题目解释）
+        response = await grok_client.generate_content(
+            prompt, count, priority=RequestPriority.BACKGROUND, deadline=deadline, call_site=call_site
+        )
         
         # 解析响应
         try:
@@ -892,6 +1019,93 @@ async def generate_problems_batch(
         logger.error(f"Error in generate_problems_batch: {e}")
         return []
 
+# 预生成应用题池
+word_problem_pool = WordProblemPool(
+    generate_problems_batch,
+    low_water=settings.WORD_POOL_LOW_WATER,
+    high_water=settings.WORD_POOL_HIGH_WATER,
+    refill_batch=settings.WORD_POOL_REFILL_BATCH,
+    max_keys=settings.WORD_POOL_MAX_KEYS
+)
+
+async def stream_word_problems(
+    age: int,
+    count: int,
+    rules: list = None,
+    deadline: Optional[float] = None
+) -> AsyncIterator[dict]:
+    """按配置以流式或整批方式生成应用题"""
+    if settings.GROK_STREAMING:
+        # 流式生成，每道题解析完成后立即返回
+        stream = generate_problems_stream(age, count, rules, deadline)
+        try:
+            async for problem in stream:
+                yield problem
+        finally:
+            await stream.aclose()
+    else:
+        for problem in await generate_problems_batch(age, count, rules, deadline):
+            yield problem
+
+# 合并多个批次的应用题需求
+word_problem_batcher = WordProblemBatcher(
+    stream_word_problems,
+    pool=word_problem_pool,
+    window=settings.WORD_BATCH_WINDOW_SECONDS,
+    max_problems=settings.WORD_BATCH_MAX_PROBLEMS
+)
+
+def load_pool_rule_keys(db: Session) -> List[tuple]:
+    """从 tb_customer_rules_map 读取需要预热的 (年龄, 规则) 组合"""
+    rows = db.execute(text("""
+        SELECT age, customer_rules 
+        FROM tb_customer_rules_map
+    """)).fetchall()
+    # 空规则对应前端的默认选项（不传 rules）
+    return [(row[0], [row[1]] if row[1] else None) for row in rows]
+
+async def warm_word_problem_pool() -> None:
+    """启动时预热应用题池"""
+    try:
+        keys = await run_in_db(load_pool_rule_keys)
+        word_problem_pool.warm(keys)
+        logger.info(f"Warming word problem pool for {len(keys)} age/rule combinations")
+    except Exception as e:
+        logger.error(f"Error warming word problem pool: {e}")
+
+async def generate_problems_stream(
+    age: int,
+    count: int,
+    rules: list = None,
+    deadline: Optional[float] = None  # 调用方的截止时间（time.monotonic()）
+) -> AsyncIterator[dict]:
+    """流式生成应用题，每解析出一道有效题目立即返回"""
+    prompt = create_word_problem_prompt(age, custom_rules=rules)
+    
+    generated = 0
+    stream = grok_client.generate_problems_stream(
+        prompt, count, priority=RequestPriority.BACKGROUND, deadline=deadline, call_site='word_problems'
+    )
+    try:
+        async for problem in stream:
+            if not validate_problem(problem, age):
+                continue
+            problem['difficulty'] = get_difficulty_by_age(age)
+            problem['age'] = age
+            generated += 1
+            yield problem
+            if generated >= count:
+                break
+    finally:
+        await stream.aclose()
+        
+    logger.debug(f"Streamed {generated} valid word problems")
+
+async def iter_problems(problems: List[dict]) -> AsyncIterator[dict]:
+    """将题目列表包装为异步迭代器"""
+    for problem in problems:
+        yield problem
+
 def validate_problem(problem: dict, age: int) -> bool:
     """验证生成的题目是否有效"""
     try:
@@ -1008,21 +1222,15 @@ async def get_remaining_problems(
     try:
         logger.debug(f"Getting remaining problems for batch {batch_id}")
         
-        # 获取批次
-        batch = _batch_problems.get(batch_id)
-        if not batch:
+        # 获取批次中的所有题目（已按ID排序）
+        problems = await batch_store.list_problems(batch_id)
+        if not problems:
             logger.error(f"Batch {batch_id} not found")
             # 返回空列表而不是抛出错误
             return []
             
-        # 获取所有题目
-        problems = list(batch.values())
         logger.debug(f"Found {len(problems)} problems in batch")
         
-        # 按ID排序
-        problems.sort(key=lambda x: x['id'])
-        logger.debug(f"Returning problems: {problems}")
-        
         return problems
         
     except Exception as e:
@@ -1030,22 +1238,185 @@ async def get_remaining_problems(
         # 返回空列表而不是抛出错误
         return []
 
+def _sse_event(event: str, data: dict) -> str:
+    """格式化一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.get("/math/problems/{batch_id}/stream")
+async def stream_batch_problems(
+    batch_id: str,
+    after: int = 0,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    以 Server-Sent Events 推送批次中的题目
+    
+    每道题目加入批次后立即推送一个 problem 事件，
+    后台生成结束后推送 complete 事件并关闭连接。
+    """
+    if not await batch_store.exists(batch_id):
+        logger.error(f"Batch {batch_id} not found")
+        raise HTTPException(status_code=404, detail="Invalid batch")
+        
+    async def event_stream():
+        last_id = after
+        deadline = time.monotonic() + settings.PROBLEM_STREAM_MAX_SECONDS
+        try:
+            while time.monotonic() < deadline:
+                result = await batch_store.wait_for_problems(
+                    batch_id, last_id, settings.PROBLEM_STREAM_KEEPALIVE_SECONDS
+                )
+                if result is None:
+                    # 批次已过期或被淘汰
+                    yield _sse_event("error", {"detail": "Invalid batch"})
+                    return
+                    
+                problems, completed = result
+                for problem in problems:
+                    last_id = problem['id']
+                    yield _sse_event("problem", MathProblem(**problem).model_dump())
+                    
+                if completed:
+                    yield _sse_event("complete", {"batch_id": batch_id, "total": last_id})
+                    return
+                    
+                if not problems:
+                    # 保持连接，防止代理超时断开
+                    yield ": keep-alive\n\n"
+                    
+            yield _sse_event("timeout", {"batch_id": batch_id, "last_id": last_id})
+        except Exception as e:
+            logger.error(f"Error streaming batch {batch_id}: {e}")
+            yield _sse_event("error", {"detail": "Error streaming problems"})
+            
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭 nginx 缓冲，立即转发事件
+        }
+    )
+
+# 导出题单的列（CSV 表头与 NDJSON 字段一致）
+WORKSHEET_FIELDS = ['id', 'type', 'question', 'answer', 'difficulty', 'age']
+
+async def iter_worksheet_chunks(
+    age: int,
+    count: int,
+    rules: Optional[list],
+    word_ratio: float
+) -> AsyncIterator[List[dict]]:
+    """
+    分块生成题单题目
+
+    每块最多 WORKSHEET_CHUNK_SIZE 道题，生成并输出后即释放，内存与题单大小无关。
+    应用题不等待模型：默认规则用本地模板生成；自定义规则只从题池取
+    WORKSHEET_POOL_MAX_PROBLEMS 道，避免一次导出抽干在线练习依赖的题池。
+    不足部分用基础题补齐。
+    """
+    pool_budget = settings.WORKSHEET_POOL_MAX_PROBLEMS
+    produced = 0
+    while produced < count:
+        size = min(settings.WORKSHEET_CHUNK_SIZE, count - produced)
+        word_count = int(size * word_ratio)
+        chunk = []
+        if word_count and rules is None and settings.WORD_TEMPLATES_ENABLED:
+            chunk = generate_word_problems(age, word_count)
+        elif word_count and pool_budget > 0:
+            # 按申请数量扣减额度，题池为空时也不会每块都触发一次补充
+            take_count = min(word_count, pool_budget)
+            pool_budget -= take_count
+            chunk = word_problem_pool.take(age, rules, take_count)
+        chunk += generate_basic_problems(age, size - len(chunk))
+        random.shuffle(chunk)
+        for i, problem in enumerate(chunk):
+            problem['id'] = produced + i + 1
+        produced += len(chunk)
+        yield chunk
+        # 让出事件循环，避免大题单阻塞其他请求
+        await asyncio.sleep(0)
+
+def _format_worksheet_chunk(chunk: List[dict], fmt: str) -> str:
+    """把一块题目格式化为 NDJSON 或 CSV 文本"""
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps({field: problem.get(field) for field in WORKSHEET_FIELDS}, ensure_ascii=False) + "\n"
+            for problem in chunk
+        )
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=WORKSHEET_FIELDS, extrasaction='ignore').writerows(chunk)
+    return buffer.getvalue()
+
+@router.get("/math/worksheet")
+async def export_worksheet(
+    age: int = 6,
+    count: int = 500,
+    format: str = "ndjson",
+    rules: str = None,
+    word_ratio: float = 0.0,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    导出可打印的题单
+
+    以 NDJSON 或 CSV 流式输出，适合一次导出几百到几千道题。
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Ugyldig format, bruk ndjson eller csv")
+    if not 1 <= count <= settings.WORKSHEET_MAX_PROBLEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Antall oppgaver må være mellom 1 og {settings.WORKSHEET_MAX_PROBLEMS}"
+        )
+    if not 0.0 <= word_ratio <= 1.0:
+        raise HTTPException(status_code=400, detail="word_ratio må være mellom 0 og 1")
+        
+    try:
+        rules_list = json.loads(rules) if rules else None
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Ugyldig regelformat, forventet en JSON-liste")
+    if rules_list is not None and not isinstance(rules_list, list):
+        raise HTTPException(status_code=400, detail="Ugyldig regelformat, forventet en JSON-liste")
+    logger.info(f"Exporting {format} worksheet for {current_user.username}: age={age}, count={count}, word_ratio={word_ratio}")
+    
+    async def worksheet_stream():
+        try:
+            if format == "csv":
+                yield ",".join(WORKSHEET_FIELDS) + "\r\n"
+            async for chunk in iter_worksheet_chunks(age, count, rules_list, word_ratio):
+                yield _format_worksheet_chunk(chunk, format)
+        except Exception as e:
+            # 响应头已发送，只能记录错误并提前结束
+            logger.error(f"Error exporting worksheet: {e}")
+            
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8"
+    return StreamingResponse(
+        worksheet_stream(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="worksheet-age{age}-{count}.{format}"',
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+def _fetch_rules(db: Session, age: int) -> list:
+    # 使用 text() 包装 SQL 查询
+    query = text("""
+        SELECT customer_rules, display_rules 
+        FROM tb_customer_rules_map 
+        WHERE age = :age
+    """)
+    return db.execute(query, {"age": age}).fetchall()
+
 @router.get("/math/rules/{age}")
 async def get_available_rules(
     age: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """获取指定年龄可用的规则"""
     try:
-        # 使用 text() 包装 SQL 查询
-        query = text("""
-            SELECT customer_rules, display_rules 
-            FROM tb_customer_rules_map 
-            WHERE age = :age
-        """)
-        
-        result = db.execute(query, {"age": age}).fetchall()
+        result = await run_in_db(_fetch_rules, age)
         
         return [
             {
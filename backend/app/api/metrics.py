@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends
+from ..api.auth import get_current_admin
+from ..api.education import word_problem_pool, word_problem_batcher, batch_store, explanation_cache
+from ..core.adaptive import skill_model
+from ..core.attempt_writer import attempt_writer
+from ..core.dedup import problem_history
+from ..core.grok_client import grok_client
+from ..core.token_cache import token_cache
+from ..core.user_cache import user_cache
+from ..models.user import User
+
+# 运行指标包含用量、费用和用户统计，仅管理员可以查看
+router = APIRouter()
+
+@router.get("/metrics/grok")
+async def get_grok_metrics(current_user: User = Depends(get_current_admin)):
+    """获取 Grok 出站请求的队列深度和等待时间"""
+    return grok_client.metrics()
+
+@router.get("/metrics/word-pool")
+async def get_word_pool_metrics(current_user: User = Depends(get_current_admin)):
+    """获取预生成应用题池的状态"""
+    return word_problem_pool.metrics()
+
+@router.get("/metrics/word-batching")
+async def get_word_batching_metrics(current_user: User = Depends(get_current_admin)):
+    """获取应用题需求合并的统计"""
+    return word_problem_batcher.metrics()
+
+@router.get("/metrics/batches")
+async def get_batch_store_metrics(current_user: User = Depends(get_current_admin)):
+    """获取批次存储的容量和淘汰计数"""
+    return await batch_store.metrics()
+
+@router.get("/metrics/explanations")
+async def get_explanation_cache_metrics(current_user: User = Depends(get_current_admin)):
+    """获取题目解释缓存的命中统计"""
+    return explanation_cache.metrics()
+
+@router.get("/metrics/users")
+async def get_user_cache_metrics(current_user: User = Depends(get_current_admin)):
+    """获取已认证用户缓存的命中统计"""
+    return user_cache.metrics()
+
+@router.get("/metrics/tokens")
+async def get_token_cache_metrics(current_user: User = Depends(get_current_admin)):
+    """获取已验证令牌缓存的命中统计"""
+    return token_cache.metrics()
+
+@router.get("/metrics/dedup")
+async def get_dedup_metrics(current_user: User = Depends(get_current_admin)):
+    """获取题目去重统计和历史记录的内存占用"""
+    return problem_history.metrics()
+
+@router.get("/metrics/attempts")
+async def get_attempt_writer_metrics(current_user: User = Depends(get_current_admin)):
+    """获取答题记录写入队列的深度和写入统计"""
+    return attempt_writer.metrics()
+
+@router.get("/metrics/adaptive")
+async def get_adaptive_metrics(current_user: User = Depends(get_current_admin)):
+    """获取学生能力模型的统计"""
+    return skill_model.metrics()
+
+@router.get("/metrics/llm-usage")
+async def get_llm_usage_metrics(current_user: User = Depends(get_current_admin)):
+    """获取 LLM 调用的 token 用量、估算费用和延迟（按调用点汇总）"""
+    return grok_client.usage.metrics()
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from .auth import get_current_user, _get_user_by_username
+from ..core.database import run_in_db
+from ..core.logger import logger
+from ..core.security import verify_password
+from ..models.progress import ParentChild, ProgressDaily
+from ..models.user import User, UserType
+
+router = APIRouter()
+
+class ChildLinkRequest(BaseModel):
+    """家长关联孩子账号的请求（需要孩子的登录信息）"""
+    username: str
+    password: str
+
+# 以下同步函数通过 run_in_db 在数据库线程池中执行
+def _link_child(db: Session, parent_id: int, child_id: int) -> None:
+    exists = db.query(ParentChild).filter(
+        ParentChild.parent_id == parent_id,
+        ParentChild.child_id == child_id
+    ).first()
+    if exists is None:
+        db.add(ParentChild(parent_id=parent_id, child_id=child_id))
+        db.commit()
+
+def _list_children(db: Session, parent_id: int) -> List[dict]:
+    rows = db.query(User).join(ParentChild, ParentChild.child_id == User.id).filter(
+        ParentChild.parent_id == parent_id
+    ).all()
+    return [{"id": user.id, "username": user.username, "age": user.age} for user in rows]
+
+def _is_parent_of(db: Session, parent_id: int, child_id: int) -> bool:
+    return db.query(ParentChild).filter(
+        ParentChild.parent_id == parent_id,
+        ParentChild.child_id == child_id
+    ).first() is not None
+
+def _fetch_progress(db: Session, user_id: int, since: date) -> list:
+    return db.query(
+        ProgressDaily.knowledge_point,
+        ProgressDaily.day,
+        ProgressDaily.attempts,
+        ProgressDaily.correct
+    ).filter(
+        ProgressDaily.user_id == user_id,
+        ProgressDaily.day >= since
+    ).all()
+
+def _summarize(totals: dict) -> List[dict]:
+    return [
+        {
+            "knowledge_point": point,
+            "attempts": attempts,
+            "correct": correct,
+            "accuracy": round(correct / attempts, 3) if attempts else 0.0
+        }
+        for point, (attempts, correct) in sorted(totals.items())
+    ]
+
+@router.post("/progress/children")
+async def link_child(
+    request: ChildLinkRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """家长用孩子的用户名和密码关联孩子账号"""
+    if current_user.role != UserType.PARENT:
+        raise HTTPException(status_code=403, detail="Kun foreldre kan koble til barn")
+
+    child = await run_in_db(_get_user_by_username, request.username)
+    valid = False
+    if child is not None and child.role == UserType.STUDENT:
+        valid, _ = await verify_password(request.password, child.hashed_password)
+    if not valid:
+        logger.error(f"Failed child link attempt by {current_user.username} for {request.username}")
+        raise HTTPException(status_code=401, detail="Feil brukernavn eller passord")
+
+    await run_in_db(_link_child, current_user.id, child.id)
+    logger.info(f"Linked child {child.username} to parent {current_user.username}")
+    return {"id": child.id, "username": child.username, "age": child.age}
+
+@router.get("/progress/children")
+async def get_children(current_user: User = Depends(get_current_user)):
+    """获取家长关联的孩子"""
+    return await run_in_db(_list_children, current_user.id)
+
+@router.get("/progress/{user_id}")
+async def get_progress(
+    user_id: int,
+    weeks: int = 8,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取学生按知识点和按周统计的正确率
+
+    只读取每日汇总表，查询量与答题记录总数无关。
+    学生本人、关联的家长和管理员可以查看。
+    """
+    if not 1 <= weeks <= 52:
+        raise HTTPException(status_code=400, detail="weeks må være mellom 1 og 52")
+
+    allowed = (
+        current_user.id == user_id
+        or current_user.role == UserType.ADMIN
+        or (
+            current_user.role == UserType.PARENT
+            and await run_in_db(_is_parent_of, current_user.id, user_id)
+        )
+    )
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Ingen tilgang")
+
+    today = datetime.utcnow().date()
+    # 从 weeks 周前的周一开始统计
+    since = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    rows = await run_in_db(_fetch_progress, user_id, since)
+
+    overall = defaultdict(lambda: [0, 0])
+    weekly = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for point, day, attempts, correct in rows:
+        week_start = day - timedelta(days=day.weekday())
+        for totals in (overall[point], weekly[week_start][point]):
+            totals[0] += attempts
+            totals[1] += correct
+
+    return {
+        "user_id": user_id,
+        "from": since.isoformat(),
+        "to": today.isoformat(),
+        "knowledge_points": _summarize(overall),
+        "weeks": [
+            {
+                "week_start": week_start.isoformat(),
+                "knowledge_points": _summarize(weekly[week_start])
+            }
+            for week_start in sorted(weekly)
+        ]
+    }
@@ -0,0 +1,168 @@
+import asyncio
+import math
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .config import settings
+from .database import run_in_db
+from .logger import logger
+from ..models.progress import ProgressDaily
+from ..models.user import MathKnowledgePoints
+
+# 年龄等级范围（与题目生成的年龄分档一致）
+MIN_LEVEL = 6
+MAX_LEVEL = 12
+
+# 每个年龄等级对应的 Elo 分数间隔
+_LEVEL_BASE_RATING = 1000.0
+_LEVEL_STEP = 100.0
+
+# 基础题运算与知识点的对应关系（分数、小数题按除法形式出题）
+OPERATION_POINTS = {
+    '+': MathKnowledgePoints.ADDITION_BASIC,
+    '-': MathKnowledgePoints.SUBTRACTION_BASIC,
+    '*': MathKnowledgePoints.MULTIPLICATION_BASIC,
+    '/': MathKnowledgePoints.DIVISION_BASIC,
+    'fraction': MathKnowledgePoints.FRACTION_CONCEPT,
+    'decimal': MathKnowledgePoints.DECIMAL_CONCEPT
+}
+
+def level_rating(level: int) -> float:
+    """年龄等级对应的题目难度分"""
+    return _LEVEL_BASE_RATING + (level - MIN_LEVEL) * _LEVEL_STEP
+
+class SkillModel:
+    """
+    学生能力模型（Elo）
+
+    为每个学生的每个知识点保存一个能力分，题目难度分由题目的年龄等级决定。
+    每次答题按 Elo 公式 O(1) 更新；全部保存在进程内存中，
+    出题时不需要访问数据库。首次遇到的学生会在后台用近期进度汇总初始化。
+    """
+
+    def __init__(self, k_factor: float, max_users: int):
+        self.k_factor = k_factor
+        self.max_users = max_users
+        self._ratings: "OrderedDict[int, Dict[str, float]]" = OrderedDict()
+        self._seeding: Dict[int, asyncio.Task] = {}
+        self._stats = {
+            'updates': 0,
+            'seeded_users': 0,
+            'evicted_users': 0
+        }
+
+    @staticmethod
+    def expected_score(skill: float, difficulty: float) -> float:
+        """按 Elo 公式计算答对的概率"""
+        return 1.0 / (1.0 + 10 ** ((difficulty - skill) / 400.0))
+
+    def _user_ratings(self, user_id: int) -> Dict[str, float]:
+        ratings = self._ratings.get(user_id)
+        if ratings is None:
+            ratings = {}
+            self._ratings[user_id] = ratings
+            while len(self._ratings) > self.max_users:
+                self._ratings.popitem(last=False)
+                self._stats['evicted_users'] += 1
+        else:
+            self._ratings.move_to_end(user_id)
+        return ratings
+
+    def rating(self, user_id: int, point: str, age: int) -> float:
+        """学生在某个知识点上的能力分，没有记录时按年龄估计"""
+        ratings = self._ratings.get(user_id)
+        if ratings and point in ratings:
+            return ratings[point]
+        return level_rating(age)
+
+    def update(self, user_id: int, point: str, level: int, correct: bool) -> float:
+        """根据一次答题结果更新能力分并返回新值"""
+        difficulty = level_rating(level)
+        ratings = self._user_ratings(user_id)
+        skill = ratings.get(point, difficulty)
+        skill += self.k_factor * ((1.0 if correct else 0.0) - self.expected_score(skill, difficulty))
+        ratings[point] = skill
+        self._stats['updates'] += 1
+        return skill
+
+    def choose_level(self, user_id: int, age: int) -> int:
+        """
+        选择出题的年龄等级
+
+        以学生各知识点能力分的平均值换算等级，最多比实际年龄高或低一级。
+        """
+        self.ensure_seeded(user_id, age)
+        ratings = self._ratings.get(user_id)
+        if not ratings:
+            return age
+        self._ratings.move_to_end(user_id)
+        skill = sum(ratings.values()) / len(ratings)
+        level = MIN_LEVEL + round((skill - _LEVEL_BASE_RATING) / _LEVEL_STEP)
+        level = max(age - 1, min(age + 1, level))
+        return max(MIN_LEVEL, min(MAX_LEVEL, level))
+
+    def operation_weights(self, user_id: int, age: int, operations: list) -> Dict[str, float]:
+        """
+        基础题各运算的抽取权重
+
+        能力分低于当前等级的知识点权重更高，多练薄弱环节。
+        """
+        target = level_rating(age)
+        weights = {}
+        for op in operations:
+            point = OPERATION_POINTS[op].value
+            gap = target - self.rating(user_id, point, age)
+            weights[op] = 1.0 + max(0.0, gap) / 200.0
+        return weights
+
+    def ensure_seeded(self, user_id: int, age: int) -> None:
+        """第一次遇到学生时，在后台用近期进度汇总初始化能力分"""
+        if user_id in self._ratings or user_id in self._seeding:
+            return
+        self._seeding[user_id] = asyncio.create_task(self._seed(user_id, age))
+
+    async def _seed(self, user_id: int, age: int) -> None:
+        try:
+            since = datetime.utcnow().date() - timedelta(weeks=settings.ADAPTIVE_SEED_WEEKS)
+            rows = await run_in_db(_fetch_recent_accuracy, user_id, since)
+            if user_id in self._ratings:
+                # 初始化期间已有答题更新，以实时数据为准
+                return
+            ratings = self._user_ratings(user_id)
+            base = level_rating(age)
+            for point, attempts, correct in rows:
+                # 由正确率反推能力分（Elo 期望公式的逆运算），正确率做平滑避免 0 和 1
+                accuracy = (correct + 1) / (attempts + 2)
+                ratings[point] = base + 400.0 * math.log10(accuracy / (1 - accuracy))
+            self._stats['seeded_users'] += 1
+        except Exception as e:
+            logger.error(f"Error seeding skill ratings for user {user_id}: {e}")
+        finally:
+            self._seeding.pop(user_id, None)
+
+    def metrics(self) -> dict:
+        """返回能力模型统计"""
+        return {
+            **self._stats,
+            'users': len(self._ratings),
+            'max_users': self.max_users,
+            'seeding': len(self._seeding)
+        }
+
+def _fetch_recent_accuracy(db: Session, user_id: int, since) -> list:
+    return db.query(
+        ProgressDaily.knowledge_point,
+        func.sum(ProgressDaily.attempts),
+        func.sum(ProgressDaily.correct)
+    ).filter(
+        ProgressDaily.user_id == user_id,
+        ProgressDaily.day >= since
+    ).group_by(ProgressDaily.knowledge_point).all()
+
+# 创建全局实例
+skill_model = SkillModel(
+    k_factor=settings.ADAPTIVE_K_FACTOR,
+    max_users=settings.ADAPTIVE_MAX_USERS
+)
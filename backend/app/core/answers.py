@@ -0,0 +1,110 @@
+import re
+from fractions import Fraction
+from typing import Optional, Union
+
+# 非整数答案的容差：相对误差 0.1%，且至少允许四舍五入到两位小数
+_RELATIVE_TOLERANCE = Fraction(1, 1000)
+_ABSOLUTE_TOLERANCE = Fraction(1, 200)
+
+# 学校常见分数的最大分母，用于识别 0.3333... 这类模型给出的分数答案
+_MAX_FRACTION_DENOMINATOR = 12
+
+_MIXED_NUMBER = re.compile(r'^([+-]?\d+)\s+(\d+)\s*/\s*(\d+)$')
+_FRACTION = re.compile(r'^([+-]?\d+)\s*/\s*(\d+)$')
+_DECIMAL = re.compile(r'^[+-]?(\d+([.,]\d*)?|[.,]\d+)$')
+
+def parse_answer(value: Union[str, int, float]) -> Optional[Fraction]:
+    """
+    把用户答案解析为精确的分数
+
+    支持整数、点或逗号小数（3.5 / 3,5）、分数（1/2）和带分数（1 1/2）。
+    无法解析时返回 None。
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return Fraction(value)
+    if isinstance(value, float):
+        if value != value or value in (float('inf'), float('-inf')):
+            return None
+        # 用十进制表示转换，避免 0.1 变成二进制近似值
+        return Fraction(repr(value))
+
+    text = str(value).strip().replace('−', '-').replace('\u00a0', ' ')
+    if not text:
+        return None
+
+    match = _MIXED_NUMBER.match(text)
+    if match:
+        whole, num, denom = (int(part) for part in match.groups())
+        if denom == 0:
+            return None
+        fraction = abs(whole) + Fraction(num, denom)
+        return -fraction if text.startswith('-') else fraction
+
+    match = _FRACTION.match(text)
+    if match:
+        num, denom = int(match.group(1)), int(match.group(2))
+        return Fraction(num, denom) if denom else None
+
+    if _DECIMAL.match(text):
+        return Fraction(text.replace(',', '.'))
+    return None
+
+def _is_terminating(value: Fraction) -> bool:
+    """分数能否写成有限小数（分母只含因子 2 和 5）"""
+    denominator = value.denominator
+    for factor in (2, 5):
+        while denominator % factor == 0:
+            denominator //= factor
+    return denominator == 1
+
+def make_answer_key(answer: Union[str, int, float]) -> dict:
+    """
+    预先计算题目答案的规范化表示
+
+    返回:
+        dict: kind 为 integer / fraction / decimal；value 为精确分数字符串，
+              tolerance 为允许的误差（整数为 0，按精确值比较）
+    """
+    value = parse_answer(answer)
+    if value is None:
+        raise ValueError(f"Invalid answer: {answer!r}")
+
+    if value.denominator == 1:
+        kind, tolerance = "integer", Fraction(0)
+    else:
+        # 模型常把 1/3 写成 0.3333，还原为最接近的常见分数
+        simple = value.limit_denominator(_MAX_FRACTION_DENOMINATOR)
+        if abs(simple - value) <= Fraction(1, 10 ** 4) and not _is_terminating(simple):
+            kind, value = "fraction", simple
+        else:
+            kind = "decimal"
+        tolerance = max(abs(value) * _RELATIVE_TOLERANCE, _ABSOLUTE_TOLERANCE)
+
+    return {
+        "kind": kind,
+        "value": str(value),
+        "tolerance": str(tolerance)
+    }
+
+def check_answer(answer_key: dict, user_answer: Union[str, int, float]) -> Optional[bool]:
+    """
+    用预计算的答案键检查用户答案
+
+    返回:
+        Optional[bool]: 是否正确；用户答案无法解析时返回 None
+    """
+    user_value = parse_answer(user_answer)
+    if user_value is None:
+        return None
+    return abs(user_value - Fraction(answer_key["value"])) <= Fraction(answer_key["tolerance"])
+
+def format_answer(answer_key: dict) -> str:
+    """把答案键格式化为反馈中显示的文本"""
+    value = Fraction(answer_key["value"])
+    if answer_key["kind"] == "integer":
+        return str(value.numerator)
+    if answer_key["kind"] == "fraction":
+        return f"{value.numerator}/{value.denominator}"
+    return f"{float(value):.4f}".rstrip('0').rstrip('.')
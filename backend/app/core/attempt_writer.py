@@ -0,0 +1,186 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy.engine import Engine
+from .config import settings
+from .database import engine as default_engine, run_in_db_executor
+from .logger import logger
+from .progress import apply_progress
+from ..models.attempt import Attempt
+from ..models.progress import ProgressDaily
+
+class AttemptWriter:
+    """
+    答题记录的异步批量写入器（write-behind）
+
+    批改接口只把记录放入有界队列，后台任务按数量或时间阈值批量 INSERT，
+    并在同一事务中累加每日进度汇总。
+    队列满时调用方最多等待 enqueue_timeout 秒（背压），仍无空位则丢弃该记录；
+    关闭时会写完队列中剩余的记录。
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_queue: int,
+        batch_size: int,
+        flush_interval: float,
+        enqueue_timeout: float
+    ):
+        self.engine = engine
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        # 队列和后台任务在 start() 中创建，绑定到运行中的事件循环
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Future] = None  # 正在进行的批量写入
+        self._pending: List[dict] = []
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'flushes': 0,
+            'dropped': 0,
+            'failed': 0,
+            'backpressure_waits': 0
+        }
+        Attempt.metadata.create_all(bind=engine, tables=[Attempt.__table__, ProgressDaily.__table__])
+
+    async def start(self) -> None:
+        """启动后台写入任务"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        logger.debug("Started attempt writer")
+
+    async def record(self, attempt: dict) -> bool:
+        """
+        提交一条答题记录
+
+        返回:
+            bool: 是否已进入写入队列
+        """
+        return await self.record_many([attempt]) == 1
+
+    async def record_many(self, attempts: List[dict]) -> int:
+        """
+        提交多条答题记录
+
+        整批最多等待一次 enqueue_timeout，超时后丢弃剩余的记录。
+
+        返回:
+            int: 进入写入队列的记录数
+        """
+        if not attempts:
+            return 0
+        if self._queue is None:
+            logger.warning(f"Attempt writer is not running, dropping {len(attempts)} attempts")
+            self._stats['dropped'] += len(attempts)
+            return 0
+
+        now = datetime.utcnow()
+        deadline = None
+        for index, attempt in enumerate(attempts):
+            attempt.setdefault('created_at', now)
+            try:
+                self._queue.put_nowait(attempt)
+            except asyncio.QueueFull:
+                # 数据库跟不上时让调用方稍等，而不是无限堆积
+                if deadline is None:
+                    self._stats['backpressure_waits'] += 1
+                    deadline = time.monotonic() + self.enqueue_timeout
+                try:
+                    await asyncio.wait_for(self._queue.put(attempt), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    dropped = len(attempts) - index
+                    self._stats['dropped'] += dropped
+                    logger.warning(f"Attempt queue is full, dropping {dropped} attempts")
+                    return index
+            self._stats['enqueued'] += 1
+        return len(attempts)
+
+    async def _run(self) -> None:
+        rows = []
+        try:
+            while True:
+                rows = [await self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                # 凑满一批或到达时间阈值后写入
+                while len(rows) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        rows.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                batch, rows = rows, []
+                # shield: 关闭时不中断已经开始的写入，由 close() 等待它完成
+                self._flushing = asyncio.ensure_future(self._flush(batch))
+                await asyncio.shield(self._flushing)
+        except asyncio.CancelledError:
+            # 已取出但还没写入的记录交给 close() 写入
+            self._pending = rows
+            raise
+
+    async def _flush(self, rows: List[dict]) -> None:
+        try:
+            await run_in_db_executor(self._insert, rows)
+            self._stats['written'] += len(rows)
+            self._stats['flushes'] += 1
+            logger.debug(f"Flushed {len(rows)} attempts")
+        except Exception as e:
+            self._stats['failed'] += len(rows)
+            logger.error(f"Error writing {len(rows)} attempts: {e}")
+
+    def _insert(self, rows: List[dict]) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(Attempt.__table__.insert(), rows)
+            apply_progress(conn, rows)
+
+    def _drain(self) -> List[dict]:
+        rows = []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        return rows
+
+    async def close(self) -> None:
+        """停止后台任务，并写完队列中剩余的记录"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+
+        rows = self._pending + self._drain()
+        self._pending = []
+        for start in range(0, len(rows), self.batch_size):
+            await self._flush(rows[start:start + self.batch_size])
+        self._queue = None
+        logger.debug(f"Stopped attempt writer, flushed {len(rows)} pending attempts")
+
+    def metrics(self) -> dict:
+        """返回队列深度和写入统计"""
+        return {
+            **self._stats,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue': self.max_queue
+        }
+
+# 创建全局实例
+attempt_writer = AttemptWriter(
+    engine=default_engine,
+    max_queue=settings.ATTEMPT_QUEUE_SIZE,
+    batch_size=settings.ATTEMPT_FLUSH_BATCH_SIZE,
+    flush_interval=settings.ATTEMPT_FLUSH_INTERVAL_SECONDS,
+    enqueue_timeout=settings.ATTEMPT_ENQUEUE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,154 @@
+from typing import Dict, List, Optional
+import numpy as np
+from .logger import logger
+
+# 运算符在题目中的显示符号（分数、小数题目前以除法形式出现）
+_OP_SYMBOLS = {
+    '+': '+',
+    '-': '-',
+    '*': '×',
+    '/': '÷',
+    'fraction': '÷',
+    'decimal': '÷'
+}
+
+_SYMBOLS = ['+', '-', '×', '÷']
+
+# 去重后数量不足时最多重抽的轮数
+_MAX_UNIQUE_ROUNDS = 8
+
+def get_difficulty_by_age(age: int) -> str:
+    """根据年龄返回难度等级"""
+    if age <= 7:
+        return "beginner"
+    elif age <= 9:
+        return "intermediate"
+    elif age <= 11:
+        return "advanced"
+    else:
+        return "expert"
+
+def get_basic_settings(age: int) -> tuple:
+    """根据年龄返回 (最大数字, 可用运算列表)"""
+    if age <= 7:  # 6-7岁
+        return (20 if age == 6 else 50), ['+', '-']  # 仅加减法
+    elif age <= 9:  # 8-9岁
+        return 100, ['+', '-', '*']  # 加入乘法
+    elif age <= 10:  # 10岁
+        return 1000, ['+', '-', '*', '/']  # 加入除法
+    else:  # 11-12岁
+        return 10000, ['+', '-', '*', '/', 'fraction', 'decimal']  # 加入分数和小数
+
+def _draw(
+    rng: np.random.Generator,
+    n: int,
+    max_num: int,
+    operations: list,
+    p: Optional[np.ndarray] = None
+) -> tuple:
+    """一次性抽取 n 道题，返回 (显示符号下标, 第一个数, 第二个数, 答案) 数组"""
+    op_index = rng.choice(len(operations), n, p=p)
+    ops = np.asarray(operations)[op_index]
+    small = min(10, max_num)
+
+    # 先按加减法抽取，再用 np.where 覆盖乘除法的操作数
+    num1 = rng.integers(1, max_num + 1, n)
+    num2 = rng.integers(1, max_num + 1, n)
+
+    is_mul = ops == '*'
+    is_div = ops == '/'
+    small1 = rng.integers(1, small + 1, n)
+    small2 = rng.integers(1, small + 1, n)
+    num1 = np.where(is_mul, small1, num1)
+    num2 = np.where(is_mul | is_div, small2, num2)
+    num1 = np.where(is_div, small2 * small1, num1)  # 确保除法结果为整数
+
+    # 减法保证结果为正数
+    is_sub = ops == '-'
+    swap = is_sub & (num1 < num2)
+    num1, num2 = np.where(swap, num2, num1), np.where(swap, num1, num2)
+
+    answers = np.select(
+        [ops == '+', is_sub, is_mul],
+        [num1 + num2, num1 - num2, num1 * num2],
+        default=num1 / num2
+    ).astype(float)
+
+    symbol_index = np.asarray([_SYMBOLS.index(_OP_SYMBOLS[op]) for op in operations])[op_index]
+    return symbol_index, num1, num2, answers
+
+def generate_basic_problems(
+    age: int,
+    count: int,
+    start_id: int = 1,
+    rng: Optional[np.random.Generator] = None,
+    weights: Optional[Dict[str, float]] = None
+) -> List[dict]:
+    """
+    批量生成基础运算题
+
+    一次向量化抽取所有操作数和运算符，并按题目文本去重。
+    题目空间不足以提供 count 道不同题目时，允许出现重复。
+
+    参数:
+        age (int): 学生年龄
+        count (int): 题目数量
+        start_id (int): 第一道题的ID
+        rng (np.random.Generator, optional): 随机数生成器
+        weights (dict, optional): 各运算的抽取权重，默认均匀抽取
+
+    返回:
+        List[dict]: 与 generate_basic_problem 相同格式的题目列表
+    """
+    if count <= 0:
+        return []
+
+    rng = rng or np.random.default_rng()
+    max_num, operations = get_basic_settings(age)
+    difficulty = get_difficulty_by_age(age)
+    base = max(max_num, 100) + 1  # 除法的被除数最大为 10 × 10
+    p = None
+    if weights:
+        p = np.asarray([weights.get(op, 1.0) for op in operations], dtype=float)
+        p /= p.sum()
+
+    symbols = np.empty(0, dtype=np.int64)
+    num1 = np.empty(0, dtype=np.int64)
+    num2 = np.empty(0, dtype=np.int64)
+    answers = np.empty(0, dtype=float)
+    first = np.empty(0, dtype=np.int64)
+    for _ in range(_MAX_UNIQUE_ROUNDS):
+        # 多抽一些，减少因重复而重抽的轮数
+        drawn = _draw(rng, count - len(first) + count // 4 + 8, max_num, operations, p)
+        symbols, num1, num2, answers = (
+            np.concatenate([old, new]) for old, new in zip((symbols, num1, num2, answers), drawn)
+        )
+
+        # 同一显示符号和操作数对应同一道题，保留每道题第一次出现的位置
+        found = len(first)
+        codes = (symbols * base + num1) * base + num2
+        _, first = np.unique(codes, return_index=True)
+        first.sort()
+        if len(first) >= count or len(first) == found:
+            # 已够数，或者题目空间已抽尽
+            break
+
+    if len(first) < count:
+        logger.debug(f"Only {len(first)} unique basic problems available for age {age}, allowing repeats")
+        repeats = np.setdiff1d(np.arange(len(codes)), first)[:count - len(first)]
+        first = np.concatenate([first, repeats])
+
+    picked = first[:count]
+    return [
+        {
+            "id": start_id + i,
+            "question": f"{a} {_SYMBOLS[symbol]} {b} = ?",
+            "answer": answer,
+            "difficulty": difficulty,
+            "age": age,
+            "type": "basic"
+        }
+        for i, (symbol, a, b, answer) in enumerate(zip(
+            symbols[picked].tolist(), num1[picked].tolist(), num2[picked].tolist(), answers[picked].tolist()
+        ))
+    ]
@@ -0,0 +1,552 @@
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import create_engine, delete, func, select, update
+from sqlalchemy.engine import Engine
+from .answers import make_answer_key
+from .config import settings
+from .database import engine as default_engine, run_in_db_executor
+from .logger import logger
+from ..models.batch import BatchProblem, ProblemBatch
+
+# 每个批次和每道题目的固定开销估算（字节）
+_BATCH_OVERHEAD = 512
+_PROBLEM_OVERHEAD = 256
+
+class _BatchEntry:
+    """单个批次的存储记录"""
+    __slots__ = ('owner', 'problems', 'graded', 'created_at', 'last_access', 'size', 'completed', 'changed')
+
+    def __init__(self, owner: str):
+        now = time.monotonic()
+        self.owner = owner
+        self.problems: Dict[str, dict] = {}
+        self.graded: Set[int] = set()  # 已记录过答题结果的题目ID
+        self.created_at = now
+        self.last_access = now
+        self.size = _BATCH_OVERHEAD
+        self.completed = False
+        self.changed: Optional[asyncio.Event] = None  # 有等待者时才创建
+
+    def notify(self) -> None:
+        """唤醒等待新题目的订阅者"""
+        if self.changed is not None:
+            self.changed.set()
+            self.changed = None
+
+class BatchStore(ABC):
+    """
+    题目批次存储接口
+
+    所有方法都是异步的，以便共享存储在不阻塞事件循环的情况下访问数据库。
+    """
+
+    @abstractmethod
+    async def create(self, batch_id: str, owner: str) -> None:
+        """创建新批次"""
+
+    @abstractmethod
+    async def exists(self, batch_id: str) -> bool:
+        """批次是否存在"""
+
+    @abstractmethod
+    async def add_problem(self, batch_id: str, problem: dict) -> Optional[int]:
+        """
+        向批次添加题目，分配题目ID，并预先计算规范化的答案键（answer_key）
+
+        返回:
+            Optional[int]: 题目ID；批次已被淘汰时返回 None
+        """
+
+    @abstractmethod
+    async def get_problem(self, batch_id: str, problem_id: int) -> Optional[dict]:
+        """获取批次中的单个题目"""
+
+    @abstractmethod
+    async def list_problems(self, batch_id: str) -> Optional[List[dict]]:
+        """按ID顺序返回批次中的所有题目；批次不存在时返回 None"""
+
+    @abstractmethod
+    async def mark_complete(self, batch_id: str) -> None:
+        """标记批次的后台生成已结束"""
+
+    @abstractmethod
+    async def mark_graded(self, batch_id: str, problem_ids: List[int]) -> List[int]:
+        """
+        把题目标记为已批改
+
+        返回:
+            List[int]: 之前没有批改过的题目ID，只有这些题目需要记录答题结果
+        """
+
+    @abstractmethod
+    async def wait_for_problems(
+        self,
+        batch_id: str,
+        after_id: int,
+        timeout: float
+    ) -> Optional[Tuple[List[dict], bool]]:
+        """
+        等待批次中出现ID大于 after_id 的题目
+
+        参数:
+            batch_id (str): 批次ID
+            after_id (int): 已收到的最大题目ID
+            timeout (float): 最长等待时间（秒）
+
+        返回:
+            Optional[Tuple[List[dict], bool]]: (新题目列表, 是否已完成)；批次不存在时返回 None
+        """
+
+    @abstractmethod
+    async def metrics(self) -> dict:
+        """返回批次存储状态和淘汰计数"""
+
+class InMemoryBatchStore(BatchStore):
+    """
+    进程内题目批次存储
+
+    按最近访问顺序（LRU）保存批次，并按以下条件淘汰：
+    - 空闲超过 TTL 的批次
+    - 批次总数超过上限
+    - 估算内存超过预算
+    - 单个用户的批次数超过上限
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_batches: int,
+        max_bytes: int,
+        max_per_user: int
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_batches = max_batches
+        self.max_bytes = max_bytes
+        self.max_per_user = max_per_user
+        self._batches: "OrderedDict[str, _BatchEntry]" = OrderedDict()
+        self._user_batches: Dict[str, "OrderedDict[str, None]"] = {}
+        self._total_bytes = 0
+        self._evictions = {
+            'expired': 0,
+            'lru': 0,
+            'memory': 0,
+            'per_user': 0
+        }
+
+    async def create(self, batch_id: str, owner: str) -> None:
+        self._expire()
+
+        # 单用户批次上限，淘汰该用户最旧的批次
+        user_batches = self._user_batches.get(owner)
+        while user_batches and len(user_batches) >= self.max_per_user:
+            self._evict(next(iter(user_batches)), 'per_user')
+
+        entry = _BatchEntry(owner)
+        self._batches[batch_id] = entry
+        self._user_batches.setdefault(owner, OrderedDict())[batch_id] = None
+        self._total_bytes += entry.size
+
+        # 全局批次数量上限
+        while len(self._batches) > self.max_batches:
+            self._evict(next(iter(self._batches)), 'lru')
+
+    async def exists(self, batch_id: str) -> bool:
+        # 不刷新访问时间
+        entry = self._batches.get(batch_id)
+        return entry is not None and not self._is_expired(entry)
+
+    async def add_problem(self, batch_id: str, problem: dict) -> Optional[int]:
+        entry = self._touch(batch_id)
+        if entry is None:
+            return None
+        problem.setdefault('answer_key', make_answer_key(problem['answer']))
+
+        problem_id = len(entry.problems) + 1
+        problem['id'] = problem_id
+        problem['batch_id'] = batch_id
+        entry.problems[str(problem_id)] = problem.copy()
+
+        size = _PROBLEM_OVERHEAD + len(json.dumps(problem, default=str))
+        entry.size += size
+        self._total_bytes += size
+        self._enforce_memory_budget(keep=batch_id)
+        entry.notify()
+        return problem_id
+
+    async def get_problem(self, batch_id: str, problem_id: int) -> Optional[dict]:
+        entry = self._touch(batch_id)
+        if entry is None:
+            return None
+        return entry.problems.get(str(problem_id))
+
+    async def list_problems(self, batch_id: str) -> Optional[List[dict]]:
+        entry = self._touch(batch_id)
+        if entry is None:
+            return None
+        return sorted(entry.problems.values(), key=lambda p: p['id'])
+
+    async def mark_complete(self, batch_id: str) -> None:
+        entry = self._batches.get(batch_id)
+        if entry is not None:
+            entry.completed = True
+            entry.notify()
+
+    async def mark_graded(self, batch_id: str, problem_ids: List[int]) -> List[int]:
+        entry = self._touch(batch_id)
+        if entry is None:
+            return []
+        new_ids = [
+            problem_id for problem_id in dict.fromkeys(problem_ids)
+            if str(problem_id) in entry.problems and problem_id not in entry.graded
+        ]
+        entry.graded.update(new_ids)
+        return new_ids
+
+    async def wait_for_problems(
+        self,
+        batch_id: str,
+        after_id: int,
+        timeout: float
+    ) -> Optional[Tuple[List[dict], bool]]:
+        entry = self._touch(batch_id)
+        if entry is None:
+            return None
+
+        if len(entry.problems) <= after_id and not entry.completed:
+            if entry.changed is None:
+                entry.changed = asyncio.Event()
+            try:
+                await asyncio.wait_for(entry.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            # 等待期间批次可能已被淘汰
+            entry = self._touch(batch_id)
+            if entry is None:
+                return None
+
+        # 题目ID从1开始连续分配
+        problems = [entry.problems[str(i)] for i in range(after_id + 1, len(entry.problems) + 1)]
+        return problems, entry.completed
+
+    def _touch(self, batch_id: str) -> Optional[_BatchEntry]:
+        """获取批次并刷新LRU位置"""
+        entry = self._batches.get(batch_id)
+        if entry is None:
+            return None
+        if self._is_expired(entry):
+            self._evict(batch_id, 'expired')
+            return None
+        entry.last_access = time.monotonic()
+        self._batches.move_to_end(batch_id)
+        return entry
+
+    def _is_expired(self, entry: _BatchEntry) -> bool:
+        return time.monotonic() - entry.last_access > self.ttl_seconds
+
+    def _expire(self) -> None:
+        """清理过期批次（LRU顺序下过期批次都在最前面）"""
+        while self._batches:
+            batch_id, entry = next(iter(self._batches.items()))
+            if not self._is_expired(entry):
+                break
+            self._evict(batch_id, 'expired')
+
+    def _enforce_memory_budget(self, keep: str) -> None:
+        """超出内存预算时按LRU顺序淘汰，不淘汰正在写入的批次"""
+        for batch_id in list(self._batches):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if batch_id != keep:
+                self._evict(batch_id, 'memory')
+
+    def _evict(self, batch_id: str, reason: str) -> None:
+        entry = self._batches.pop(batch_id, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry.size
+        user_batches = self._user_batches.get(entry.owner)
+        if user_batches is not None:
+            user_batches.pop(batch_id, None)
+            if not user_batches:
+                del self._user_batches[entry.owner]
+        self._evictions[reason] += 1
+        entry.notify()
+        logger.debug(f"Evicted batch {batch_id} ({reason})")
+
+    async def metrics(self) -> dict:
+        return {
+            'backend': 'memory',
+            'batches': len(self._batches),
+            'users': len(self._user_batches),
+            'estimated_bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': dict(self._evictions)
+        }
+
+class DatabaseBatchStore(BatchStore):
+    """
+    基于数据库的共享题目批次存储
+
+    多个 uvicorn worker 或多个后端实例共享同一张表，
+    后续请求落到任意进程都能找到批次。数据库操作在数据库线程池中执行。
+    """
+
+    # 访问时间的刷新间隔，避免每次读取都写数据库
+    _TOUCH_INTERVAL = timedelta(seconds=60)
+    # 等待新题目时的轮询间隔（其他进程写入的题目无法直接通知）
+    _POLL_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        engine: Engine,
+        ttl_seconds: float,
+        max_batches: int,
+        max_per_user: int
+    ):
+        self.engine = engine
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_batches = max_batches
+        self.max_per_user = max_per_user
+        self._evictions = {
+            'expired': 0,
+            'lru': 0,
+            'per_user': 0
+        }
+        ProblemBatch.metadata.create_all(
+            bind=engine,
+            tables=[ProblemBatch.__table__, BatchProblem.__table__]
+        )
+
+    async def create(self, batch_id: str, owner: str) -> None:
+        await run_in_db_executor(self._create, batch_id, owner)
+
+    async def exists(self, batch_id: str) -> bool:
+        return await run_in_db_executor(self._exists, batch_id)
+
+    async def add_problem(self, batch_id: str, problem: dict) -> Optional[int]:
+        problem.setdefault('answer_key', make_answer_key(problem['answer']))
+        return await run_in_db_executor(self._add_problem, batch_id, problem)
+
+    async def get_problem(self, batch_id: str, problem_id: int) -> Optional[dict]:
+        return await run_in_db_executor(self._get_problem, batch_id, problem_id)
+
+    async def list_problems(self, batch_id: str) -> Optional[List[dict]]:
+        return await run_in_db_executor(self._list_problems, batch_id)
+
+    async def mark_complete(self, batch_id: str) -> None:
+        await run_in_db_executor(self._mark_complete, batch_id)
+
+    async def mark_graded(self, batch_id: str, problem_ids: List[int]) -> List[int]:
+        if not problem_ids:
+            return []
+        return await run_in_db_executor(self._mark_graded, batch_id, problem_ids)
+
+    async def wait_for_problems(
+        self,
+        batch_id: str,
+        after_id: int,
+        timeout: float
+    ) -> Optional[Tuple[List[dict], bool]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            result = await run_in_db_executor(self._problems_after, batch_id, after_id)
+            if result is None or result[0] or result[1]:
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return result
+            await asyncio.sleep(min(self._POLL_INTERVAL, remaining))
+
+    async def metrics(self) -> dict:
+        return await run_in_db_executor(self._metrics)
+
+    def _create(self, batch_id: str, owner: str) -> None:
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            # 清理过期批次
+            expired = conn.execute(
+                select(ProblemBatch.batch_id).where(ProblemBatch.last_access < now - self.ttl)
+            ).scalars().all()
+            self._delete_batches(conn, expired, 'expired')
+
+            # 单用户批次上限
+            user_batches = conn.execute(
+                select(ProblemBatch.batch_id)
+                .where(ProblemBatch.owner == owner)
+                .order_by(ProblemBatch.last_access.desc())
+            ).scalars().all()
+            self._delete_batches(conn, user_batches[self.max_per_user - 1:], 'per_user')
+
+            # 全局批次数量上限
+            total = conn.execute(select(func.count()).select_from(ProblemBatch)).scalar()
+            if total >= self.max_batches:
+                oldest = conn.execute(
+                    select(ProblemBatch.batch_id)
+                    .order_by(ProblemBatch.last_access)
+                    .limit(total - self.max_batches + 1)
+                ).scalars().all()
+                self._delete_batches(conn, oldest, 'lru')
+
+            conn.execute(ProblemBatch.__table__.insert().values(
+                batch_id=batch_id,
+                owner=owner,
+                problem_count=0,
+                completed=False,
+                created_at=now,
+                last_access=now
+            ))
+
+    def _exists(self, batch_id: str) -> bool:
+        with self.engine.connect() as conn:
+            last_access = conn.execute(
+                select(ProblemBatch.last_access).where(ProblemBatch.batch_id == batch_id)
+            ).scalar()
+        return last_access is not None and datetime.utcnow() - last_access <= self.ttl
+
+    def _add_problem(self, batch_id: str, problem: dict) -> Optional[int]:
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            # 原子地分配题目ID，多个进程同时写入同一批次也不会冲突
+            problem_id = conn.execute(
+                update(ProblemBatch)
+                .where(ProblemBatch.batch_id == batch_id)
+                .where(ProblemBatch.last_access >= now - self.ttl)
+                .values(problem_count=ProblemBatch.problem_count + 1, last_access=now)
+                .returning(ProblemBatch.problem_count)
+            ).scalar()
+            if problem_id is None:
+                return None
+
+            problem['id'] = problem_id
+            problem['batch_id'] = batch_id
+            conn.execute(BatchProblem.__table__.insert().values(
+                batch_id=batch_id,
+                problem_id=problem_id,
+                data=json.dumps(problem, default=str)
+            ))
+        return problem_id
+
+    def _get_problem(self, batch_id: str, problem_id: int) -> Optional[dict]:
+        with self.engine.begin() as conn:
+            if not self._touch(conn, batch_id):
+                return None
+            data = conn.execute(
+                select(BatchProblem.data)
+                .where(BatchProblem.batch_id == batch_id)
+                .where(BatchProblem.problem_id == problem_id)
+            ).scalar()
+        return json.loads(data) if data is not None else None
+
+    def _list_problems(self, batch_id: str) -> Optional[List[dict]]:
+        with self.engine.begin() as conn:
+            if not self._touch(conn, batch_id):
+                return None
+            rows = conn.execute(
+                select(BatchProblem.data)
+                .where(BatchProblem.batch_id == batch_id)
+                .order_by(BatchProblem.problem_id)
+            ).scalars().all()
+        return [json.loads(data) for data in rows]
+
+    def _mark_complete(self, batch_id: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(ProblemBatch)
+                .where(ProblemBatch.batch_id == batch_id)
+                .values(completed=True)
+            )
+
+    def _mark_graded(self, batch_id: str, problem_ids: List[int]) -> List[int]:
+        with self.engine.begin() as conn:
+            if not self._touch(conn, batch_id):
+                return []
+            # 条件更新是原子的，多个进程同时批改同一道题时只有一个会拿到它
+            graded = conn.execute(
+                update(BatchProblem)
+                .where(BatchProblem.batch_id == batch_id)
+                .where(BatchProblem.problem_id.in_(problem_ids))
+                .where(BatchProblem.graded.is_(False))
+                .values(graded=True)
+                .returning(BatchProblem.problem_id)
+            ).scalars().all()
+        return sorted(graded)
+
+    def _problems_after(self, batch_id: str, after_id: int) -> Optional[Tuple[List[dict], bool]]:
+        with self.engine.begin() as conn:
+            if not self._touch(conn, batch_id):
+                return None
+            completed = conn.execute(
+                select(ProblemBatch.completed).where(ProblemBatch.batch_id == batch_id)
+            ).scalar()
+            rows = conn.execute(
+                select(BatchProblem.data)
+                .where(BatchProblem.batch_id == batch_id)
+                .where(BatchProblem.problem_id > after_id)
+                .order_by(BatchProblem.problem_id)
+            ).scalars().all()
+        return [json.loads(data) for data in rows], bool(completed)
+
+    def _touch(self, conn, batch_id: str) -> bool:
+        """检查批次是否有效，并按间隔刷新访问时间"""
+        now = datetime.utcnow()
+        last_access = conn.execute(
+            select(ProblemBatch.last_access).where(ProblemBatch.batch_id == batch_id)
+        ).scalar()
+        if last_access is None or now - last_access > self.ttl:
+            return False
+        if now - last_access > self._TOUCH_INTERVAL:
+            conn.execute(
+                update(ProblemBatch)
+                .where(ProblemBatch.batch_id == batch_id)
+                .values(last_access=now)
+            )
+        return True
+
+    def _delete_batches(self, conn, batch_ids: List[str], reason: str) -> None:
+        if not batch_ids:
+            return
+        conn.execute(delete(BatchProblem).where(BatchProblem.batch_id.in_(batch_ids)))
+        conn.execute(delete(ProblemBatch).where(ProblemBatch.batch_id.in_(batch_ids)))
+        self._evictions[reason] += len(batch_ids)
+        logger.debug(f"Evicted {len(batch_ids)} batches ({reason})")
+
+    def _metrics(self) -> dict:
+        with self.engine.connect() as conn:
+            batches = conn.execute(select(func.count()).select_from(ProblemBatch)).scalar()
+            users = conn.execute(select(func.count(func.distinct(ProblemBatch.owner)))).scalar()
+        return {
+            'backend': 'database',
+            'batches': batches,
+            'users': users,
+            'evictions': dict(self._evictions)
+        }
+
+def create_batch_store() -> BatchStore:
+    """根据配置创建批次存储"""
+    backend = settings.BATCH_STORE_BACKEND.lower()
+    if backend == 'memory':
+        return InMemoryBatchStore(
+            ttl_seconds=settings.BATCH_STORE_TTL_SECONDS,
+            max_batches=settings.BATCH_STORE_MAX_BATCHES,
+            max_bytes=settings.BATCH_STORE_MAX_BYTES,
+            max_per_user=settings.BATCH_STORE_MAX_PER_USER
+        )
+    if backend == 'database':
+        if settings.BATCH_STORE_DATABASE_URL:
+            # 独立的存储库（例如本地测试用的 sqlite 文件）
+            engine = create_engine(settings.BATCH_STORE_DATABASE_URL, pool_pre_ping=True)
+        else:
+            engine = default_engine
+        logger.info("Using database batch store")
+        return DatabaseBatchStore(
+            engine,
+            ttl_seconds=settings.BATCH_STORE_TTL_SECONDS,
+            max_batches=settings.BATCH_STORE_MAX_BATCHES,
+            max_per_user=settings.BATCH_STORE_MAX_PER_USER
+        )
+    raise ValueError(f"Unknown BATCH_STORE_BACKEND: {settings.BATCH_STORE_BACKEND}")
@@ -4,12 +4,22 @@ from typing import List
 class Settings(BaseSettings):
     # Database Settings
     DATABASE_URL: str
+    DB_MAX_CONNECTIONS: int = 15  # 所有 worker 合计的最大连接数，按 WEB_CONCURRENCY 平分（单 worker 时为 5 常驻 + 10 溢出）
+    DB_POOL_SIZE: int = 5  # 每个 worker 的常驻连接数，不超过每个 worker 分到的连接数；0 表示取一半
+    DB_ECHO: bool = False  # 输出SQL日志
+
+    # Server Settings
+    WEB_CONCURRENCY: int = 1  # uvicorn worker 数（与 uvicorn 使用同一环境变量）
 
     # JWT Settings
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
 
+    # Password Hashing Settings
+    BCRYPT_ROUNDS: int = 12  # bcrypt 成本，修改后旧密码在登录时自动重新哈希
+    PASSWORD_HASH_WORKERS: int = 4  # 密码哈希线程池大小
+
     # CORS Settings
     CORS_ORIGINS: str
 
@@ -17,6 +27,91 @@ class Settings(BaseSettings):
     GROK_API_KEY: str
     GROK_API_BASE: str
 
+    # Grok Client Settings
+    GROK_POOL_SIZE: int = 100  # 连接池总连接数
+    GROK_POOL_PER_HOST: int = 20  # 单个主机最大连接数
+    GROK_DNS_CACHE_TTL: int = 300  # DNS缓存时间（秒）
+    GROK_KEEPALIVE_TIMEOUT: float = 30.0  # 空闲连接保持时间（秒）
+    GROK_REQUEST_TIMEOUT: float = 30.0  # 单次请求超时时间（秒）
+    GROK_MAX_CONCURRENCY: int = 8  # 同时进行的上游请求上限
+    GROK_MAX_QUEUE_SIZE: int = 200  # 等待队列长度上限
+    GROK_STREAMING: bool = True  # 补充批次题目时使用流式返回
+    GROK_STREAM_READ_TIMEOUT: float = 15.0  # 流式响应两个数据块之间的最长间隔（秒），整体时间由截止时间限制
+    GROK_MAX_RETRIES: int = 2  # 超时、连接错误、429 和 5xx 的最大重试次数
+    GROK_RETRY_BASE_DELAY: float = 0.5  # 重试退避基数（秒），实际等待时间随机抖动
+    GROK_BREAKER_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断
+    GROK_BREAKER_RECOVERY_SECONDS: float = 30.0  # 熔断后多久放行一个试探请求
+    GROK_HEDGE_ENABLED: bool = True  # 交互请求超过近期 p95 延迟时再发一个对冲请求
+    GROK_HEDGE_MIN_DELAY: float = 1.0  # 发送对冲请求前的最短等待时间（秒）
+    GROK_PRICE_INPUT_PER_MILLION: float = 5.0  # 每百万输入 token 的价格（美元），用于估算费用
+    GROK_PRICE_OUTPUT_PER_MILLION: float = 15.0  # 每百万输出 token 的价格（美元）
+
+    # Word Problem Pool Settings
+    WORD_POOL_LOW_WATER: int = 10  # 低于此数量时后台补充
+    WORD_POOL_HIGH_WATER: int = 30  # 补充到此数量
+    WORD_POOL_REFILL_BATCH: int = 10  # 单次向 Grok 请求的题目数
+    WORD_POOL_MAX_KEYS: int = 64  # 最多保留的 (年龄, 规则) 组合数
+    WORD_POOL_WARM_ON_STARTUP: bool = True  # 启动时预热题池
+
+    # Word Problem Batching Settings
+    WORD_BATCH_WINDOW_SECONDS: float = 0.2  # 合并相同年龄和规则的应用题需求的时间窗口（秒）
+    WORD_BATCH_MAX_PROBLEMS: int = 40  # 合并后单次生成的最大题数
+
+    # Word Problem Template Settings
+    WORD_TEMPLATES_ENABLED: bool = True  # 用本地模板补齐首屏应用题，并在 Grok 超时或不可用时兜底
+    WORD_PROBLEM_DEADLINE_SECONDS: float = 20.0  # 等待 Grok 生成剩余应用题的最长时间（秒）
+
+    # Batch Store Settings
+    BATCH_STORE_BACKEND: str = "memory"  # memory（单进程）或 database（多进程共享）
+    BATCH_STORE_DATABASE_URL: str = ""  # database 模式下的独立数据库，留空则使用 DATABASE_URL
+    BATCH_STORE_TTL_SECONDS: int = 7200  # 批次空闲过期时间（秒）
+    BATCH_STORE_MAX_BATCHES: int = 10000  # 最多保留的批次数
+    BATCH_STORE_MAX_BYTES: int = 64 * 1024 * 1024  # 批次存储内存预算（字节，仅 memory 模式）
+    BATCH_STORE_MAX_PER_USER: int = 5  # 每个用户最多保留的批次数
+
+    # Explanation Cache Settings
+    EXPLANATION_CACHE_MAX_ENTRIES: int = 5000  # 内存中最多缓存的解释数
+    EXPLANATION_CACHE_TTL_SECONDS: int = 30 * 24 * 3600  # 缓存有效期（秒）
+    EXPLANATION_CACHE_PERSIST: bool = True  # 是否同时写入数据库
+    EXPLANATION_DEADLINE_SECONDS: float = 10.0  # 等待 Grok 生成解释的最长时间（秒）
+
+    # Verified Token Cache Settings
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000  # 最多缓存的令牌数
+    TOKEN_CACHE_TTL_SECONDS: float = 300.0  # 缓存有效期上限（秒），0 表示不缓存
+
+    # Authenticated User Cache Settings
+    USER_CACHE_MAX_ENTRIES: int = 10000  # 最多缓存的用户数
+    USER_CACHE_TTL_SECONDS: float = 60.0  # 缓存有效期（秒），0 表示不缓存
+
+    # Problem Dedup Settings
+    DEDUP_HISTORY_SIZE: int = 1000  # 每个用户至少记住的最近题目数
+    DEDUP_FALSE_POSITIVE_RATE: float = 0.01  # 布隆过滤器误判率
+    DEDUP_MAX_USERS: int = 10000  # 最多保留历史的用户数
+
+    # Problem Stream Settings
+    PROBLEM_STREAM_KEEPALIVE_SECONDS: float = 15.0  # 无新题目时发送心跳的间隔
+    PROBLEM_STREAM_MAX_SECONDS: float = 300.0  # 单个推送连接的最长时间
+
+    # Bulk Answer Check Settings
+    BULK_CHECK_MAX_ANSWERS: int = 500  # 单次批量批改的最大答案数
+
+    # Attempt Write-Behind Settings
+    ATTEMPT_QUEUE_SIZE: int = 10000  # 待写入答题记录的队列上限
+    ATTEMPT_FLUSH_BATCH_SIZE: int = 500  # 每次批量写入的最大记录数
+    ATTEMPT_FLUSH_INTERVAL_SECONDS: float = 2.0  # 记录在队列中最长等待时间
+    ATTEMPT_ENQUEUE_TIMEOUT_SECONDS: float = 0.5  # 队列满时调用方最长等待时间
+
+    # Adaptive Difficulty Settings
+    ADAPTIVE_ENABLED: bool = True  # 按学生能力调整出题难度
+    ADAPTIVE_K_FACTOR: float = 32.0  # Elo 更新步长
+    ADAPTIVE_MAX_USERS: int = 10000  # 内存中最多保留能力分的学生数
+    ADAPTIVE_SEED_WEEKS: int = 4  # 首次初始化能力分时读取的进度周数
+
+    # Worksheet Export Settings
+    WORKSHEET_MAX_PROBLEMS: int = 5000  # 单个题单的最大题数
+    WORKSHEET_CHUNK_SIZE: int = 500  # 每次生成并输出的题数
+    WORKSHEET_POOL_MAX_PROBLEMS: int = 20  # 自定义规则的题单最多从应用题池取的题数
+
     # Logging Settings
     LOG_LEVEL: str
     LOG_FILE: str
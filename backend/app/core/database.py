@@ -1,21 +1,34 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from ..core.config import settings
 from ..core.logger import logger
 from ..models.user import Base  # 导入 Base
+from ..models import progress  # noqa: F401 注册进度汇总和家长关联表
+
+T = TypeVar("T")
 
 # 数据库连接配置
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
+# 按 worker 数平分连接：所有 worker 的连接总数不超过 DB_MAX_CONNECTIONS，
+# 每个 worker 至少 2 个连接
+DB_CONNECTIONS_PER_WORKER = max(2, settings.DB_MAX_CONNECTIONS // max(1, settings.WEB_CONCURRENCY))
+DB_POOL_SIZE = min(settings.DB_POOL_SIZE or max(1, DB_CONNECTIONS_PER_WORKER // 2), DB_CONNECTIONS_PER_WORKER)
+DB_MAX_OVERFLOW = max(0, DB_CONNECTIONS_PER_WORKER - DB_POOL_SIZE)
+
 # 创建数据库引擎
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_size=5,  # 连接池大小
-    max_overflow=10,  # 最大溢出连接数
+    pool_size=DB_POOL_SIZE,  # 连接池大小
+    max_overflow=DB_MAX_OVERFLOW,  # 最大溢出连接数
     pool_timeout=30,  # 连接超时时间
     pool_recycle=1800,  # 连接回收时间
-    echo=True  # 临时开启SQL日志
+    pool_pre_ping=True,  # 使用前检查连接是否可用
+    echo=settings.DB_ECHO  # SQL日志
 )
 
 try:
@@ -29,10 +42,46 @@ except Exception as e:
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 同步数据库操作的专用线程池，线程数与每个 worker 的连接上限一致，
+# 避免线程在连接池上排队
+_db_executor = ThreadPoolExecutor(
+    max_workers=DB_CONNECTIONS_PER_WORKER,
+    thread_name_prefix="db"
+)
+
+logger.debug(
+    f"Database pool: size={DB_POOL_SIZE}, overflow={DB_MAX_OVERFLOW}, "
+    f"executor_threads={DB_CONNECTIONS_PER_WORKER}"
+)
+
 # 获取数据库会话
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def run_in_db_executor(func: Callable[..., T], *args: Any) -> T:
+    """在数据库线程池中执行同步函数，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, func, *args)
+
+def _run_with_session(func: Callable[..., T], args: tuple) -> T:
+    db = SessionLocal()
+    try:
+        return func(db, *args)
+    finally:
+        db.close()
+
+async def run_in_db(func: Callable[..., T], *args: Any) -> T:
+    """
+    在数据库线程池中以独立会话执行 func(db, *args)
+
+    返回的 ORM 对象已与会话分离，只能读取已加载的属性。
+    """
+    return await run_in_db_executor(_run_with_session, func, args)
+
+def shutdown_db_executor() -> None:
+    """关闭数据库线程池（在应用关闭时调用）"""
+    _db_executor.shutdown(wait=True)
@@ -0,0 +1,182 @@
+import hashlib
+import math
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from .config import settings
+
+def question_hash(question: str) -> bytes:
+    """
+    计算题目文本的稳定哈希
+
+    与内置 hash() 不同，结果不随进程变化，可以跨 worker 比较。
+    """
+    normalized = re.sub(r'\s+', ' ', unicodedata.normalize('NFC', question)).strip().lower()
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+class RollingBloomFilter:
+    """
+    滚动布隆过滤器
+
+    保留两代位数组：当前代写满 capacity 个元素后变为上一代，旧的上一代被丢弃。
+    因此总能记住最近 capacity 到 2 × capacity 个元素，内存固定。
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._current = bytearray((self.num_bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._count = 0
+
+    def _positions(self, digest: bytes) -> List[int]:
+        # 双重哈希：由两个 64 位整数派生 k 个位置
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    @staticmethod
+    def _test(bits: bytearray, positions: List[int]) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def __contains__(self, digest: bytes) -> bool:
+        positions = self._positions(digest)
+        return self._test(self._current, positions) or self._test(self._previous, positions)
+
+    def add(self, digest: bytes) -> None:
+        positions = self._positions(digest)
+        if self._test(self._current, positions):
+            return
+        if self._count >= self.capacity:
+            self._previous = self._current
+            self._current = bytearray(len(self._previous))
+            self._count = 0
+        for p in positions:
+            self._current[p >> 3] |= 1 << (p & 7)
+        self._count += 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._current) + len(self._previous)
+
+class ProblemHistory:
+    """
+    每个用户最近做过的题目
+
+    每个用户一个滚动布隆过滤器，用户数超过上限时淘汰最久未活动的用户。
+    存在少量误判（把没做过的题当成做过），但不会漏判最近的题。
+    """
+
+    def __init__(self, max_users: int, capacity: int, error_rate: float):
+        self.max_users = max_users
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filters: "OrderedDict[str, RollingBloomFilter]" = OrderedDict()
+        self._stats = {
+            'checks': 0,
+            'repeats': 0,
+            'recorded': 0,
+            'evicted_users': 0
+        }
+
+    def seen(self, username: str, digest: bytes) -> bool:
+        """判断用户最近是否做过这道题"""
+        self._stats['checks'] += 1
+        bloom = self._filters.get(username)
+        if bloom is None or digest not in bloom:
+            return False
+        self._stats['repeats'] += 1
+        return True
+
+    def add(self, username: str, digests: Iterable[bytes]) -> None:
+        """记录用户做过的题目"""
+        bloom = self._filters.get(username)
+        if bloom is None:
+            bloom = RollingBloomFilter(self.capacity, self.error_rate)
+            self._filters[username] = bloom
+            while len(self._filters) > self.max_users:
+                self._filters.popitem(last=False)
+                self._stats['evicted_users'] += 1
+        else:
+            self._filters.move_to_end(username)
+        for digest in digests:
+            bloom.add(digest)
+            self._stats['recorded'] += 1
+
+    def metrics(self) -> dict:
+        """返回去重统计和内存占用"""
+        return {
+            **self._stats,
+            'users': len(self._filters),
+            'max_users': self.max_users,
+            'bytes': sum(bloom.nbytes for bloom in self._filters.values())
+        }
+
+class ProblemDeduplicator:
+    """
+    单个批次的去重器
+
+    保证批次内题目不重复，并尽量避开用户最近做过的题。
+    """
+
+    def __init__(self, history: ProblemHistory, username: Optional[str]):
+        self._history = history
+        self.username = username
+        self._batch: set = set()
+
+    def is_new(self, problem: dict) -> bool:
+        """题目既不在本批次中，也不是用户最近做过的题"""
+        digest = question_hash(problem['question'])
+        if digest in self._batch:
+            return False
+        return self.username is None or not self._history.seen(self.username, digest)
+
+    def add(self, problem: dict) -> None:
+        """把题目加入本批次并记入用户历史"""
+        digest = question_hash(problem['question'])
+        self._batch.add(digest)
+        if self.username is not None:
+            self._history.add(self.username, [digest])
+
+    def claim(self, problem: dict) -> bool:
+        """题目是新题时加入本批次并返回 True"""
+        if not self.is_new(problem):
+            return False
+        self.add(problem)
+        return True
+
+    def select(self, problems: List[dict], count: int) -> List[dict]:
+        """
+        从候选题目中选出最多 count 道并加入本批次
+
+        优先选用户没做过的题；不够时允许用户做过的题，但批次内始终不重复。
+        """
+        fresh, repeats = [], []
+        for problem in problems:
+            digest = question_hash(problem['question'])
+            if digest in self._batch:
+                continue
+            if self.username is not None and self._history.seen(self.username, digest):
+                repeats.append(problem)
+            else:
+                fresh.append(problem)
+
+        selected = []
+        for problem in fresh + repeats:
+            if len(selected) >= count:
+                break
+            # 候选列表自身可能含有重复题目
+            if question_hash(problem['question']) in self._batch:
+                continue
+            self.add(problem)
+            selected.append(problem)
+        return selected
+
+# 创建全局实例
+problem_history = ProblemHistory(
+    max_users=settings.DEDUP_MAX_USERS,
+    capacity=settings.DEDUP_HISTORY_SIZE,
+    error_rate=settings.DEDUP_FALSE_POSITIVE_RATE
+)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import delete
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from .database import run_in_db_executor
+from .logger import logger
+from ..models.cache import ExplanationCacheEntry
+
+def make_explanation_key(question: str, answer: float, problem_type: str, age: int) -> str:
+    """
+    生成解释缓存键
+
+    对题目文本做 Unicode 规范化、转小写并合并空白，
+    答案统一格式化，避免同一道题因格式差异而重复请求。
+    """
+    normalized_question = re.sub(r'\s+', ' ', unicodedata.normalize('NFC', question)).strip().lower()
+    normalized = json.dumps(
+        [normalized_question, f"{float(answer):.6g}", problem_type.strip().lower(), int(age)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+class ExplanationCache:
+    """
+    两级题目解释缓存
+
+    第一级为进程内 LRU，第二级为数据库表（可选），
+    数据库命中后会回填到内存。两级都按 TTL 过期；
+    数据库中过期的行在读到时删除，其余的在写入时按 _PURGE_INTERVAL 批量清理。
+    """
+
+    # 批量清理数据库中过期行的间隔（秒）
+    _PURGE_INTERVAL = 3600
+
+    def __init__(self, max_entries: int, ttl_seconds: float, engine: Optional[Engine] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (过期时间, 解释)
+        self._session_factory = None
+        if engine is not None:
+            ExplanationCacheEntry.metadata.create_all(
+                bind=engine,
+                tables=[ExplanationCacheEntry.__table__]
+            )
+            self._session_factory = sessionmaker(bind=engine)
+        self._next_purge = 0.0
+        self._stats = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'expired': 0,
+            'purged': 0,
+            'errors': 0
+        }
+
+    async def get(self, key: str) -> Optional[dict]:
+        """查询缓存，未命中时返回 None"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, explanation = entry
+            if expires_at > time.monotonic():
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return explanation
+            del self._memory[key]
+            self._stats['expired'] += 1
+
+        if self._session_factory is not None:
+            try:
+                explanation, expired = await run_in_db_executor(self._load, key)
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"Error reading explanation cache: {e}")
+                explanation, expired = None, False
+            if expired:
+                self._stats['expired'] += 1
+            if explanation is not None:
+                self._remember(key, explanation)
+                self._stats['persistent_hits'] += 1
+                return explanation
+
+        self._stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, explanation: dict) -> None:
+        """写入缓存"""
+        self._remember(key, explanation)
+        self._stats['stores'] += 1
+        if self._session_factory is not None:
+            purge = time.monotonic() >= self._next_purge
+            if purge:
+                self._next_purge = time.monotonic() + self._PURGE_INTERVAL
+            try:
+                purged = await run_in_db_executor(self._save, key, explanation, purge)
+                self._stats['purged'] += purged
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"Error writing explanation cache: {e}")
+
+    def _remember(self, key: str, explanation: dict) -> None:
+        self._memory[key] = (time.monotonic() + self.ttl_seconds, explanation)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str) -> Tuple[Optional[dict], bool]:
+        """在数据库线程中读取，返回 (解释, 是否已过期)；统计由事件循环线程更新"""
+        db = self._session_factory()
+        try:
+            entry = db.get(ExplanationCacheEntry, key)
+            if entry is None:
+                return None, False
+            if datetime.utcnow() - entry.created_at > timedelta(seconds=self.ttl_seconds):
+                db.delete(entry)
+                db.commit()
+                return None, True
+            return json.loads(entry.payload), False
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _save(self, key: str, explanation: dict, purge: bool) -> int:
+        """写入一条解释，purge 为 True 时同时删除所有过期行，返回删除的行数"""
+        db = self._session_factory()
+        try:
+            now = datetime.utcnow()
+            db.merge(ExplanationCacheEntry(
+                key=key,
+                payload=json.dumps(explanation, ensure_ascii=False),
+                created_at=now
+            ))
+            purged = 0
+            if purge:
+                purged = db.execute(
+                    delete(ExplanationCacheEntry)
+                    .where(ExplanationCacheEntry.created_at < now - timedelta(seconds=self.ttl_seconds))
+                ).rowcount
+            db.commit()
+            return purged
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def metrics(self) -> dict:
+        """返回缓存命中统计"""
+        hits = self._stats['memory_hits'] + self._stats['persistent_hits']
+        lookups = hits + self._stats['misses']
+        return {
+            **self._stats,
+            'memory_entries': len(self._memory),
+            'persistent': self._session_factory is not None,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+        }
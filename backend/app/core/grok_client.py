@@ -1,8 +1,21 @@
 import os
 from dotenv import load_dotenv
 import aiohttp
+import asyncio
+import functools
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from .config import settings
+from .llm_usage import UsageTracker
 
 # 加载环境变量
 load_dotenv()
@@ -11,6 +24,355 @@ load_dotenv()
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+class RequestPriority(IntEnum):
+    """Grok 请求优先级，数值越小越优先"""
+    INTERACTIVE = 0  # 用户正在等待的请求（如题目解释）
+    BACKGROUND = 1   # 后台批量生成题目
+
+class GrokQueueFullError(Exception):
+    """等待队列已满，拒绝新的请求"""
+
+class GrokUnavailableError(Exception):
+    """熔断器处于打开状态，暂不向 Grok 发送请求"""
+
+class GrokAPIError(Exception):
+    """Grok 返回了非 200 状态码"""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"API returned status {status}: {text}")
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        """限流和服务端错误可以重试，其他 4xx 错误重试也不会成功"""
+        return self.status == 429 or self.status >= 500
+
+# 可以重试、并计入熔断器的失败
+_TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# 每道题预留的输出 token 数
+_TOKENS_PER_PROBLEM = 120
+
+# 计算对冲阈值所需的最少延迟样本数
+_HEDGE_MIN_SAMPLES = 20
+
+def _outcome(error: BaseException) -> str:
+    """把异常归类为用量统计中的调用结果"""
+    if isinstance(error, GrokUnavailableError):
+        return 'unavailable'
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(error, asyncio.CancelledError):
+        return 'cancelled'
+    return 'error'
+
+def _request_key(data: dict) -> str:
+    """请求体的稳定摘要，相同的请求体共享同一个上游调用"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+class _ContentFlight:
+    """一次共享的非流式请求及其等待者数量"""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+class _StreamFlight:
+    """
+    一次共享的流式请求
+
+    后台任务读取上游并保存已解析的题目，每个订阅者都从第一道题开始读取，
+    因此中途加入的订阅者也能拿到完整结果。
+    """
+
+    def __init__(self):
+        self.items: List[dict] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, item: dict) -> None:
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def iterate(self) -> AsyncIterator[dict]:
+        index = 0
+        while True:
+            if index < len(self.items):
+                index += 1
+                yield self.items[index - 1]
+                continue
+            if self.done:
+                if self.error is not None:
+                    # 每个订阅者抛出各自的新异常，避免多个任务改写同一个异常实例的 __traceback__ 和 __context__
+                    raise GrokUnavailableError(f"Grok stream failed: {self.error!r}") from self.error
+                return
+            await self._changed.wait()
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    closed: 正常放行，连续失败达到阈值后转为 open；
+    open: 直接拒绝请求，经过恢复时间后转为 half_open；
+    half_open: 只放行一个试探请求，成功则恢复 closed，失败则重新 open。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {
+            'opened': 0,
+            'rejected': 0
+        }
+
+    @property
+    def state(self) -> str:
+        """当前状态（open 超过恢复时间后视为 half_open）"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow_request(self) -> bool:
+        """是否放行一个请求；放行后调用方必须记录一次结果"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self._stats['rejected'] += 1
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probe_in_flight = False
+        if self._state != self.CLOSED:
+            logger.info("Grok circuit breaker closed")
+        self._state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self._stats['opened'] += 1
+                logger.warning(f"Grok circuit breaker opened after {self._failures} consecutive failures")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def record_ignored(self) -> None:
+        """请求被取消或失败原因与上游无关，只归还试探名额"""
+        self._probe_in_flight = False
+
+    def metrics(self) -> dict:
+        return {
+            **self._stats,
+            'state': self.state,
+            'consecutive_failures': self._failures
+        }
+
+class GrokScheduler:
+    """
+    出站 Grok 请求调度器
+    
+    限制同时进行的上游请求数量，超出的请求按优先级排队等待，
+    同一优先级内先到先得。
+    """
+
+    def __init__(self, max_concurrency: int, max_queue_size: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self._active = 0
+        self._waiters = []  # 堆: (priority, seq, future)
+        self._seq = itertools.count()
+        # 每个优先级的统计
+        self._stats = {
+            priority: {
+                'queued': 0,
+                'total': 0,
+                'rejected': 0,
+                'wait_total': 0.0,
+                'wait_max': 0.0,
+                'recent_waits': deque(maxlen=200)
+            }
+            for priority in RequestPriority
+        }
+
+    async def acquire(self, priority: RequestPriority) -> None:
+        """获取一个请求槽位，必要时排队等待"""
+        stats = self._stats[priority]
+        
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self._record_wait(stats, 0.0)
+            return
+            
+        if len(self._waiters) >= self.max_queue_size:
+            stats['rejected'] += 1
+            raise GrokQueueFullError("Grok request queue is full")
+            
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        stats['queued'] += 1
+        started = time.monotonic()
+        
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已经分配到槽位但调用方被取消，归还槽位
+                self.release()
+            elif entry in self._waiters:
+                # 仍在排队，从队列中移除（release 可能已经弹出并跳过了它）
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        finally:
+            stats['queued'] -= 1
+            
+        self._record_wait(stats, time.monotonic() - started)
+
+    def release(self) -> None:
+        """释放槽位，并唤醒优先级最高的等待者"""
+        self._active -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # 等待者已被取消但还没来得及出队，跳过它
+                continue
+            self._active += 1
+            future.set_result(None)
+            break
+
+    @asynccontextmanager
+    async def slot(self, priority: RequestPriority, timeout: Optional[float] = None):
+        """以上下文管理器的方式占用一个槽位，timeout 秒内没有排到时抛出 asyncio.TimeoutError"""
+        await asyncio.wait_for(self.acquire(priority), timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _record_wait(self, stats: dict, wait: float) -> None:
+        stats['total'] += 1
+        stats['wait_total'] += wait
+        stats['wait_max'] = max(stats['wait_max'], wait)
+        stats['recent_waits'].append(wait)
+
+    def metrics(self) -> dict:
+        """返回队列深度和等待时间统计"""
+        priorities = {}
+        for priority, stats in self._stats.items():
+            recent = sorted(stats['recent_waits'])
+            priorities[priority.name.lower()] = {
+                'queue_depth': stats['queued'],
+                'total_requests': stats['total'],
+                'rejected': stats['rejected'],
+                'avg_wait_ms': round(stats['wait_total'] / stats['total'] * 1000, 2) if stats['total'] else 0.0,
+                'max_wait_ms': round(stats['wait_max'] * 1000, 2),
+                'p95_wait_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2) if recent else 0.0
+            }
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self._active,
+            'queue_depth': len(self._waiters),
+            'priorities': priorities
+        }
+
+class ProblemStreamParser:
+    """
+    增量 JSON 解析器
+    
+    从流式返回的文本中找到 "problems" 数组，每当数组中的一个对象完整闭合，
+    就立即解析并返回该对象，无需等待整个响应结束。
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0            # 下一个待扫描的位置
+        self._in_array = False   # 是否已进入 "problems" 数组
+        self._done = False       # 数组是否已结束
+        self._depth = 0          # 数组内的对象嵌套深度
+        self._in_string = False
+        self._escape = False
+        self._start = None       # 当前对象在缓冲区中的起点
+
+    def feed(self, text: str) -> List[dict]:
+        """输入一段新文本，返回其中新闭合的题目对象"""
+        if self._done:
+            return []
+        self._buffer += text
+        
+        if not self._in_array:
+            key = self._buffer.find('"problems"')
+            bracket = self._buffer.find('[', key) if key != -1 else -1
+            if bracket == -1:
+                return []
+            self._in_array = True
+            self._pos = bracket + 1
+            
+        problems = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        problems.append(json.loads(buffer[self._start:i + 1]))
+                    except json.JSONDecodeError as e:
+                        logger.error(f"Failed to parse streamed problem: {e}")
+                    self._start = None
+            elif ch == ']' and self._depth == 0:
+                self._done = True
+                break
+            i += 1
+            
+        # 丢弃已处理的文本，只保留未闭合的对象
+        if self._start is None:
+            self._buffer = ''
+            self._pos = 0
+        else:
+            self._buffer = buffer[self._start:]
+            self._pos = i - self._start
+            self._start = 0
+        return problems
+
 class GrokClient:
     def __init__(self):
         self.api_key = os.getenv('GROK_API_KEY')
@@ -20,90 +382,594 @@ class GrokClient:
             logger.error("No GROK_API_KEY found in environment variables")
             raise ValueError("GROK_API_KEY environment variable is required")
         
+        # 共享的连接池会话，在应用启动时创建、关闭时释放
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # 出站请求并发限制
+        self.scheduler = GrokScheduler(
+            max_concurrency=settings.GROK_MAX_CONCURRENCY,
+            max_queue_size=settings.GROK_MAX_QUEUE_SIZE
+        )
+        
+        # 上游持续失败时快速失败，由调用方改用本地内容
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.GROK_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=settings.GROK_BREAKER_RECOVERY_SECONDS
+        )
+        
+        # 每个优先级最近成功请求的延迟，用于计算对冲阈值
+        self._latencies: Dict[RequestPriority, deque] = {
+            priority: deque(maxlen=200) for priority in RequestPriority
+        }
+        self._stats = {
+            'retries': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'coalesced': 0
+        }
+        
+        # 按调用点统计 token 用量、费用和延迟
+        self.usage = UsageTracker(
+            input_price=settings.GROK_PRICE_INPUT_PER_MILLION,
+            output_price=settings.GROK_PRICE_OUTPUT_PER_MILLION
+        )
+        
+        # 正在进行的上游调用，相同请求体的并发调用共享结果
+        self._content_flights: Dict[str, _ContentFlight] = {}
+        self._stream_flights: Dict[str, _StreamFlight] = {}
+        
         logger.debug(f"Initialized GrokClient with API base: {self.api_base}")
 
-    async def generate_content(self, prompt: str, count: int = 1) -> str:
+    async def start(self) -> None:
+        """创建共享会话（在应用启动时调用）"""
+        await self._get_session()
+
+    async def close(self) -> None:
+        """关闭共享会话并释放连接池（在应用关闭时调用）"""
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+            logger.debug("Closed GrokClient session")
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话，不存在或已关闭时重新创建"""
+        # 创建会话本身是同步操作，单个事件循环内不会出现并发创建
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.GROK_POOL_SIZE,
+                limit_per_host=settings.GROK_POOL_PER_HOST,
+                ttl_dns_cache=settings.GROK_DNS_CACHE_TTL,
+                keepalive_timeout=settings.GROK_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.GROK_REQUEST_TIMEOUT),
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                }
+            )
+            logger.debug(
+                f"Created GrokClient session (pool={settings.GROK_POOL_SIZE}, "
+                f"per_host={settings.GROK_POOL_PER_HOST})"
+            )
+        return self._session
+
+    @property
+    def available(self) -> bool:
+        """熔断器未打开，可以尝试调用 Grok（调用方据此决定是否直接使用本地内容）"""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def metrics(self) -> dict:
+        """返回客户端运行指标"""
+        return {
+            **self._stats,
+            'in_flight': len(self._content_flights) + len(self._stream_flights),
+            'hedge_delay_ms': {
+                priority.name.lower(): round(delay * 1000, 2) if delay is not None else None
+                for priority, delay in ((p, self._hedge_delay(p)) for p in RequestPriority)
+            },
+            'breaker': self.breaker.metrics(),
+            'scheduler': self.scheduler.metrics()
+        }
+
+    def _hedge_delay(self, priority: RequestPriority) -> Optional[float]:
+        """对冲阈值：该优先级近期成功请求延迟的 p95，样本不足时不对冲"""
+        recent = sorted(self._latencies[priority])
+        if len(recent) < _HEDGE_MIN_SAMPLES:
+            return None
+        return max(settings.GROK_HEDGE_MIN_DELAY, recent[int(len(recent) * 0.95)])
+
+    def _retry_delay(self, attempt: int) -> float:
+        """指数退避加完全随机抖动，避免多个请求同时重试"""
+        return random.uniform(0, settings.GROK_RETRY_BASE_DELAY * 2 ** attempt)
+
+    async def _send(self, data: dict, priority: RequestPriority, call_site: str) -> Tuple[int, str]:
+        """发送一次请求，返回 (状态码, 响应文本)；每次请求（含重试和对冲）的用量都计入 call_site"""
+        session = await self._get_session()
+        async with self.scheduler.slot(priority):
+            started = time.monotonic()
+            try:
+                async with session.post(self.api_base, json=data) as response:
+                    response_text = await response.text()
+                    status = response.status
+            except aiohttp.ClientConnectorError:
+                # 没有连上上游，不会计费
+                self.usage.record_attempt(call_site)
+                raise
+            except BaseException:
+                # 请求已发出但没有拿到响应（超时或对冲中被取消），上游可能已按提示词计费
+                self.usage.record_attempt(call_site, prompt=data['messages'][0]['content'])
+                raise
+        if status == 200:
+            self._latencies[priority].append(time.monotonic() - started)
+            self._record_response_usage(call_site, data, response_text)
+        else:
+            # 错误响应不计费，只计入请求次数
+            self.usage.record_attempt(call_site)
+        return status, response_text
+
+    def _record_response_usage(self, call_site: str, data: dict, response_text: str) -> None:
+        """按响应中的 usage 记录用量，缺失时按文本长度估算"""
+        try:
+            result = json.loads(response_text)
+            usage = result.get('usage')
+            completion = '' if usage else result['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            usage, completion = None, response_text
+        self.usage.record_attempt(call_site, usage, prompt=data['messages'][0]['content'], completion=completion)
+
+    async def _send_hedged(
+        self,
+        data: dict,
+        priority: RequestPriority,
+        timeout: float,
+        hedge: bool,
+        call_site: str = 'other'
+    ) -> Tuple[int, str]:
+        """
+        在 timeout 内发送请求
+
+        hedge 为 True 时，如果超过近期 p95 延迟仍未返回，再发送一个相同的请求，
+        使用先成功返回的结果并取消另一个。
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        delay = self._hedge_delay(priority) if hedge else None
+        hedge_at = loop.time() + delay if delay is not None and delay < timeout else None
+        first = asyncio.ensure_future(self._send(data, priority, call_site))
+        pending = {first}
+        try:
+            result, error = None, None
+            while pending:
+                wait_until = end if hedge_at is None else hedge_at
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, wait_until - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if hedge_at is None:
+                        raise asyncio.TimeoutError()
+                    # 超过对冲阈值仍未返回，再发一个相同的请求
+                    hedge_at = None
+                    self._stats['hedged'] += 1
+                    pending.add(asyncio.ensure_future(self._send(data, priority, call_site)))
+                    continue
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    result = task.result()
+                    if result[0] == 200:
+                        if task is not first:
+                            self._stats['hedge_wins'] += 1
+                        return result
+            if result is not None:
+                return result
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def _build_request(self, prompt: str, count: int, stream: bool = False) -> dict:
+        """构建 chat completions 请求体"""
+        # 修改提示词，要求返回题目数组
+        prompt = f"""Generate {count} math word problems in Norwegian (Bokmål).
+        {prompt}
+        
+        Format the response as JSON array:
+        {{
+            "problems": [
+                {{
+                    "question": "problem text",
+                    "answer": numerical_answer,
+                    "type": "word_problem",
+                    "sub_type": "type"
+                }},
+                ...
+            ]
+        }}
+        """
+        
+        data = {
+            'model': 'grok-beta',
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': 0.7,
+            # 合并后的请求题目较多，按题数放宽输出长度
+            'max_tokens': max(1000, count * _TOKENS_PER_PROBLEM)
+        }
+        if stream:
+            data['stream'] = True
+            # 在最后一个数据块中返回 token 用量
+            data['stream_options'] = {'include_usage': True}
+        
+        logger.debug("Sending prompt to Grok API:")
+        logger.debug("=" * 50)
+        logger.debug(prompt)
+        logger.debug("=" * 50)
+        logger.debug(f"Request data: {data}")
+        return data
+
+    async def generate_content(
+        self,
+        prompt: str,
+        count: int = 1,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        deadline: Optional[float] = None,
+        call_site: str = 'other'
+    ) -> str:
         """
         使用 Grok API 生成内容
         
+        失败时在截止时间内按随机退避重试；熔断器打开时立即抛出 GrokUnavailableError。
+        
         参数:
             prompt (str): 提示词
             count (int): 需要生成的题目数量
+            priority (RequestPriority): 请求优先级，后台批量生成应使用 BACKGROUND
+            deadline (float, optional): 调用方的截止时间（time.monotonic()），
+                默认为 GROK_REQUEST_TIMEOUT 秒后
+            call_site (str): 调用点名称，用于按功能统计用量；与其他调用点的相同请求合并时，
+                token 记在发起请求的调用点上，本调用点只计入 coalesced
             
         返回:
             str: API 响应内容
         """
+        data = self._build_request(prompt, count)
+        if deadline is None:
+            deadline = time.monotonic() + settings.GROK_REQUEST_TIMEOUT
+        
+        # 相同的请求正在进行时直接等待它的结果，不再重复调用上游
+        key = _request_key(data)
+        while True:
+            flight = self._content_flights.get(key)
+            if flight is None:
+                flight = _ContentFlight(asyncio.ensure_future(
+                    self._generate_content(data, priority, deadline, call_site)
+                ))
+                self._content_flights[key] = flight
+                flight.future.add_done_callback(functools.partial(self._content_flight_done, key, flight))
+            else:
+                self._stats['coalesced'] += 1
+                self.usage.record_coalesced(call_site)
+                logger.debug(f"Coalesced Grok request {key[:12]}")
+                
+            flight.waiters += 1
+            try:
+                # shield: 某个调用方超时或取消不影响其他等待者
+                return await asyncio.wait_for(
+                    asyncio.shield(flight.future), max(0.0, deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                # 共享的调用按发起方的截止时间结束，本调用还有时间时重新发起
+                if flight.future.done() and not flight.future.cancelled() and deadline > time.monotonic():
+                    continue
+                raise
+            finally:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.future.done():
+                    # 所有调用方都已离开，取消上游调用
+                    flight.future.cancel()
+
+    def _content_flight_done(self, key: str, flight: "_ContentFlight", future: asyncio.Future) -> None:
+        if self._content_flights.get(key) is flight:
+            del self._content_flights[key]
+        if not future.cancelled():
+            # 所有等待者都已离开时，避免 "exception was never retrieved" 警告
+            future.exception()
+
+    async def _generate_content(
+        self,
+        data: dict,
+        priority: RequestPriority,
+        deadline: float,
+        call_site: str
+    ) -> str:
+        """实际调用上游（含熔断、重试和对冲）"""
+        started = time.monotonic()
         try:
-            # 修改提示词，要求返回题目数组
-            prompt = f"""Generate {count} math word problems in Norwegian (Bokmål).
-            {prompt}
+            attempt = 0
+            while True:
+                if not self.breaker.allow_request():
+                    raise GrokUnavailableError("Grok circuit breaker is open")
+                remaining = deadline - time.monotonic()
+                hedge = (
+                    settings.GROK_HEDGE_ENABLED
+                    and priority == RequestPriority.INTERACTIVE
+                    and self.breaker.state == CircuitBreaker.CLOSED
+                )
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    status, response_text = await self._send_hedged(data, priority, remaining, hedge, call_site)
+                    if status != 200:
+                        raise GrokAPIError(status, response_text)
+                except _TRANSIENT_ERRORS + (GrokAPIError,) as e:
+                    if isinstance(e, GrokAPIError) and not e.retryable:
+                        # 请求本身有误，上游是可用的
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+                    delay = self._retry_delay(attempt)
+                    attempt += 1
+                    if attempt > settings.GROK_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                        raise
+                    self._stats['retries'] += 1
+                    logger.warning(f"Grok request failed ({e!r}), retry {attempt} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                except BaseException:
+                    self.breaker.record_ignored()
+                    raise
+                self.breaker.record_success()
+                break
+                    
+            logger.debug(f"Response status: {status}")
+            logger.debug(f"Response text: {response_text}")
             
-            Format the response as JSON array:
-            {{
-                "problems": [
-                    {{
-                        "question": "problem text",
-                        "answer": numerical_answer,
-                        "type": "word_problem",
-                        "sub_type": "type"
-                    }},
-                    ...
-                ]
-            }}
-            """
+            result = json.loads(response_text)
+            content = result['choices'][0]['message']['content']
+            self.usage.record(call_site, 'success', time.monotonic() - started)
+            logger.debug(f"Grok usage for {call_site}: {result.get('usage')}")
             
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
+            logger.debug("Received response from Grok API:")
+            logger.debug("=" * 50)
+            logger.debug(content)
+            logger.debug("=" * 50)
             
-            data = {
-                'model': 'grok-beta',
-                'messages': [{'role': 'user', 'content': prompt}],
-                'temperature': 0.7,
-                'max_tokens': 1000
-            }
+            # 处理 Markdown 代码块格式
+            if content.startswith('```') and content.endswith('```'):
+                # 移除 Markdown 代码块标记
+                content = content.replace('```json\n', '').replace('\n```', '')
+                logger.debug("Cleaned content:")
+                logger.debug(content)
+            
+            return content
+                    
+        except asyncio.CancelledError:
+            self.usage.record(call_site, 'cancelled', time.monotonic() - started)
+            raise
+        except Exception as e:
+            logger.error(f"Error in generate_content: {e!r}")
+            self.usage.record(call_site, _outcome(e), time.monotonic() - started)
+            raise
+
+    async def generate_problems_stream(
+        self,
+        prompt: str,
+        count: int = 1,
+        priority: RequestPriority = RequestPriority.BACKGROUND,
+        deadline: Optional[float] = None,
+        call_site: str = 'other'
+    ) -> AsyncIterator[dict]:
+        """
+        以流式模式调用 Grok API，每解析出一道完整题目就立即返回
+        
+        返回第一道题目之前的失败会在截止时间内按随机退避重试；熔断器打开时立即失败。
+        失败时抛出 GrokUnavailableError，原始异常在 __cause__ 中。
+        
+        参数:
+            prompt (str): 提示词
+            count (int): 需要生成的题目数量
+            priority (RequestPriority): 请求优先级
+            deadline (float, optional): 调用方的截止时间（time.monotonic()），
+                默认为 GROK_REQUEST_TIMEOUT 秒后；合并的流按发起方的截止时间结束
+            call_site (str): 调用点名称，用于按功能统计用量；与其他调用点的相同请求合并时，
+                token 记在发起请求的调用点上，本调用点只计入 coalesced
+            
+        返回:
+            AsyncIterator[dict]: "problems" 数组中的题目对象
+        """
+        data = self._build_request(prompt, count, stream=True)
+        if deadline is None:
+            deadline = time.monotonic() + settings.GROK_REQUEST_TIMEOUT
+        
+        # 相同的流式请求正在进行时订阅它的结果，不再重复调用上游
+        key = _request_key(data)
+        flight = self._stream_flights.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._stream_flights[key] = flight
+            flight.task = asyncio.ensure_future(
+                self._run_stream_flight(key, flight, data, priority, deadline, call_site)
+            )
+        else:
+            self._stats['coalesced'] += 1
+            self.usage.record_coalesced(call_site)
+            logger.debug(f"Coalesced Grok stream {key[:12]}")
             
-            logger.debug("Sending prompt to Grok API:")
+        flight.subscribers += 1
+        try:
+            async for problem in flight.iterate():
+                # 每个订阅者拿到独立的副本，调用方会修改题目字段
+                yield dict(problem)
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # 所有订阅者都提前离开，关闭上游流并释放调度槽位
+                if self._stream_flights.get(key) is flight:
+                    del self._stream_flights[key]
+                flight.task.cancel()
+
+    async def _run_stream_flight(
+        self,
+        key: str,
+        flight: _StreamFlight,
+        data: dict,
+        priority: RequestPriority,
+        deadline: float,
+        call_site: str
+    ) -> None:
+        """读取上游流并分发给所有订阅者"""
+        try:
+            async for problem in self._stream_problems(data, priority, deadline, call_site):
+                flight.publish(problem)
+            flight.finish()
+        except asyncio.CancelledError:
+            flight.finish(GrokUnavailableError("Grok stream was cancelled"))
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            if self._stream_flights.get(key) is flight:
+                del self._stream_flights[key]
+
+    @staticmethod
+    def _stream_timeout() -> aiohttp.ClientTimeout:
+        """
+        流式请求的超时设置
+
+        合并后的大请求输出时间可能超过 GROK_REQUEST_TIMEOUT，因此不设总超时，
+        只限制两个数据块之间的间隔；整体时间由调用方的截止时间限制。
+        """
+        return aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=settings.GROK_REQUEST_TIMEOUT,
+            sock_read=settings.GROK_STREAM_READ_TIMEOUT
+        )
+
+    @staticmethod
+    async def _read_lines(response: aiohttp.ClientResponse, deadline: float) -> AsyncIterator[bytes]:
+        """逐行读取流式响应，超过截止时间时抛出 asyncio.TimeoutError"""
+        while True:
+            line = await asyncio.wait_for(response.content.readline(), max(0.0, deadline - time.monotonic()))
+            if not line:
+                return
+            yield line
+
+    async def _stream_problems(
+        self,
+        data: dict,
+        priority: RequestPriority,
+        deadline: float,
+        call_site: str
+    ) -> AsyncIterator[dict]:
+        """实际读取上游流（含熔断、重试和截止时间）"""
+        yielded = 0
+        attempt = 0
+        started = time.monotonic()
+        content = []
+        usage = None
+        outcome = 'cancelled'
+        
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                if not self.breaker.allow_request():
+                    raise GrokUnavailableError("Grok circuit breaker is open")
+                parser = ProblemStreamParser()
+                content = []
+                usage = None
+                sent = None  # None: 没有发出；False: 不计费（错误响应或没有连上）；True: 上游已开始处理
+                recorded = False
+                try:
+                    session = await self._get_session()
+                    # 排队等待槽位的时间也计入截止时间
+                    async with self.scheduler.slot(priority, timeout=remaining):
+                        sent = True
+                        async with session.post(self.api_base, json=data, timeout=self._stream_timeout()) as response:
+                            if response.status != 200:
+                                sent = False
+                                response_text = await response.text()
+                                logger.error(f"Error from Grok API: {response_text}")
+                                raise GrokAPIError(response.status, response_text)
+                            self.breaker.record_success()
+                            recorded = True
+                                
+                            async for raw_line in self._read_lines(response, deadline):
+                                line = raw_line.decode('utf-8').strip()
+                                if not line.startswith('data:'):
+                                    continue
+                                payload = line[5:].strip()
+                                if payload == '[DONE]':
+                                    break
+                                    
+                                chunk = json.loads(payload)
+                                usage = chunk.get('usage') or usage
+                                choices = chunk.get('choices') or []
+                                delta = choices[0].get('delta', {}).get('content') if choices else None
+                                if not delta:
+                                    continue
+                                    
+                                content.append(delta)
+                                for problem in parser.feed(delta):
+                                    yielded += 1
+                                    yield problem
+                    break
+                except _TRANSIENT_ERRORS + (GrokAPIError,) as e:
+                    streaming = recorded  # 上游已返回 200 并开始输出
+                    recorded = True
+                    if isinstance(e, aiohttp.ClientConnectorError):
+                        sent = False
+                    if isinstance(e, GrokAPIError) and not e.retryable:
+                        self.breaker.record_success()
+                        raise
+                    if streaming and isinstance(e, asyncio.TimeoutError) and time.monotonic() >= deadline:
+                        # 上游正常输出，只是调用方的时间用完了，不计为上游失败
+                        raise
+                    self.breaker.record_failure()
+                    delay = self._retry_delay(attempt)
+                    attempt += 1
+                    # 已经返回过题目时不再重试，避免重复的题目
+                    if yielded or attempt > settings.GROK_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                        raise
+                    self._stats['retries'] += 1
+                    logger.warning(f"Grok stream failed ({e!r}), retry {attempt} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                finally:
+                    if not recorded:
+                        self.breaker.record_ignored()
+                    # 每次请求（含重试）单独计入用量；流被提前关闭时通常收不到 usage，按已收到的文本估算
+                    if sent:
+                        self.usage.record_attempt(
+                            call_site, usage,
+                            prompt=data['messages'][0]['content'], completion=''.join(content)
+                        )
+                    elif sent is not None:
+                        self.usage.record_attempt(call_site)
+                            
+            logger.debug("Received streamed response from Grok API:")
             logger.debug("=" * 50)
-            logger.debug(prompt)
+            logger.debug(''.join(content))
             logger.debug("=" * 50)
-            logger.debug(f"Request data: {data}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_base,
-                    headers=headers,
-                    json=data,
-                    timeout=30
-                ) as response:
-                    response_text = await response.text()
-                    logger.debug(f"Response status: {response.status}")
-                    logger.debug(f"Response text: {response_text}")
+            # 流中没有解析出题目时，按完整响应再解析一次（例如返回了非标准格式）
+            if yielded == 0 and content:
+                text = ''.join(content).strip()
+                if text.startswith('```') and text.endswith('```'):
+                    text = text.replace('```json\n', '').replace('\n```', '').strip('`')
+                for problem in json.loads(text).get('problems', []):
+                    yield problem
+            outcome = 'success'
+            logger.debug(f"Grok usage for {call_site}: {usage}")
                     
-                    if response.status == 200:
-                        result = json.loads(response_text)
-                        content = result['choices'][0]['message']['content']
-                        
-                        logger.debug("Received response from Grok API:")
-                        logger.debug("=" * 50)
-                        logger.debug(content)
-                        logger.debug("=" * 50)
-                        
-                        # 处理 Markdown 代码块格式
-                        if content.startswith('```') and content.endswith('```'):
-                            # 移除 Markdown 代码块标记
-                            content = content.replace('```json\n', '').replace('\n```', '')
-                            logger.debug("Cleaned content:")
-                            logger.debug(content)
-                        
-                        return content
-                    else:
-                        logger.error(f"Error from Grok API: {response_text}")
-                        raise Exception(f"API returned status {response.status}: {response_text}")
-                        
         except Exception as e:
-            logger.error(f"Error in generate_content: {e}")
+            logger.error(f"Error in generate_problems_stream: {e!r}")
+            outcome = _outcome(e)
             raise
+        finally:
+            self.usage.record(call_site, outcome, time.monotonic() - started)
 
 grok_client = GrokClient() 
\ No newline at end of file
@@ -0,0 +1,130 @@
+from collections import deque
+from typing import Dict, Optional
+
+# 用量缺失时按字符数估算 token（约 4 个字符一个 token）
+_CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数"""
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+class UsageTracker:
+    """
+    LLM 调用的用量统计
+
+    按调用点（word_problems / explanations / similar_problems 等）汇总
+    token 数、估算费用、延迟和调用结果，只保存在进程内存中。
+
+    调用次数、结果和延迟按逻辑调用（一次 generate_content 等）统计；
+    token 和费用按实际发往上游的每次请求统计，重试和对冲请求也计入。
+    合并到进行中调用的请求不产生上游费用，只计入本调用点的 coalesced，
+    token 记在发起该调用的调用点上。
+    """
+
+    def __init__(self, input_price: float, output_price: float):
+        self.input_price = input_price    # 每百万输入 token 的价格（美元）
+        self.output_price = output_price  # 每百万输出 token 的价格（美元）
+        self._sites: Dict[str, dict] = {}
+
+    def _site(self, call_site: str) -> dict:
+        stats = self._sites.get(call_site)
+        if stats is None:
+            stats = {
+                'calls': 0,
+                'attempts': 0,
+                'coalesced': 0,
+                'outcomes': {},
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'estimated_attempts': 0,
+                'latency_total': 0.0,
+                'latency_max': 0.0,
+                'recent_latencies': deque(maxlen=200)
+            }
+            self._sites[call_site] = stats
+        return stats
+
+    def record(self, call_site: str, outcome: str, latency: float) -> None:
+        """
+        记录一次逻辑调用的结果（含重试和对冲的总耗时）
+
+        参数:
+            call_site (str): 调用点
+            outcome (str): success / error / timeout / unavailable / cancelled
+            latency (float): 耗时（秒）
+        """
+        stats = self._site(call_site)
+        stats['calls'] += 1
+        stats['outcomes'][outcome] = stats['outcomes'].get(outcome, 0) + 1
+        stats['latency_total'] += latency
+        stats['latency_max'] = max(stats['latency_max'], latency)
+        stats['recent_latencies'].append(latency)
+
+    def record_attempt(
+        self,
+        call_site: str,
+        usage: Optional[dict] = None,
+        prompt: str = '',
+        completion: str = ''
+    ) -> None:
+        """
+        记录一次发往上游的请求及其 token 用量
+
+        参数:
+            call_site (str): 调用点
+            usage (dict, optional): 响应中的 usage 字段
+            prompt (str): 没有 usage 时用于估算的提示词（请求已发出、可能已计费时传入）
+            completion (str): 没有 usage 时用于估算的已收到的输出
+        """
+        stats = self._site(call_site)
+        stats['attempts'] += 1
+        if usage:
+            stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            stats['completion_tokens'] += usage.get('completion_tokens', 0)
+        elif prompt or completion:
+            # 请求被取消、超时或流被提前关闭，上游没有返回用量，按文本长度估算
+            stats['estimated_attempts'] += 1
+            stats['prompt_tokens'] += estimate_tokens(prompt)
+            stats['completion_tokens'] += estimate_tokens(completion)
+
+    def record_coalesced(self, call_site: str) -> None:
+        """记录一次与进行中的调用合并、没有产生上游费用的请求"""
+        self._site(call_site)['coalesced'] += 1
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.input_price + completion_tokens * self.output_price) / 1_000_000
+
+    def metrics(self) -> dict:
+        """返回各调用点及合计的用量、费用和延迟"""
+        sites = {}
+        for call_site, stats in self._sites.items():
+            calls = stats['calls']
+            recent = sorted(stats['recent_latencies'])
+            sites[call_site] = {
+                'calls': calls,
+                'attempts': stats['attempts'],
+                'coalesced': stats['coalesced'],
+                'outcomes': dict(stats['outcomes']),
+                'prompt_tokens': stats['prompt_tokens'],
+                'completion_tokens': stats['completion_tokens'],
+                'total_tokens': stats['prompt_tokens'] + stats['completion_tokens'],
+                'estimated_attempts': stats['estimated_attempts'],
+                'avg_tokens_per_call': round((stats['prompt_tokens'] + stats['completion_tokens']) / calls, 1) if calls else 0.0,
+                'cost_usd': round(self._cost(stats['prompt_tokens'], stats['completion_tokens']), 6),
+                'avg_latency_ms': round(stats['latency_total'] / calls * 1000, 2) if calls else 0.0,
+                'max_latency_ms': round(stats['latency_max'] * 1000, 2),
+                'p95_latency_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2) if recent else 0.0
+            }
+
+        prompt_tokens = sum(site['prompt_tokens'] for site in sites.values())
+        completion_tokens = sum(site['completion_tokens'] for site in sites.values())
+        return {
+            'total': {
+                'calls': sum(site['calls'] for site in sites.values()),
+                'attempts': sum(site['attempts'] for site in sites.values()),
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'cost_usd': round(self._cost(prompt_tokens, completion_tokens), 6)
+            },
+            'call_sites': sites
+        }
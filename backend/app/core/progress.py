@@ -0,0 +1,102 @@
+from collections import defaultdict
+from typing import List
+from sqlalchemy import update
+from sqlalchemy.engine import Connection
+from ..models.progress import ProgressDaily
+from ..models.user import MathKnowledgePoints
+
+# 基础题按运算符号分类
+_OPERATOR_POINTS = {
+    '+': MathKnowledgePoints.ADDITION_BASIC,
+    '-': MathKnowledgePoints.SUBTRACTION_BASIC,
+    '×': MathKnowledgePoints.MULTIPLICATION_BASIC,
+    '÷': MathKnowledgePoints.DIVISION_BASIC
+}
+
+# 应用题按题目类型分类
+_SUB_TYPE_POINTS = {
+    'shopping': MathKnowledgePoints.ADDITION_BASIC,
+    'sharing': MathKnowledgePoints.DIVISION_BASIC,
+    'time': MathKnowledgePoints.TIME,
+    'measurement': MathKnowledgePoints.MEASUREMENT,
+    'distance_and_speed': MathKnowledgePoints.SPEED_DISTANCE,
+    'arrangements_and_combinations': MathKnowledgePoints.COMBINATIONS,
+    'plane_geometry': MathKnowledgePoints.AREA,
+    'geometric_volume': MathKnowledgePoints.VOLUME
+}
+
+def classify_knowledge_point(problem: dict) -> MathKnowledgePoints:
+    """
+    判断题目考查的知识点
+
+    分数、小数答案优先归入分数、小数知识点；
+    其余基础题按运算符号、应用题按题目类型分类。
+    """
+    kind = (problem.get('answer_key') or {}).get('kind')
+    if kind == 'fraction':
+        return MathKnowledgePoints.FRACTION_CONCEPT
+    if kind == 'decimal':
+        return MathKnowledgePoints.DECIMAL_CONCEPT
+
+    if problem.get('type') == 'basic':
+        # 题目格式为 "a op b = ?"
+        parts = problem.get('question', '').split()
+        if len(parts) >= 2 and parts[1] in _OPERATOR_POINTS:
+            return _OPERATOR_POINTS[parts[1]]
+        return MathKnowledgePoints.ADDITION_BASIC
+
+    return _SUB_TYPE_POINTS.get(problem.get('sub_type'), MathKnowledgePoints.ADDITION_BASIC)
+
+def apply_progress(conn: Connection, attempts: List[dict]) -> None:
+    """
+    把一批答题记录累加到每日汇总表
+
+    先在内存中按 (用户, 知识点, 日期) 合并，每个组合只执行一次 upsert，
+    与答题记录在同一事务中提交。
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for attempt in attempts:
+        key = (attempt['user_id'], attempt['knowledge_point'], attempt['created_at'].date())
+        totals[key][0] += 1
+        totals[key][1] += 1 if attempt['correct'] else 0
+
+    rows = [
+        {"user_id": user_id, "knowledge_point": point, "day": day, "attempts": count, "correct": correct}
+        for (user_id, point, day), (count, correct) in totals.items()
+    ]
+    if not rows:
+        return
+
+    table = ProgressDaily.__table__
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.knowledge_point, table.c.day],
+                set_={
+                    "attempts": table.c.attempts + stmt.excluded.attempts,
+                    "correct": table.c.correct + stmt.excluded.correct
+                }
+            ),
+            rows
+        )
+        return
+
+    # 其他数据库：先更新，不存在时再插入
+    for row in rows:
+        result = conn.execute(
+            update(table)
+            .where(
+                table.c.user_id == row["user_id"],
+                table.c.knowledge_point == row["knowledge_point"],
+                table.c.day == row["day"]
+            )
+            .values(attempts=table.c.attempts + row["attempts"], correct=table.c.correct + row["correct"])
+        )
+        if result.rowcount == 0:
+            conn.execute(table.insert(), [row])
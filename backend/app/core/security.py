@@ -0,0 +1,44 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from .config import settings
+
+# 密码加密配置
+# min/max rounds 与默认值一致：成本设置变化后，旧哈希在下次登录时会被标记为需要更新
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__ident="2b"
+)
+
+# bcrypt 计算在独立的有界线程池中进行，不阻塞事件循环（bcrypt 计算时会释放 GIL）
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+
+async def hash_password(password: str) -> str:
+    """计算密码哈希"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, pwd_context.hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    验证密码
+
+    返回:
+        Tuple[bool, Optional[str]]: (是否正确, 新哈希)；
+        当存储的哈希使用了旧的成本设置时，新哈希不为 None，调用方应保存它
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, pwd_context.verify_and_update, password, hashed_password
+    )
+
+def shutdown_password_executor() -> None:
+    """关闭密码哈希线程池（在应用关闭时调用）"""
+    _password_executor.shutdown(wait=False)
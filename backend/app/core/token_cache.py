@@ -0,0 +1,102 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from jose import jwt
+from .config import settings
+
+class TokenCache:
+    """
+    已验证令牌缓存
+
+    以令牌的 SHA-256 摘要为键缓存解码后的 payload，同一令牌再次出现时
+    跳过签名验证。条目在令牌的 exp 或缓存 TTL 到期时（取较早者）失效。
+    验证失败的令牌不会被缓存。
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()  # 摘要 -> (过期时间, payload)
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """查询缓存，未命中或已过期时返回 None"""
+        key = self._digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats['misses'] += 1
+            return None
+
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self._stats['expired'] += 1
+            self._stats['misses'] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._stats['hits'] += 1
+        return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        """缓存已验证的 payload，超过容量时淘汰最久未使用的条目"""
+        if self.ttl_seconds <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        exp = payload.get('exp')
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+
+        key = self._digest(token)
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        """返回缓存命中统计"""
+        return {
+            **self._stats,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+# 创建全局实例
+token_cache = TokenCache(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TOKEN_CACHE_TTL_SECONDS
+)
+
+def decode_token(token: str) -> dict:
+    """
+    验证并解码访问令牌
+
+    先查已验证令牌缓存，未命中时做完整的签名验证并写入缓存。
+
+    异常:
+        JWTError: 令牌无效或已过期
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM]
+        )
+        token_cache.set(token, payload)
+    return payload
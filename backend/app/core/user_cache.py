@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from .config import settings
+from .logger import logger
+from ..models.user import User
+
+class UserCache:
+    """
+    已认证用户缓存
+
+    按用户名缓存已与会话分离的 User 对象，避免每个受保护请求都查询一次用户表。
+    条目按 TTL 过期；用户信息变更（注册、修改密码等）时需调用 invalidate。
+    缓存的对象在请求之间共享，只能读取，不能修改。
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # username -> (过期时间, User)
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'invalidations': 0,
+            'evictions': 0
+        }
+
+    def get(self, username: str) -> Optional[User]:
+        """查询缓存，未命中或已过期时返回 None"""
+        entry = self._entries.get(username)
+        if entry is None:
+            self._stats['misses'] += 1
+            return None
+
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self._entries[username]
+            self._stats['expired'] += 1
+            self._stats['misses'] += 1
+            return None
+
+        self._entries.move_to_end(username)
+        self._stats['hits'] += 1
+        return user
+
+    def set(self, user: User) -> None:
+        """缓存用户，超过容量时淘汰最久未使用的条目"""
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[user.username] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(user.username)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def invalidate(self, username: str) -> None:
+        """用户信息变更后移除缓存条目"""
+        if self._entries.pop(username, None) is not None:
+            self._stats['invalidations'] += 1
+            logger.debug(f"Invalidated cached user: {username}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        """返回缓存命中统计"""
+        return {
+            **self._stats,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+# 创建全局实例
+user_cache = UserCache(
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,223 @@
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from .logger import logger
+from .word_problem_pool import PoolKey, WordProblemPool
+
+# 需求结束标记
+_DONE = object()
+
+class WordProblemBatchError(Exception):
+    """合并后的生成请求失败（原始异常见 __cause__）"""
+
+class _Demand:
+    """一个批次的应用题需求"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.delivered = 0
+        self.closed = False
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    @property
+    def wanted(self) -> int:
+        return 0 if self.closed else self.count - self.delivered
+
+class _Window:
+    """同一 (年龄, 规则) 在一个时间窗口内累积的需求"""
+
+    def __init__(self):
+        self.demands: List[_Demand] = []
+        self.deadline = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def total(self) -> int:
+        return sum(demand.wanted for demand in self.demands)
+
+    def next_demand(self) -> Optional[_Demand]:
+        """缺口最大的需求优先，使各批次均匀地拿到题目"""
+        demand = max(self.demands, key=lambda d: d.wanted, default=None)
+        return demand if demand is not None and demand.wanted > 0 else None
+
+class WordProblemBatcher:
+    """
+    应用题需求微批处理
+
+    同一 (年龄, 规则) 的需求在短时间窗口内合并，由一次较大的生成请求满足，
+    生成的题目逐道分发给等待中的批次；没有批次需要的题目放回题池。
+    """
+
+    def __init__(
+        self,
+        generator: Callable[[int, int, Optional[list], Optional[float]], AsyncIterator[dict]],
+        pool: Optional[WordProblemPool],
+        window: float,
+        max_problems: int
+    ):
+        self._generator = generator  # (age, count, rules, deadline) -> 已验证题目的异步迭代器
+        self._pool = pool
+        self.window = window
+        self.max_problems = max_problems
+        self._windows: Dict[PoolKey, _Window] = {}
+        self._tasks: set = set()
+        self._stats = {
+            'requests': 0,
+            'upstream_calls': 0,
+            'problems': 0,
+            'returned_to_pool': 0
+        }
+
+    async def stream(
+        self,
+        age: int,
+        rules: Optional[list],
+        count: int,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[dict]:
+        """
+        申请 count 道应用题，题目生成后逐道返回
+
+        生成失败时抛出 WordProblemBatchError；提前离开时，已分到但未取走的题目
+        转给同窗口的其他批次或放回题池。
+
+        参数:
+            age (int): 学生年龄
+            rules (list, optional): 自定义规则列表
+            count (int): 需要的题目数量
+            deadline (float, optional): 调用方的截止时间（time.monotonic()）
+        """
+        key = WordProblemPool.make_key(age, rules)
+        window = self._windows.get(key)
+        if window is not None and window.total + count > self.max_problems:
+            # 当前窗口装不下，立即发出，新需求开启下一个窗口
+            self._flush(key)
+            window = None
+        if window is None:
+            window = _Window()
+            self._windows[key] = window
+            window.timer = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+
+        demand = _Demand(count)
+        window.demands.append(demand)
+        window.deadline = max(window.deadline, deadline or time.monotonic())
+        self._stats['requests'] += 1
+        if window.total >= self.max_problems:
+            self._flush(key)
+
+        try:
+            while True:
+                item = await demand.queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            demand.closed = True
+            self._return_undelivered(key, window, demand)
+            if window.task is not None and not window.task.done() and window.next_demand() is None:
+                # 所有批次都已离开，取消上游请求
+                window.task.cancel()
+
+    @staticmethod
+    def _deliver(demand: _Demand, problem: dict) -> None:
+        demand.delivered += 1
+        demand.queue.put_nowait(problem)
+        if demand.delivered >= demand.count:
+            demand.queue.put_nowait(_DONE)
+
+    def _return_leftovers(self, key: PoolKey, problems: List[dict]) -> None:
+        if problems and self._pool is not None:
+            age, rules = key
+            rules = list(rules) if rules is not None else None
+            self._stats['returned_to_pool'] += self._pool.put(age, rules, problems)
+
+    def _return_undelivered(self, key: PoolKey, window: _Window, demand: _Demand) -> None:
+        """批次提前离开时，把已分给它但还没取走的题目转给其他批次，没有批次需要时放回题池"""
+        problems = []
+        while not demand.queue.empty():
+            item = demand.queue.get_nowait()
+            if isinstance(item, dict):
+                problems.append(item)
+        # 生成已结束时，其他批次已经收到结束标记，不能再分给它们
+        running = window.task is not None and not window.task.done()
+        leftovers = []
+        for problem in problems:
+            other = window.next_demand() if running else None
+            if other is None:
+                leftovers.append(problem)
+            else:
+                self._deliver(other, problem)
+        self._return_leftovers(key, leftovers)
+
+    def _flush(self, key: PoolKey) -> None:
+        """结束时间窗口，为累积的需求发出一次生成请求"""
+        window = self._windows.pop(key, None)
+        if window is None:
+            return
+        window.timer.cancel()
+        window.task = asyncio.ensure_future(self._run(key, window))
+        self._tasks.add(window.task)
+        window.task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: PoolKey, window: _Window) -> None:
+        age, rules = key
+        rules = list(rules) if rules is not None else None
+        total = window.total
+        error = None
+        leftovers = []
+        try:
+            if total <= 0:
+                return
+            self._stats['upstream_calls'] += 1
+            logger.debug(f"Generating {total} word problems for {len(window.demands)} batches of {key}")
+            problems = self._generator(age, total, rules, window.deadline)
+            try:
+                async for problem in problems:
+                    self._stats['problems'] += 1
+                    demand = window.next_demand()
+                    if demand is None:
+                        leftovers.append(problem)
+                        continue
+                    self._deliver(demand, problem)
+            finally:
+                await problems.aclose()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error generating word problems for {key}: {e}")
+            error = e
+        finally:
+            for demand in window.demands:
+                if demand.delivered < demand.count:
+                    demand.queue.put_nowait(_DONE if error is None else self._wrap_error(error))
+            self._return_leftovers(key, leftovers)
+
+    @staticmethod
+    def _wrap_error(error: Exception) -> WordProblemBatchError:
+        """每个批次各自抛出一个新异常，避免同一个异常实例在多个任务中抛出"""
+        wrapped = WordProblemBatchError(f"Word problem generation failed: {error!r}")
+        wrapped.__cause__ = error
+        return wrapped
+
+    async def close(self) -> None:
+        """取消未发出的窗口和进行中的生成请求"""
+        for window in self._windows.values():
+            window.timer.cancel()
+            for demand in window.demands:
+                demand.queue.put_nowait(_DONE)
+        self._windows.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        """返回合并统计"""
+        return {
+            **self._stats,
+            'open_windows': len(self._windows),
+            'in_flight': len(self._tasks)
+        }
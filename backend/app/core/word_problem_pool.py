@@ -0,0 +1,165 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from .logger import logger
+
+# 题池键: (年龄, 规则元组)，规则为 None 表示使用默认规则
+PoolKey = Tuple[int, Optional[Tuple[str, ...]]]
+
+class WordProblemPool:
+    """
+    预生成应用题池
+
+    按 (年龄, 规则) 分组保存已验证的应用题，取题时直接从内存返回；
+    当某组题目数量低于低水位时，在后台调用生成函数补充到高水位。
+    """
+
+    def __init__(
+        self,
+        generator: Callable[[int, int, Optional[list]], Awaitable[List[dict]]],
+        low_water: int,
+        high_water: int,
+        refill_batch: int,
+        max_keys: int
+    ):
+        self._generator = generator  # async (age, count, rules) -> 已验证的题目列表
+        self.low_water = low_water
+        self.high_water = high_water
+        self.refill_batch = refill_batch
+        self.max_keys = max_keys
+        self._pools: "OrderedDict[PoolKey, deque]" = OrderedDict()
+        self._refill_tasks: Dict[PoolKey, asyncio.Task] = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'refills': 0,
+            'refill_failures': 0,
+            'evicted_keys': 0
+        }
+
+    @staticmethod
+    def make_key(age: int, rules: Optional[list] = None) -> PoolKey:
+        """生成题池键"""
+        return (age, tuple(rules) if rules is not None else None)
+
+    def take(
+        self,
+        age: int,
+        rules: Optional[list],
+        count: int,
+        accept: Optional[Callable[[dict], bool]] = None
+    ) -> List[dict]:
+        """
+        从题池中取出最多 count 道题
+
+        参数:
+            age (int): 学生年龄
+            rules (list, optional): 自定义规则列表
+            count (int): 需要的题目数量
+            accept (callable, optional): 过滤函数，被拒绝的题目留在池中给其他请求
+
+        返回:
+            List[dict]: 题目副本列表，数量可能少于 count
+        """
+        key = self.make_key(age, rules)
+        pool = self._get_pool(key)
+
+        problems = []
+        skipped = []
+        while pool and len(problems) < count:
+            problem = pool.popleft()
+            if accept is None or accept(problem):
+                problems.append(dict(problem))
+            else:
+                skipped.append(problem)
+        pool.extendleft(reversed(skipped))
+
+        self._stats['hits'] += len(problems)
+        self._stats['misses'] += count - len(problems)
+
+        if len(pool) < self.low_water:
+            self.schedule_refill(age, rules)
+
+        logger.debug(f"Took {len(problems)}/{count} word problems from pool {key}, {len(pool)} left")
+        return problems
+
+    def put(self, age: int, rules: Optional[list], problems: List[dict]) -> int:
+        """把多余的已验证题目放入题池（不超过高水位），返回放入的数量"""
+        pool = self._get_pool(self.make_key(age, rules))
+        added = problems[:max(0, self.high_water - len(pool))]
+        pool.extend(added)
+        return len(added)
+
+    def schedule_refill(self, age: int, rules: Optional[list] = None) -> None:
+        """在后台补充题池（同一组同时只有一个补充任务）"""
+        key = self.make_key(age, rules)
+        task = self._refill_tasks.get(key)
+        if task is not None and not task.done():
+            return
+        self._refill_tasks[key] = asyncio.create_task(self._refill(key))
+
+    def warm(self, keys: Iterable[Tuple[int, Optional[list]]]) -> None:
+        """预热指定的 (年龄, 规则) 组合"""
+        for age, rules in keys:
+            self.schedule_refill(age, rules)
+
+    async def _refill(self, key: PoolKey) -> None:
+        age, rules = key
+        rules = list(rules) if rules is not None else None
+        try:
+            while True:
+                pool = self._get_pool(key)
+                missing = self.high_water - len(pool)
+                if missing <= 0:
+                    break
+
+                problems = await self._generator(age, min(missing, self.refill_batch), rules)
+                if not problems:
+                    # 上游没有返回有效题目，等下次取题时再尝试
+                    self._stats['refill_failures'] += 1
+                    logger.warning(f"Word problem pool refill for {key} returned no problems")
+                    break
+
+                self._get_pool(key).extend(problems)
+                self._stats['refills'] += 1
+                logger.debug(f"Refilled pool {key} with {len(problems)} problems")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats['refill_failures'] += 1
+            logger.error(f"Error refilling word problem pool {key}: {e}")
+        finally:
+            self._refill_tasks.pop(key, None)
+
+    def _get_pool(self, key: PoolKey) -> deque:
+        """获取题池，超过键数量上限时淘汰最久未使用的组"""
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = deque()
+            self._pools[key] = pool
+            while len(self._pools) > self.max_keys:
+                evicted_key, _ = self._pools.popitem(last=False)
+                self._stats['evicted_keys'] += 1
+                logger.debug(f"Evicted word problem pool {evicted_key}")
+        else:
+            self._pools.move_to_end(key)
+        return pool
+
+    async def close(self) -> None:
+        """取消所有后台补充任务"""
+        tasks = list(self._refill_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refill_tasks.clear()
+
+    def metrics(self) -> dict:
+        """返回题池状态"""
+        return {
+            **self._stats,
+            'refilling': len(self._refill_tasks),
+            'pools': {
+                f"{age}:{'|'.join(rules) if rules is not None else 'default'}": len(pool)
+                for (age, rules), pool in self._pools.items()
+            }
+        }
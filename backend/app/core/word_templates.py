@@ -0,0 +1,293 @@
+import random
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from .basic_problems import get_difficulty_by_age
+
+# 本地模板应用题：不依赖 Grok，用于即时填充批次以及 Grok 超时或不可用时的后备。
+# 题型、数字范围与 create_word_problem_prompt / validate_problem 的年龄要求一致。
+
+Number = Union[int, float]
+# 模板函数: (随机数生成器, 答案上限, 名字) -> (题目文本, 答案)
+Template = Callable[[random.Random, int, str], Tuple[str, Number]]
+
+_NAMES = [
+    'Ola', 'Kari', 'Emma', 'Noah', 'Nora', 'Jakob', 'Sofie', 'Filip', 'Ingrid', 'Lukas',
+    'Maja', 'Emil', 'Sara', 'Oskar', 'Ella', 'Henrik', 'Olivia', 'Aksel', 'Leah', 'Isak'
+]
+
+# (单数带冠词, 复数)
+_SHOP_ITEMS = [
+    ('et eple', 'epler'), ('en banan', 'bananer'), ('en bok', 'bøker'),
+    ('en blyant', 'blyanter'), ('et viskelær', 'viskelær'), ('en ball', 'baller'),
+    ('en bolle', 'boller'), ('en tegneserie', 'tegneserier'),
+    ('et klistremerke', 'klistremerker'), ('en appelsin', 'appelsiner')
+]
+
+_SHARE_ITEMS = [
+    'kjeks', 'klinkekuler', 'jordbær', 'sjokoladebiter', 'klistremerker',
+    'perler', 'fotballkort', 'drops', 'blyanter', 'rosiner'
+]
+
+_PLACES = [
+    'skolen', 'biblioteket', 'svømmehallen', 'butikken', 'parken',
+    'fotballbanen', 'museet', 'stranda', 'kinoen', 'togstasjonen'
+]
+
+# (不定形式, 确定形式)
+_VEHICLES = [('Et tog', 'toget'), ('En bil', 'bilen'), ('En båt', 'båten'), ('En buss', 'bussen')]
+
+def _fmt(value: Number) -> str:
+    """按挪威习惯格式化数字（小数用逗号）"""
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.2f}".rstrip('0').replace('.', ',')
+
+def _other_name(rng: random.Random, name: str) -> str:
+    other = rng.choice(_NAMES)
+    while other == name:
+        other = rng.choice(_NAMES)
+    return other
+
+# 购物
+def _shopping_total(rng, limit, name):
+    (item1, _), (item2, _) = rng.sample(_SHOP_ITEMS, 2)
+    a = rng.randint(1, limit - 1)
+    b = rng.randint(1, limit - a)
+    return (f"{name} kjøper {item1} til {a} kr og {item2} til {b} kr. "
+            f"Hvor mange kroner betaler {name} til sammen?"), a + b
+
+def _shopping_change(rng, limit, name):
+    item, _ = rng.choice(_SHOP_ITEMS)
+    a = rng.randint(2, limit)
+    b = rng.randint(1, a - 1)
+    return (f"{name} har {a} kr og kjøper {item} til {b} kr. "
+            f"Hvor mange kroner har {name} igjen?"), a - b
+
+def _shopping_multiple(rng, limit, name):
+    _, items = rng.choice(_SHOP_ITEMS)
+    count = rng.randint(2, 10)
+    price = rng.randint(1, max(1, limit // count))
+    return (f"{name} kjøper {count} {items} som koster {price} kr per stykk. "
+            f"Hvor mange kroner koster det til sammen?"), count * price
+
+def _shopping_decimal(rng, limit, name):
+    _, items = rng.choice(_SHOP_ITEMS)
+    count = rng.randint(2, 8)
+    price = rng.randint(10, 250) / 10
+    return (f"{name} kjøper {count} {items} som koster {_fmt(price)} kr per stykk. "
+            f"Hvor mange kroner betaler {name}?"), round(count * price, 2)
+
+# 分东西
+def _sharing_receive(rng, limit, name):
+    items = rng.choice(_SHARE_ITEMS)
+    a = rng.randint(1, limit - 1)
+    b = rng.randint(1, limit - a)
+    return (f"{name} har {a} {items}. {_other_name(rng, name)} gir {name} {b} til. "
+            f"Hvor mange {items} har {name} nå?"), a + b
+
+def _sharing_give(rng, limit, name):
+    items = rng.choice(_SHARE_ITEMS)
+    a = rng.randint(2, limit)
+    b = rng.randint(1, a - 1)
+    return (f"{name} har {a} {items} og gir {b} til {_other_name(rng, name)}. "
+            f"Hvor mange {items} har {name} igjen?"), a - b
+
+def _sharing_groups(rng, limit, name):
+    items = rng.choice(_SHARE_ITEMS)
+    bags = rng.randint(2, 10)
+    each = rng.randint(1, max(1, limit // bags))
+    return (f"{name} har {bags} poser med {each} {items} i hver. "
+            f"Hvor mange {items} har {name} til sammen?"), bags * each
+
+def _sharing_equal(rng, limit, name):
+    items = rng.choice(_SHARE_ITEMS)
+    friends = rng.randint(2, 10)
+    each = rng.randint(1, max(1, limit // friends))
+    return (f"{name} deler {friends * each} {items} likt mellom {friends} venner. "
+            f"Hvor mange {items} får hver venn?"), each
+
+# 时间
+def _time_trip(rng, limit, name):
+    place1, place2 = rng.sample(_PLACES, 2)
+    start = rng.randint(8 * 4, 15 * 4) * 15
+    minutes = rng.randint(1, min(limit, 180) // 5) * 5
+    end = start + minutes
+    return (f"{name} går fra {place1} klokka {start // 60}:{start % 60:02d} og kommer fram til "
+            f"{place2} klokka {end // 60}:{end % 60:02d}. Hvor mange minutter tok turen?"), minutes
+
+def _time_total(rng, limit, name):
+    cap = min(limit, 120)
+    a = rng.randint(5, cap - 5)
+    b = rng.randint(1, cap - a)
+    return (f"{name} bruker {a} minutter på leksene og {b} minutter på å øve piano. "
+            f"Hvor mange minutter bruker {name} til sammen?"), a + b
+
+def _time_hours(rng, limit, name):
+    hours = rng.randint(1, 3)
+    minutes = rng.randint(1, 11) * 5
+    return (f"{name} ser en film som varer i {hours} timer og {minutes} minutter. "
+            f"Hvor mange minutter varer filmen?"), hours * 60 + minutes
+
+# 测量
+def _measure_cut(rng, limit, name):
+    pieces = rng.randint(2, 10)
+    length = rng.randint(2, 80) / 4
+    return (f"Et tau er {_fmt(length * pieces)} meter langt. {name} deler det i {pieces} like lange biter. "
+            f"Hvor mange meter er hver bit?"), length
+
+def _measure_convert(rng, limit, name):
+    cm = rng.randint(101, 999)
+    return (f"{name} har et bånd som er {cm} cm langt. "
+            f"Hvor mange meter er det?"), cm / 100
+
+def _measure_weight(rng, limit, name):
+    grams = rng.choice([250, 500, 750, 1000, 1500, 2000])
+    bags = rng.randint(2, 8)
+    return (f"En pose mel veier {grams} gram. {name} kjøper {bags} slike poser. "
+            f"Hvor mange kilo mel er det til sammen?"), bags * grams / 1000
+
+# 路程与速度
+def _distance(rng, limit, name):
+    vehicle, definite = rng.choice(_VEHICLES)
+    speed = rng.randint(3, 18) * 5
+    hours = rng.randint(2, 5)
+    return (f"{vehicle} kjører med {speed} km/t. "
+            f"Hvor mange kilometer kjører {definite} på {hours} timer?"), speed * hours
+
+def _speed(rng, limit, name):
+    speed = rng.randint(5, 25)
+    hours = rng.randint(2, 6)
+    return (f"{name} sykler {speed * hours} km på {hours} timer. "
+            f"Hvor mange kilometer sykler {name} i timen?"), speed
+
+def _travel_time(rng, limit, name):
+    vehicle, definite = rng.choice(_VEHICLES)
+    speed = rng.randint(4, 20) * 5
+    hours = rng.randint(2, 8)
+    return (f"{vehicle} skal kjøre {speed * hours} km med {speed} km/t. "
+            f"Hvor mange timer bruker {definite}?"), hours
+
+# 排列组合
+def _outfits(rng, limit, name):
+    shirts = rng.randint(2, 8)
+    trousers = rng.randint(2, 8)
+    return (f"{name} har {shirts} t-skjorter og {trousers} bukser. "
+            f"På hvor mange forskjellige måter kan {name} kle seg?"), shirts * trousers
+
+def _menu(rng, limit, name):
+    mains = rng.randint(2, 6)
+    drinks = rng.randint(2, 5)
+    desserts = rng.randint(2, 4)
+    return (f"En kafé har {mains} hovedretter, {drinks} drikker og {desserts} desserter. "
+            f"{name} velger én av hver. Hvor mange forskjellige måltider kan {name} velge?"), mains * drinks * desserts
+
+def _handshakes(rng, limit, name):
+    people = rng.randint(3, 15)
+    return (f"{people} venner møtes, og alle håndhilser på hverandre én gang. "
+            f"Hvor mange håndtrykk blir det?"), people * (people - 1) // 2
+
+def _queue(rng, limit, name):
+    children = rng.randint(3, 6)
+    ways = 1
+    for i in range(2, children + 1):
+        ways *= i
+    return (f"{children} barn skal stille seg på rekke. "
+            f"På hvor mange forskjellige måter kan de stå?"), ways
+
+# 平面几何
+def _rectangle_area(rng, limit, name):
+    length = rng.randint(2, 30)
+    width = rng.randint(2, 30)
+    return (f"{name} har et rektangulært blomsterbed som er {length} m langt og {width} m bredt. "
+            f"Hvor mange kvadratmeter er bedet?"), length * width
+
+def _rectangle_perimeter(rng, limit, name):
+    length = rng.randint(2, 50)
+    width = rng.randint(2, 50)
+    return (f"{name} skal sette gjerde rundt en hage som er {length} m lang og {width} m bred. "
+            f"Hvor mange meter gjerde trengs?"), 2 * (length + width)
+
+def _square_area(rng, limit, name):
+    side = rng.randint(2, 30)
+    return (f"Et kvadratisk teppe har sider på {side} dm. "
+            f"Hvor mange kvadratdesimeter er teppet?"), side * side
+
+def _triangle_area(rng, limit, name):
+    base = rng.randint(2, 30)
+    height = rng.randint(2, 30)
+    return (f"En trekant har grunnlinje {base} cm og høyde {height} cm. "
+            f"Hvor mange kvadratcentimeter er arealet?"), base * height / 2
+
+# 立体体积
+def _box_volume(rng, limit, name):
+    length, width, height = (rng.randint(2, 12) for _ in range(3))
+    return (f"En eske er {length} cm lang, {width} cm bred og {height} cm høy. "
+            f"Hvor mange kubikkcentimeter er volumet?"), length * width * height
+
+def _cube_volume(rng, limit, name):
+    side = rng.randint(2, 10)
+    return (f"{name} har en terning med sider på {side} cm. "
+            f"Hvor mange kubikkcentimeter er volumet?"), side ** 3
+
+def _aquarium(rng, limit, name):
+    length, width, height = rng.randint(3, 15), rng.randint(2, 8), rng.randint(2, 8)
+    return (f"Et akvarium er {length} dm langt, {width} dm bredt og {height} dm høyt. "
+            f"Hvor mange liter vann er det plass til?"), length * width * height
+
+# 各题型的模板: (最小年龄, 模板函数)
+_TEMPLATES: Dict[str, List[Tuple[int, Template]]] = {
+    'shopping': [(6, _shopping_total), (6, _shopping_change), (8, _shopping_multiple), (10, _shopping_decimal)],
+    'sharing': [(6, _sharing_receive), (6, _sharing_give), (8, _sharing_groups), (9, _sharing_equal)],
+    'time': [(9, _time_trip), (9, _time_total), (10, _time_hours)],
+    'measurement': [(10, _measure_cut), (10, _measure_convert), (10, _measure_weight)],
+    'distance_and_speed': [(10, _distance), (10, _speed), (10, _travel_time)],
+    'arrangements_and_combinations': [(10, _outfits), (10, _menu), (10, _handshakes), (10, _queue)],
+    'plane_geometry': [(10, _rectangle_area), (10, _rectangle_perimeter), (10, _square_area), (10, _triangle_area)],
+    'geometric_volume': [(10, _box_volume), (10, _cube_volume), (10, _aquarium)]
+}
+# 模板支持的最小年龄，更小的孩子使用这个年龄的模板
+_MIN_TEMPLATE_AGE = min(min_age for templates in _TEMPLATES.values() for min_age, _ in templates)
+
+def get_word_problem_types(age: int) -> List[str]:
+    """根据年龄返回可用的应用题类型"""
+    if age <= 8:
+        return ['shopping', 'sharing']
+    if age == 9:
+        return ['shopping', 'sharing', 'time']
+    return list(_TEMPLATES)
+
+def _answer_limit(age: int) -> int:
+    """根据年龄返回答案上限"""
+    if age <= 6:
+        return 20
+    if age <= 9:
+        return 100
+    return 1000
+
+def generate_word_problem(age: int, rng: Optional[random.Random] = None) -> dict:
+    """
+    用本地模板生成一道应用题
+
+    参数:
+        age (int): 学生年龄
+        rng (random.Random, optional): 随机数生成器，默认使用 random 模块
+
+    返回:
+        dict: 与 Grok 生成的应用题格式相同的题目
+    """
+    rng = rng or random
+    template_age = max(age, _MIN_TEMPLATE_AGE)
+    sub_type = rng.choice(get_word_problem_types(template_age))
+    template = rng.choice([fn for min_age, fn in _TEMPLATES[sub_type] if template_age >= min_age])
+    question, answer = template(rng, _answer_limit(template_age), rng.choice(_NAMES))
+    return {
+        "question": question,
+        "answer": round(float(answer), 2),
+        "type": "word_problem",
+        "sub_type": sub_type,
+        "difficulty": get_difficulty_by_age(age),
+        "age": age
+    }
+
+def generate_word_problems(age: int, count: int, rng: Optional[random.Random] = None) -> List[dict]:
+    """用本地模板生成 count 道应用题（可能含重复，由调用方去重）"""
+    return [generate_word_problem(age, rng) for _ in range(count)]
@@ -1,19 +1,13 @@
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
-from ..core.config import settings
+from jose import JWTError
+from ..core.token_cache import decode_token
 
 security = HTTPBearer()
 
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        token = credentials.credentials
-        payload = jwt.decode(
-            token, 
-            settings.SECRET_KEY, 
-            algorithms=[settings.ALGORITHM]
-        )
-        return payload
+        return decode_token(credentials.credentials)
     except JWTError:
         raise HTTPException(
             status_code=401,
@@ -42,12 +36,7 @@ class AuthMiddleware:
                 )
                 
             token = auth.split(' ')[1]
-            payload = jwt.decode(
-                token, 
-                settings.SECRET_KEY, 
-                algorithms=[settings.ALGORITHM]
-            )
-            request.state.user = payload
+            request.state.user = decode_token(token)
             
         except JWTError:
             raise HTTPException(
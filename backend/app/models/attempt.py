@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Index
+from datetime import datetime
+from .user import Base
+
+# 答题记录表（由 AttemptWriter 批量写入）
+class Attempt(Base):
+    __tablename__ = "attempts"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False)
+    batch_id = Column(String, nullable=False)
+    problem_id = Column(Integer, nullable=False)
+    problem_type = Column(String, nullable=False)  # basic / word_problem
+    sub_type = Column(String, nullable=True)  # 应用题类型
+    knowledge_point = Column(String, nullable=False)  # MathKnowledgePoints 的值
+    answer = Column(String, nullable=False)  # 学生提交的原始答案
+    correct = Column(Boolean, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_attempts_user_created", "user_id", "created_at"),
+    )
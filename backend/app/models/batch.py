@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean
+from datetime import datetime
+from .user import Base
+
+# 题目批次表（多进程共享批次存储使用）
+class ProblemBatch(Base):
+    __tablename__ = "problem_batches"
+
+    batch_id = Column(String, primary_key=True)
+    owner = Column(String, nullable=False, index=True)  # 创建批次的用户名
+    problem_count = Column(Integer, nullable=False, default=0)  # 已分配的题目ID
+    completed = Column(Boolean, nullable=False, default=False)  # 后台生成是否已结束
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_access = Column(DateTime, default=datetime.utcnow, index=True)
+
+# 批次题目表
+class BatchProblem(Base):
+    __tablename__ = "batch_problems"
+
+    batch_id = Column(String, primary_key=True)
+    problem_id = Column(Integer, primary_key=True)
+    data = Column(Text, nullable=False)  # 题目内容（JSON）
+    graded = Column(Boolean, nullable=False, default=False)  # 是否已记录过答题结果
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Text, DateTime
+from datetime import datetime
+from .user import Base
+
+# 题目解释缓存表（按规范化请求的哈希存储）
+class ExplanationCacheEntry(Base):
+    __tablename__ = "explanation_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 十六进制
+    payload = Column(Text, nullable=False)  # 解释内容（JSON）
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
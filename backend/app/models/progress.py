@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime
+from datetime import datetime
+from .user import Base
+
+# 每个学生每个知识点每天的答题汇总（随答题记录增量更新）
+class ProgressDaily(Base):
+    __tablename__ = "progress_daily"
+
+    user_id = Column(Integer, primary_key=True)
+    knowledge_point = Column(String, primary_key=True)  # MathKnowledgePoints 的值
+    day = Column(Date, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+
+# 家长-孩子关联表
+class ParentChild(Base):
+    __tablename__ = "parent_children"
+
+    parent_id = Column(Integer, primary_key=True)
+    child_id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -10,6 +10,27 @@ class UserType(str, enum.Enum):
     PARENT = "parent"
     ADMIN = "admin"
 
+class MathKnowledgePoints(str, enum.Enum):
+    """数学知识点"""
+    ADDITION_BASIC = "addition_basic"  # 加法
+    SUBTRACTION_BASIC = "subtraction_basic"  # 减法
+    MULTIPLICATION_BASIC = "multiplication_basic"  # 乘法
+    DIVISION_BASIC = "division_basic"  # 除法
+    FRACTION_CONCEPT = "fraction_concept"  # 分数
+    DECIMAL_CONCEPT = "decimal_concept"  # 小数
+    SHAPES_2D = "shapes_2d"  # 平面图形
+    PERIMETER = "perimeter"  # 周长
+    AREA = "area"  # 面积
+    VOLUME = "volume"  # 体积
+    SIMPLE_EQUATIONS = "simple_equations"  # 简单方程
+    VARIABLES = "variables"  # 变量
+    NUMBER_SEQUENCE = "number_sequence"  # 数列
+    PLACE_VALUE = "place_value"  # 数位
+    TIME = "time"  # 时间
+    MEASUREMENT = "measurement"  # 测量
+    SPEED_DISTANCE = "speed_distance"  # 路程与速度
+    COMBINATIONS = "combinations"  # 排列组合
+
 class User(Base):
     __tablename__ = "users"
 
@@ -1,16 +1,39 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import education, auth
+from app.api import education, auth, metrics, progress
 from app.middleware.auth import AuthMiddleware
 from app.core.config import settings
+from app.core.grok_client import grok_client
+from app.core.security import shutdown_password_executor
+from app.core.database import shutdown_db_executor
+from app.core.attempt_writer import attempt_writer
 from dotenv import load_dotenv
 import logging
 
 # 加载环境变量
 load_dotenv()
 
-app = FastAPI(title="AI Utdanningsassistent for Barn")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享资源，关闭时释放"""
+    await grok_client.start()
+    await attempt_writer.start()
+    if settings.WORD_POOL_WARM_ON_STARTUP:
+        await education.warm_word_problem_pool()
+    try:
+        yield
+    finally:
+        await education.word_problem_batcher.close()
+        await education.word_problem_pool.close()
+        await grok_client.close()
+        # 先写完剩余答题记录，再关闭数据库线程池
+        await attempt_writer.close()
+        shutdown_password_executor()
+        shutdown_db_executor()
+
+app = FastAPI(title="AI Utdanningsassistent for Barn", lifespan=lifespan)
 
 # 配置CORS
 origins = settings.CORS_ORIGINS.split(',')
@@ -31,6 +54,8 @@ app.middleware("http")(AuthMiddleware())
 # 添加路由
 app.include_router(auth.router, prefix="/api", tags=["auth"])
 app.include_router(education.router, prefix="/api/education", tags=["education"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
+app.include_router(progress.router, prefix="/api", tags=["progress"])
 
 # 设置特定模块的日志级别
 logging.getLogger("passlib").setLevel(logging.ERROR)
@@ -0,0 +1,123 @@
+"""
+认证开销基准测试
+
+通过 TestClient 发出完整的受保护请求：AuthMiddleware 验证令牌并写入
+request.state.user，路由依赖 get_current_user 复用该结果并按用户名查询用户。
+对比关闭令牌缓存和用户缓存（每个请求都做签名验证并查询用户表）与开启缓存时
+的单次请求耗时，模拟一个孩子在一次练习中用同一个令牌发出大量请求的场景。
+
+数据库固定使用临时 SQLite 文件，不会连接 .env 中配置的数据库；
+其他配置仍从 .env 读取。
+
+用法（在 backend 目录下，需要可用的 .env）:
+    python scripts/bench_auth.py [--requests 5000] [--users 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+# 必须在导入 app 之前设置，app.core.database 会在导入时建表
+_tmp_dir = tempfile.mkdtemp(prefix='bench-auth-')
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmp_dir}/bench.db'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app.api.auth import create_access_token, get_current_user  # noqa: E402
+from app.core.database import SessionLocal  # noqa: E402
+from app.core.token_cache import token_cache  # noqa: E402
+from app.core.user_cache import user_cache  # noqa: E402
+from app.middleware.auth import AuthMiddleware  # noqa: E402
+from app.models.user import User, UserType  # noqa: E402
+
+def create_app() -> FastAPI:
+    # 与 main.py 相同的中间件注册方式，只保留一个受保护路由
+    app = FastAPI()
+    app.middleware("http")(AuthMiddleware())
+
+    @app.get("/api/bench")
+    async def bench(current_user: User = Depends(get_current_user)):
+        return {"id": current_user.id}
+
+    return app
+
+def create_users(count: int) -> list:
+    db = SessionLocal()
+    try:
+        users = [
+            User(
+                username=f"bench-user-{i}",
+                email=f"bench-user-{i}@example.com",
+                hashed_password="x",
+                role=UserType.STUDENT
+            )
+            for i in range(count)
+        ]
+        db.add_all(users)
+        db.commit()
+        return [user.username for user in users]
+    finally:
+        db.close()
+
+def make_headers(username: str) -> dict:
+    token = create_access_token(
+        data={"sub": username, "role": UserType.STUDENT.value},
+        expires_delta=timedelta(minutes=30)
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+def set_caching(enabled: bool, token_ttl: float, user_ttl: float) -> None:
+    # TTL 为 0 时两个缓存都不会写入条目
+    token_cache.clear()
+    user_cache.clear()
+    token_cache.ttl_seconds = token_ttl if enabled else 0
+    user_cache.ttl_seconds = user_ttl if enabled else 0
+
+def hit_rate(cache, before: dict) -> str:
+    # 只统计缓存阶段的命中情况
+    after = cache.metrics()
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    return f"{hits} hits, {misses} misses, {after['entries']} entries"
+
+def run(label: str, client: TestClient, headers: list, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get("/api/bench", headers=headers[i % len(headers)])
+        if response.status_code != 200:
+            raise RuntimeError(f"Request failed: {response.status_code} {response.text}")
+    elapsed = time.perf_counter() - start
+    per_request_us = elapsed / requests * 1e6
+    print(f"{label:<12} {requests} requests in {elapsed:.3f}s, {per_request_us:.1f} us/request")
+    return per_request_us
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request auth overhead")
+    parser.add_argument("--requests", type=int, default=5000, help="number of authenticated requests")
+    parser.add_argument("--users", type=int, default=50, help="number of distinct users and tokens")
+    args = parser.parse_args()
+
+    headers = [make_headers(username) for username in create_users(args.users)]
+    token_ttl, user_ttl = token_cache.ttl_seconds, user_cache.ttl_seconds
+
+    with TestClient(create_app()) as client:
+        # 预热，避免首个请求的启动开销计入结果
+        run("warmup", client, headers, min(args.requests, 200))
+
+        set_caching(False, token_ttl, user_ttl)
+        before = run("uncached", client, headers, args.requests)
+
+        set_caching(True, token_ttl, user_ttl)
+        token_before, user_before = token_cache.metrics(), user_cache.metrics()
+        after = run("cached", client, headers, args.requests)
+
+    print(f"speedup      {before / after:.1f}x")
+    print(f"token cache  {hit_rate(token_cache, token_before)}")
+    print(f"user cache   {hit_rate(user_cache, user_before)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+# 测试在导入 app 之前设置必需的环境变量，数据库使用临时 SQLite 文件
+_tmp_dir = tempfile.mkdtemp(prefix='kids-tests-')
+_defaults = {
+    'DATABASE_URL': f'sqlite:///{_tmp_dir}/test.db',
+    'SECRET_KEY': 'test-secret',
+    'ALGORITHM': 'HS256',
+    'ACCESS_TOKEN_EXPIRE_MINUTES': '60',
+    'CORS_ORIGINS': 'http://localhost:3000',
+    'GROK_API_KEY': 'xai-test',
+    'GROK_API_BASE': 'http://127.0.0.1:9/v1/chat/completions',
+    'LOG_LEVEL': 'WARNING',
+    'LOG_FILE': f'{_tmp_dir}/app.log',
+    'LOG_MAX_SIZE': '1048576',
+    'LOG_BACKUP_COUNT': '1',
+    'LOG_FORMAT': '%(levelname)s %(message)s'
+}
+for name, value in _defaults.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
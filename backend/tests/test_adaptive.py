@@ -0,0 +1,115 @@
+import asyncio
+import math
+import pytest
+from app.core import adaptive
+from app.core.adaptive import MAX_LEVEL, MIN_LEVEL, SkillModel, level_rating
+
+def run(coro):
+    return asyncio.run(coro)
+
+def make_model(**overrides):
+    options = {'k_factor': 32.0, 'max_users': 100}
+    options.update(overrides)
+    return SkillModel(**options)
+
+# ---- Elo 更新 ----
+
+def test_expected_score():
+    assert SkillModel.expected_score(1000, 1000) == pytest.approx(0.5)
+    assert SkillModel.expected_score(1400, 1000) == pytest.approx(10 / 11)
+    assert SkillModel.expected_score(1000, 1400) == pytest.approx(1 / 11)
+
+def test_update_moves_rating_by_surprise():
+    model = make_model()
+    # 能力分等于难度分时，答对加 k/2，答错减 k/2
+    assert model.update(1, 'addition_basic', 8, True) == pytest.approx(level_rating(8) + 16)
+    assert model.update(2, 'addition_basic', 8, False) == pytest.approx(level_rating(8) - 16)
+
+def test_expected_results_change_little():
+    model = make_model()
+    for _ in range(20):
+        model.update(1, 'addition_basic', 6, True)
+    before = model.rating(1, 'addition_basic', 6)
+    # 答对一道远低于能力的题几乎不加分，答错则扣分较多
+    gain = model.update(1, 'addition_basic', 6, True) - before
+    loss = before + gain - model.update(1, 'addition_basic', 6, False)
+    assert 0 < gain < loss
+
+def test_rating_defaults_to_age_level():
+    model = make_model()
+    assert model.rating(1, 'addition_basic', 9) == level_rating(9)
+    model.update(1, 'addition_basic', 9, True)
+    assert model.rating(1, 'subtraction_basic', 9) == level_rating(9)
+
+def test_least_recent_user_is_evicted():
+    model = make_model(max_users=2)
+    model.update(1, 'addition_basic', 8, True)
+    model.update(2, 'addition_basic', 8, True)
+    model.update(1, 'addition_basic', 8, True)
+    model.update(3, 'addition_basic', 8, True)
+    assert model.rating(2, 'addition_basic', 8) == level_rating(8)
+    assert model.rating(1, 'addition_basic', 8) != level_rating(8)
+    assert model.metrics()['evicted_users'] == 1
+
+# ---- 等级选择 ----
+
+def set_skill(model, user_id, level):
+    model._ratings[user_id] = {'addition_basic': level_rating(level), 'subtraction_basic': level_rating(level)}
+
+@pytest.mark.parametrize('age, skill_level, expected', [
+    (8, 8, 8),
+    (8, 9, 9),
+    # 最多比实际年龄高或低一级
+    (8, 12, 9),
+    (8, 3, 7),
+    # 不超出题目生成支持的等级范围
+    (MIN_LEVEL, 2, MIN_LEVEL),
+    (MAX_LEVEL, 20, MAX_LEVEL),
+    (MAX_LEVEL + 2, 20, MAX_LEVEL)
+])
+def test_choose_level_is_clamped(age, skill_level, expected):
+    model = make_model()
+    set_skill(model, 1, skill_level)
+    assert model.choose_level(1, age) == expected
+
+def test_operation_weights_favor_weak_points():
+    model = make_model()
+    model._ratings[1] = {'addition_basic': level_rating(8) + 100, 'subtraction_basic': level_rating(8) - 200}
+    weights = model.operation_weights(1, 8, ['+', '-', '*'])
+    assert weights == {'+': 1.0, '-': 2.0, '*': 1.0}
+
+# ---- 初始化 ----
+
+def fake_accuracy(monkeypatch, rows, gate=None):
+    async def fetch(func, user_id, since):
+        if gate is not None:
+            await gate.wait()
+        return rows
+    monkeypatch.setattr(adaptive, 'run_in_db', fetch)
+
+def test_new_user_is_seeded_from_recent_accuracy(monkeypatch):
+    async def scenario():
+        fake_accuracy(monkeypatch, [('addition_basic', 8, 8), ('subtraction_basic', 8, 0)])
+        model = make_model()
+        # 初始化完成前按实际年龄出题
+        assert model.choose_level(1, 8) == 8
+        await asyncio.sleep(0.01)
+        assert model.rating(1, 'addition_basic', 8) == pytest.approx(level_rating(8) + 400 * math.log10(9))
+        assert model.rating(1, 'subtraction_basic', 8) == pytest.approx(level_rating(8) - 400 * math.log10(9))
+        assert model.metrics()['seeded_users'] == 1
+        assert model.metrics()['seeding'] == 0
+    run(scenario())
+
+def test_live_updates_win_over_seeding(monkeypatch):
+    async def scenario():
+        gate = asyncio.Event()
+        fake_accuracy(monkeypatch, [('addition_basic', 10, 0)], gate)
+        model = make_model()
+        model.ensure_seeded(1, 8)
+        await asyncio.sleep(0)
+        live = model.update(1, 'addition_basic', 8, True)
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert model.rating(1, 'addition_basic', 8) == live
+        assert model.metrics()['seeded_users'] == 0
+    run(scenario())
@@ -0,0 +1,105 @@
+from fractions import Fraction
+import pytest
+from app.core.answers import check_answer, format_answer, make_answer_key, parse_answer
+
+@pytest.mark.parametrize('value, expected', [
+    # 整数
+    ('5', Fraction(5)),
+    (' 5 ', Fraction(5)),
+    ('-3', Fraction(-3)),
+    ('+3', Fraction(3)),
+    ('\u22122', Fraction(-2)),
+    (7, Fraction(7)),
+    # 小数（点或逗号）
+    ('0.5', Fraction(1, 2)),
+    ('0,5', Fraction(1, 2)),
+    ('3,25', Fraction(13, 4)),
+    (',5', Fraction(1, 2)),
+    ('3.', Fraction(3)),
+    (0.1, Fraction(1, 10)),
+    (2.5, Fraction(5, 2)),
+    # 分数
+    ('1/2', Fraction(1, 2)),
+    ('1 / 2', Fraction(1, 2)),
+    ('-3/4', Fraction(-3, 4)),
+    ('4/2', Fraction(2)),
+    ('1/0', None),
+    # 带分数
+    ('1 1/2', Fraction(3, 2)),
+    ('  2   3/4 ', Fraction(11, 4)),
+    ('-1 1/2', Fraction(-3, 2)),
+    ('1\u00a01/2', Fraction(3, 2)),
+    ('1 1/0', None),
+    # 无法解析
+    ('', None),
+    ('   ', None),
+    ('abc', None),
+    ('1,2,3', None),
+    ('1.5.2', None),
+    ('1/2/3', None),
+    ('1 000', None),
+    (True, None),
+    (float('nan'), None),
+    (float('inf'), None)
+])
+def test_parse_answer(value, expected):
+    assert parse_answer(value) == expected
+
+@pytest.mark.parametrize('answer, kind, value', [
+    (5, 'integer', '5'),
+    (5.0, 'integer', '5'),
+    ('0.5', 'decimal', '1/2'),
+    (0.3333, 'fraction', '1/3'),
+    (0.6667, 'fraction', '2/3'),
+    ('1/3', 'fraction', '1/3'),
+    (2.75, 'decimal', '11/4')
+])
+def test_make_answer_key(answer, kind, value):
+    key = make_answer_key(answer)
+    assert key['kind'] == kind
+    assert key['value'] == value
+
+def test_make_answer_key_rejects_invalid_answer():
+    with pytest.raises(ValueError):
+        make_answer_key('ukjent')
+
+@pytest.mark.parametrize('answer, user_answer, expected', [
+    # 整数按精确值比较
+    (5, '5', True),
+    (5, '5.0', True),
+    (5, '5,0', True),
+    (5, ' 5 ', True),
+    (5, '10/2', True),
+    (5, '5,001', False),
+    (5, '4', False),
+    # 小数可以用分数、带分数或逗号回答
+    (2.5, '2,5', True),
+    (2.5, '5/2', True),
+    (2.5, '2 1/2', True),
+    (2.5, '2.50', True),
+    (2.5, '2.6', False),
+    (0.5, '1/2', True),
+    (0.5, '0,5', True),
+    # 模型给出的近似分数，允许四舍五入到两位小数
+    (0.3333, '1/3', True),
+    (0.3333, '0,33', True),
+    (0.3333, '0.333', True),
+    (0.3333, '0,3', False),
+    (1.5, '1 1/2', True),
+    (-1.5, '-1 1/2', True),
+    # 无法解析的答案不算对也不算错
+    (5, 'fem', None),
+    (5, '', None),
+    (0.5, '1/0', None)
+])
+def test_check_answer(answer, user_answer, expected):
+    assert check_answer(make_answer_key(answer), user_answer) is expected
+
+@pytest.mark.parametrize('answer, text', [
+    (5, '5'),
+    (0.3333, '1/3'),
+    (2.5, '2.5'),
+    (0.125, '0.125')
+])
+def test_format_answer(answer, text):
+    assert format_answer(make_answer_key(answer)) == text
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+from sqlalchemy import create_engine
+from app.core.attempt_writer import AttemptWriter
+
+def run(coro):
+    return asyncio.run(coro)
+
+def make_writer(**overrides):
+    options = {
+        'max_queue': 100,
+        'batch_size': 100,
+        'flush_interval': 10.0,
+        'enqueue_timeout': 0.05
+    }
+    options.update(overrides)
+    writer = AttemptWriter(engine=create_engine('sqlite://'), **options)
+    batches = []
+    # 不写数据库，只记录每次批量写入的内容
+    writer._insert = lambda rows: batches.append(list(rows))
+    return writer, batches
+
+def attempt(i):
+    return {'user_id': 1, 'problem_id': i, 'correct': True}
+
+async def wait_until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    end = loop.time() + timeout
+    while not condition():
+        assert loop.time() < end, 'condition not met in time'
+        await asyncio.sleep(0.005)
+
+def test_flush_when_batch_is_full():
+    async def scenario():
+        writer, batches = make_writer(batch_size=3)
+        await writer.start()
+        for i in range(3):
+            assert await writer.record(attempt(i))
+        # 凑满一批后立即写入，不等 flush_interval
+        await wait_until(lambda: batches)
+        assert [[row['problem_id'] for row in batch] for batch in batches] == [[0, 1, 2]]
+        await writer.close()
+    run(scenario())
+
+def test_flush_after_interval():
+    async def scenario():
+        writer, batches = make_writer(flush_interval=0.05)
+        await writer.start()
+        await writer.record(attempt(1))
+        await writer.record(attempt(2))
+        await asyncio.sleep(0.01)
+        assert batches == []
+        await wait_until(lambda: batches)
+        assert len(batches[0]) == 2
+        assert writer.metrics()['written'] == 2
+        await writer.close()
+    run(scenario())
+
+def test_full_queue_drops_after_enqueue_timeout():
+    async def scenario():
+        writer, batches = make_writer(max_queue=1, batch_size=1)
+        release = threading.Event()
+        # 数据库写入卡住，后台任务取出一条后不再消费
+        writer._insert = lambda rows: (release.wait(5), batches.append(list(rows)))
+        await writer.start()
+
+        assert await writer.record(attempt(1))
+        await wait_until(lambda: writer.metrics()['queue_depth'] == 0)
+        assert await writer.record(attempt(2))
+        assert not await writer.record(attempt(3))
+
+        metrics = writer.metrics()
+        assert metrics['dropped'] == 1
+        assert metrics['backpressure_waits'] == 1
+
+        release.set()
+        await writer.close()
+        assert sorted(row['problem_id'] for batch in batches for row in batch) == [1, 2]
+    run(scenario())
+
+def test_full_queue_waits_for_space():
+    async def scenario():
+        writer, batches = make_writer(max_queue=1, batch_size=1, enqueue_timeout=2.0)
+        release = threading.Event()
+        writer._insert = lambda rows: (release.wait(5), batches.append(list(rows)))
+        await writer.start()
+
+        await writer.record(attempt(1))
+        await wait_until(lambda: writer.metrics()['queue_depth'] == 0)
+        await writer.record(attempt(2))
+        pending = asyncio.ensure_future(writer.record(attempt(3)))
+        await asyncio.sleep(0.02)
+        assert not pending.done()
+
+        # 数据库恢复后等待中的记录进入队列
+        release.set()
+        assert await pending
+        await writer.close()
+        assert writer.metrics()['written'] == 3
+    run(scenario())
+
+def test_close_drains_queue():
+    async def scenario():
+        writer, batches = make_writer(batch_size=2)
+        await writer.start()
+        for i in range(5):
+            await writer.record(attempt(i))
+        await writer.close()
+
+        written = [row['problem_id'] for batch in batches for row in batch]
+        assert sorted(written) == [0, 1, 2, 3, 4]
+        assert all(len(batch) <= 2 for batch in batches)
+        assert writer.metrics()['queue_depth'] == 0
+    run(scenario())
+
+def test_close_writes_rows_taken_before_cancel():
+    async def scenario():
+        writer, batches = make_writer(batch_size=10)
+        await writer.start()
+        await writer.record(attempt(1))
+        # 后台任务已取出记录、正在等待凑批时关闭
+        await wait_until(lambda: writer.metrics()['queue_depth'] == 0)
+        await writer.close()
+        assert [[row['problem_id'] for row in batch] for batch in batches] == [[1]]
+        assert 'created_at' in batches[0][0]
+    run(scenario())
+
+def test_record_before_start_is_dropped():
+    async def scenario():
+        writer, batches = make_writer()
+        assert not await writer.record(attempt(1))
+        assert writer.metrics()['dropped'] == 1
+    run(scenario())
+
+def test_failed_insert_is_counted():
+    async def scenario():
+        writer, _ = make_writer(batch_size=1)
+
+        def fail(rows):
+            raise RuntimeError('database is down')
+
+        writer._insert = fail
+        await writer.start()
+        await writer.record(attempt(1))
+        await wait_until(lambda: writer.metrics()['failed'] == 1)
+        await writer.close()
+    run(scenario())
+
+def test_record_many_enqueues_all():
+    async def scenario():
+        writer, batches = make_writer(batch_size=10)
+        await writer.start()
+        assert await writer.record_many([attempt(i) for i in range(4)]) == 4
+        await writer.close()
+        assert [[row['problem_id'] for row in batch] for batch in batches] == [[0, 1, 2, 3]]
+        # 同一批记录使用相同的时间
+        assert len({row['created_at'] for row in batches[0]}) == 1
+    run(scenario())
+
+def test_record_many_waits_once_then_drops_the_rest():
+    async def scenario():
+        writer, batches = make_writer(max_queue=2, batch_size=1, enqueue_timeout=0.05)
+        release = threading.Event()
+        writer._insert = lambda rows: (release.wait(5), batches.append(list(rows)))
+        await writer.start()
+        await writer.record(attempt(0))
+        await wait_until(lambda: writer.metrics()['queue_depth'] == 0)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await writer.record_many([attempt(i) for i in range(1, 11)]) == 2
+        # 整批只等待一次 enqueue_timeout
+        assert loop.time() - started < 0.5
+        metrics = writer.metrics()
+        assert metrics['dropped'] == 8
+        assert metrics['backpressure_waits'] == 1
+
+        release.set()
+        await writer.close()
+        assert sorted(row['problem_id'] for batch in batches for row in batch) == [0, 1, 2]
+    run(scenario())
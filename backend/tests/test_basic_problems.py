@@ -0,0 +1,68 @@
+from collections import Counter
+import numpy as np
+import pytest
+from app.core.basic_problems import generate_basic_problems, get_basic_settings
+
+SYMBOL_OPS = {'+': '+', '-': '-', '×': '*', '÷': '/'}
+
+def parse(problem):
+    a, symbol, b, _, _ = problem['question'].split()
+    return int(a), symbol, int(b)
+
+@pytest.mark.parametrize('age', [6, 7, 8, 10, 12])
+def test_problems_are_correct_for_age(age):
+    max_num, operations = get_basic_settings(age)
+    problems = generate_basic_problems(age, 300, start_id=5, rng=np.random.default_rng(age))
+    assert [p['id'] for p in problems] == list(range(5, 305))
+    for problem in problems:
+        a, symbol, b = parse(problem)
+        assert SYMBOL_OPS[symbol] in operations or symbol == '÷'
+        if symbol == '+':
+            assert problem['answer'] == a + b
+        elif symbol == '-':
+            assert problem['answer'] == a - b >= 0
+        elif symbol == '×':
+            assert problem['answer'] == a * b
+            assert a <= 10 and b <= 10
+        elif 'fraction' in operations:
+            # 11 岁以上的除法包括分数和小数答案
+            assert problem['answer'] == pytest.approx(a / b)
+        else:
+            # 除法结果为整数
+            assert problem['answer'] == a / b == a // b
+        assert max(a, b) <= max(max_num, 100)
+        assert problem['type'] == 'basic'
+        assert problem['age'] == age
+
+def test_problems_are_unique():
+    problems = generate_basic_problems(8, 500, rng=np.random.default_rng(1))
+    assert len({p['question'] for p in problems}) == 500
+
+def test_small_problem_space_allows_repeats():
+    # 6 岁只有 20 以内的加减法，不同题目的数量有限
+    problems = generate_basic_problems(6, 2000, rng=np.random.default_rng(2))
+    assert len(problems) == 2000
+    unique = {p['question'] for p in problems}
+    assert 500 < len(unique) < 2000
+    # 不同的题目排在重复的题目之前
+    assert len({p['question'] for p in problems[:len(unique)]}) == len(unique)
+
+def test_weights_shift_operation_mix():
+    # 乘法只有 10 × 10 种题目，权重测试只比较加减法
+    problems = generate_basic_problems(8, 1000, rng=np.random.default_rng(3), weights={'+': 1.0, '-': 3.0, '*': 0.0})
+    counts = Counter(parse(p)[1] for p in problems)
+    assert 0.7 < counts['-'] / 1000 < 0.8
+    assert counts['×'] == 0
+
+def test_default_mix_is_uniform():
+    problems = generate_basic_problems(7, 1000, rng=np.random.default_rng(4))
+    counts = Counter(parse(p)[1] for p in problems)
+    assert 0.45 < counts['+'] / 1000 < 0.55
+
+def test_same_seed_same_problems():
+    first = generate_basic_problems(10, 50, rng=np.random.default_rng(5))
+    second = generate_basic_problems(10, 50, rng=np.random.default_rng(5))
+    assert first == second
+
+def test_zero_count():
+    assert generate_basic_problems(8, 0) == []
@@ -0,0 +1,263 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, update
+from app.core import batch_store as batch_store_module
+from app.core.batch_store import DatabaseBatchStore, InMemoryBatchStore
+from app.models.batch import ProblemBatch
+
+def run(coro):
+    return asyncio.run(coro)
+
+def memory_store(**overrides):
+    options = {'ttl_seconds': 60, 'max_batches': 10, 'max_bytes': 10 ** 6, 'max_per_user': 5}
+    options.update(overrides)
+    return InMemoryBatchStore(**options)
+
+def database_store(tmp_path, **overrides):
+    options = {'ttl_seconds': 60, 'max_batches': 10, 'max_per_user': 5}
+    options.update(overrides)
+    return DatabaseBatchStore(create_engine(f'sqlite:///{tmp_path}/batches.db'), **options)
+
+def problem(answer=1):
+    return {'question': f'{answer} = ?', 'answer': answer, 'type': 'basic'}
+
+async def fill(store, batch_id, count, owner='kid'):
+    await store.create(batch_id, owner)
+    for i in range(count):
+        await store.add_problem(batch_id, problem(i))
+
+# ---- 已批改标记 ----
+
+def check_mark_graded(store):
+    async def scenario():
+        await fill(store, 'b', 3)
+        assert await store.mark_graded('b', [1, 2, 2, 9]) == [1, 2]
+        assert await store.mark_graded('b', [2, 3]) == [3]
+        assert await store.mark_graded('b', [1, 2, 3]) == []
+        assert await store.mark_graded('missing', [1]) == []
+    run(scenario())
+
+def test_memory_mark_graded():
+    check_mark_graded(memory_store())
+
+def test_database_mark_graded(tmp_path):
+    check_mark_graded(database_store(tmp_path))
+
+# ---- 进程内存储的淘汰 ----
+
+class FakeTime:
+    """只替换 batch_store 模块中的 time，不影响事件循环"""
+    now = 1000.0
+
+    @classmethod
+    def monotonic(cls):
+        return cls.now
+
+def test_ids_are_sequential_and_answer_keys_precomputed():
+    async def scenario():
+        store = memory_store()
+        await fill(store, 'b', 3)
+        problems = await store.list_problems('b')
+        assert [p['id'] for p in problems] == [1, 2, 3]
+        assert all(p['batch_id'] == 'b' for p in problems)
+        assert problems[2]['answer_key']['value'] == '2'
+        assert await store.get_problem('b', 4) is None
+        assert await store.add_problem('missing', problem()) is None
+    run(scenario())
+
+def test_idle_batches_expire(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(batch_store_module, 'time', FakeTime)
+        store = memory_store(ttl_seconds=60)
+        await fill(store, 'old', 1)
+        FakeTime.now += 30
+        await fill(store, 'new', 1)
+        FakeTime.now += 40
+        # old 已空闲 70 秒，new 只有 40 秒
+        assert not await store.exists('old')
+        assert await store.get_problem('old', 1) is None
+        assert await store.get_problem('new', 1) is not None
+        assert (await store.metrics())['evictions']['expired'] == 1
+    run(scenario())
+
+def test_least_recently_used_batch_is_evicted():
+    async def scenario():
+        store = memory_store(max_batches=2)
+        await fill(store, 'a', 1, owner='u1')
+        await fill(store, 'b', 1, owner='u2')
+        # 访问 a 后，b 成为最久未使用的批次
+        await store.get_problem('a', 1)
+        await fill(store, 'c', 1, owner='u3')
+        assert await store.exists('a')
+        assert not await store.exists('b')
+        assert (await store.metrics())['evictions']['lru'] == 1
+    run(scenario())
+
+def test_per_user_limit_evicts_that_users_oldest_batch():
+    async def scenario():
+        store = memory_store(max_per_user=2)
+        await fill(store, 'a1', 1, owner='a')
+        await fill(store, 'b1', 1, owner='b')
+        await fill(store, 'a2', 1, owner='a')
+        await fill(store, 'a3', 1, owner='a')
+        assert [await store.exists(b) for b in ('a1', 'a2', 'a3', 'b1')] == [False, True, True, True]
+        metrics = await store.metrics()
+        assert metrics['evictions']['per_user'] == 1
+        assert metrics['users'] == 2
+    run(scenario())
+
+def test_memory_budget_evicts_other_batches_first():
+    async def scenario():
+        store = memory_store(max_bytes=4000)
+        await fill(store, 'a', 2, owner='u1')
+        await fill(store, 'b', 2, owner='u2')
+        before = (await store.metrics())['estimated_bytes']
+        assert before <= 4000
+        # 正在写入的批次超出预算时，先淘汰其他批次
+        await fill(store, 'c', 6, owner='u3')
+        metrics = await store.metrics()
+        assert metrics['evictions']['memory'] == 2
+        assert await store.exists('c')
+        assert len(await store.list_problems('c')) == 6
+        assert metrics['estimated_bytes'] <= store.max_bytes
+        assert metrics['batches'] == 1
+    run(scenario())
+
+# ---- 数据库存储 ----
+
+def set_last_access(store, batch_id, seconds_ago):
+    with store.engine.begin() as conn:
+        conn.execute(
+            update(ProblemBatch)
+            .where(ProblemBatch.batch_id == batch_id)
+            .values(last_access=datetime.utcnow() - timedelta(seconds=seconds_ago))
+        )
+
+def test_database_ids_are_unique_across_workers(tmp_path):
+    async def scenario():
+        first = database_store(tmp_path)
+        # 另一个 worker 使用同一个数据库
+        second = DatabaseBatchStore(first.engine, ttl_seconds=60, max_batches=10, max_per_user=5)
+        await first.create('b', 'kid')
+        ids = await asyncio.gather(*[
+            store.add_problem('b', problem(i))
+            for i in range(10)
+            for store in (first, second)
+        ])
+        assert sorted(ids) == list(range(1, 21))
+        problems = await second.list_problems('b')
+        assert [p['id'] for p in problems] == list(range(1, 21))
+        # 答案键随题目一起保存
+        assert all('answer_key' in p for p in problems)
+    run(scenario())
+
+def test_database_round_trip(tmp_path):
+    async def scenario():
+        store = database_store(tmp_path)
+        await fill(store, 'b', 2)
+        assert await store.exists('b')
+        assert (await store.get_problem('b', 2))['question'] == '1 = ?'
+        assert await store.get_problem('b', 3) is None
+        assert await store.list_problems('missing') is None
+        assert await store.add_problem('missing', problem()) is None
+    run(scenario())
+
+def test_database_expired_batch_is_gone(tmp_path):
+    async def scenario():
+        store = database_store(tmp_path, ttl_seconds=60)
+        await fill(store, 'old', 1)
+        set_last_access(store, 'old', 120)
+        assert not await store.exists('old')
+        assert await store.get_problem('old', 1) is None
+        assert await store.add_problem('old', problem()) is None
+        # 下一次创建批次时删除过期批次
+        await store.create('new', 'kid')
+        metrics = await store.metrics()
+        assert metrics['batches'] == 1
+        assert metrics['evictions']['expired'] == 1
+    run(scenario())
+
+def test_database_limits(tmp_path):
+    async def scenario():
+        store = database_store(tmp_path, max_batches=3, max_per_user=2)
+        await fill(store, 'a1', 1, owner='a')
+        set_last_access(store, 'a1', 30)
+        await fill(store, 'a2', 1, owner='a')
+        # 单用户上限：淘汰该用户最久未访问的批次
+        await fill(store, 'a3', 1, owner='a')
+        assert [await store.exists(b) for b in ('a1', 'a2', 'a3')] == [False, True, True]
+
+        set_last_access(store, 'a2', 20)
+        await fill(store, 'b1', 1, owner='b')
+        # 全局上限：淘汰最久未访问的批次
+        await fill(store, 'c1', 1, owner='c')
+        assert not await store.exists('a2')
+        metrics = await store.metrics()
+        assert metrics['batches'] == 3
+        assert metrics['evictions'] == {'expired': 0, 'lru': 1, 'per_user': 1}
+    run(scenario())
+
+# ---- 等待新题目 ----
+
+def test_waiter_wakes_when_problem_is_added():
+    async def scenario():
+        store = memory_store()
+        await fill(store, 'b', 1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        waiter = asyncio.ensure_future(store.wait_for_problems('b', 1, timeout=5))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await store.add_problem('b', problem(7))
+        problems, completed = await asyncio.wait_for(waiter, 1)
+        assert [p['id'] for p in problems] == [2]
+        assert not completed
+        assert loop.time() - started < 1
+    run(scenario())
+
+def test_waiter_wakes_when_batch_completes():
+    async def scenario():
+        store = memory_store()
+        await fill(store, 'b', 2)
+        waiter = asyncio.ensure_future(store.wait_for_problems('b', 2, timeout=5))
+        await asyncio.sleep(0.01)
+        await store.mark_complete('b')
+        assert await asyncio.wait_for(waiter, 1) == ([], True)
+        # 已有的题目直接返回，不等待
+        problems, completed = await store.wait_for_problems('b', 0, timeout=5)
+        assert [p['id'] for p in problems] == [1, 2]
+        assert completed
+    run(scenario())
+
+def test_wait_times_out_and_sees_eviction():
+    async def scenario():
+        store = memory_store(max_batches=1)
+        await fill(store, 'b', 1)
+        assert await store.wait_for_problems('b', 1, timeout=0.02) == ([], False)
+
+        waiter = asyncio.ensure_future(store.wait_for_problems('b', 1, timeout=5))
+        await asyncio.sleep(0.01)
+        # 等待期间批次被淘汰
+        await store.create('other', 'kid2')
+        assert await asyncio.wait_for(waiter, 1) is None
+        assert await store.wait_for_problems('missing', 0, timeout=1) is None
+    run(scenario())
+
+def test_database_waiter_sees_other_workers_problems(tmp_path, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(DatabaseBatchStore, '_POLL_INTERVAL', 0.01)
+        reader = database_store(tmp_path)
+        writer = DatabaseBatchStore(reader.engine, ttl_seconds=60, max_batches=10, max_per_user=5)
+        await fill(writer, 'b', 1)
+        waiter = asyncio.ensure_future(reader.wait_for_problems('b', 1, timeout=5))
+        await asyncio.sleep(0.03)
+        assert not waiter.done()
+        await writer.add_problem('b', problem(7))
+        problems, completed = await asyncio.wait_for(waiter, 1)
+        assert [p['id'] for p in problems] == [2]
+        assert not completed
+
+        await writer.mark_complete('b')
+        assert await reader.wait_for_problems('b', 2, timeout=5) == ([], True)
+        assert await reader.wait_for_problems('missing', 0, timeout=1) is None
+    run(scenario())
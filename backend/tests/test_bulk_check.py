@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import education
+from app.api.auth import get_current_user
+from app.core.batch_store import InMemoryBatchStore
+from app.core.config import settings
+from app.models.user import User, UserType
+
+class FakeWriter:
+    def __init__(self):
+        self.calls = []
+
+    async def record(self, attempt):
+        self.calls.append([attempt])
+        return True
+
+    async def record_many(self, attempts):
+        self.calls.append(list(attempts))
+        return len(attempts)
+
+@pytest.fixture
+def env(monkeypatch):
+    store = InMemoryBatchStore(ttl_seconds=60, max_batches=10, max_bytes=10 ** 6, max_per_user=5)
+    writer = FakeWriter()
+    recorded = []
+    monkeypatch.setattr(education, 'batch_store', store)
+    monkeypatch.setattr(education, 'attempt_writer', writer)
+    monkeypatch.setattr(education, 'record_answer', lambda user, problem, correct: recorded.append((problem['id'], correct)))
+
+    async def setup():
+        await store.create('b1', 'kid')
+        for answer in (5, 0.5, 7):
+            await store.add_problem('b1', {'question': 'q', 'answer': answer, 'type': 'basic'})
+    asyncio.run(setup())
+
+    app = FastAPI()
+    app.include_router(education.router, prefix="/api/education")
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, username='kid', role=UserType.STUDENT, age=8)
+    return TestClient(app), writer, recorded
+
+def bulk(client, answers, batch_id='b1'):
+    return client.post('/api/education/math/check/bulk', json={
+        'batch_id': batch_id,
+        'answers': [{'problem_id': problem_id, 'answer': answer} for problem_id, answer in answers]
+    })
+
+def test_summary_counts(env):
+    client, writer, recorded = env
+    response = bulk(client, [(1, '5'), (2, '1/2'), (3, '8'), (4, '1'), (1, '6'), (3, 'sju')])
+    assert response.status_code == 200
+    body = response.json()
+    # 重复的题目只批改第一个答案
+    assert [r['problem_id'] for r in body['results']] == [1, 2, 3, 4]
+    assert [r['correct'] for r in body['results']] == [True, True, False, None]
+    assert body['results'][3]['feedback'] == 'Problem not found'
+    assert body['summary'] == {'total': 4, 'correct': 2, 'incorrect': 1, 'invalid': 1, 'score': 50.0}
+
+    # 所有记录一次性写入队列
+    assert len(writer.calls) == 1
+    assert [(a['problem_id'], a['correct']) for a in writer.calls[0]] == [(1, True), (2, True), (3, False)]
+    assert recorded == [(1, True), (2, True), (3, False)]
+
+def test_unparseable_answer_is_invalid_and_not_recorded(env):
+    client, writer, recorded = env
+    body = bulk(client, [(1, 'fem'), (2, '0,5')]).json()
+    assert body['summary']['invalid'] == 1
+    assert body['summary']['correct'] == 1
+    assert [a['problem_id'] for a in writer.calls[0]] == [2]
+    assert recorded == [(2, True)]
+
+def test_problems_already_graded_are_not_recorded_again(env):
+    client, writer, recorded = env
+    response = client.post('/api/education/math/check', json={'batch_id': 'b1', 'problem_id': 1, 'answer': '5'})
+    assert response.status_code == 200
+    assert recorded == [(1, True)]
+
+    body = bulk(client, [(1, '5'), (2, '1/2')]).json()
+    # 结果照常返回
+    assert body['summary']['correct'] == 2
+    assert recorded == [(1, True), (2, True)]
+    assert [a['problem_id'] for a in writer.calls[-1]] == [2]
+
+    # 再次提交整批时没有新的记录
+    bulk(client, [(1, '5'), (2, '1/2')])
+    assert writer.calls[-1] == []
+    assert len(recorded) == 2
+
+def test_too_many_answers_is_rejected(env, monkeypatch):
+    client, writer, _ = env
+    monkeypatch.setattr(settings, 'BULK_CHECK_MAX_ANSWERS', 3)
+    response = bulk(client, [(1, '5')] * 4)
+    assert response.status_code == 400
+    assert 'maks 3' in response.json()['detail']
+    assert writer.calls == []
+    assert bulk(client, [(1, '5')] * 3).status_code == 200
+
+def test_unknown_batch(env):
+    client, _, _ = env
+    assert bulk(client, [(1, '5')], batch_id='missing').status_code == 404
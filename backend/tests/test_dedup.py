@@ -0,0 +1,121 @@
+from app.core.dedup import ProblemDeduplicator, ProblemHistory, RollingBloomFilter, question_hash
+from app.core.word_problem_pool import WordProblemPool
+
+def problem(i, kind='q'):
+    return {'question': f'{kind} {i} + {i} = ?', 'answer': 2 * i, 'type': 'basic'}
+
+async def no_generator(age, count, rules):
+    return []
+
+def make_pool(problems, rules=None):
+    # low_water=0：测试中不触发后台补充
+    pool = WordProblemPool(no_generator, low_water=0, high_water=1000, refill_batch=10, max_keys=10)
+    pool.put(8, rules, problems)
+    return pool
+
+# ---- 滚动布隆过滤器 ----
+
+def test_no_false_negatives_across_rotations():
+    """轮换多次后，最近 capacity 个元素始终能查到"""
+    capacity = 50
+    bloom = RollingBloomFilter(capacity, 0.01)
+    digests = [question_hash(f'question {i}') for i in range(capacity * 12)]
+    for i, digest in enumerate(digests):
+        bloom.add(digest)
+        recent = digests[max(0, i + 1 - capacity):i + 1]
+        assert all(d in bloom for d in recent), i
+
+def test_old_generations_are_forgotten():
+    capacity = 50
+    bloom = RollingBloomFilter(capacity, 0.001)
+    old = [question_hash(f'old {i}') for i in range(capacity)]
+    for digest in old:
+        bloom.add(digest)
+    for i in range(capacity * 3):
+        bloom.add(question_hash(f'new {i}'))
+    # 已经过了两代，只剩误判
+    assert sum(d in bloom for d in old) <= 2
+
+def test_false_positive_rate_is_bounded():
+    capacity = 1000
+    bloom = RollingBloomFilter(capacity, 0.01)
+    for i in range(capacity):
+        bloom.add(question_hash(f'member {i}'))
+    false_positives = sum(question_hash(f'other {i}') in bloom for i in range(5000))
+    # 两代位数组合计，误判率最多约为单代的两倍
+    assert false_positives / 5000 < 0.03
+
+def test_memory_is_fixed():
+    bloom = RollingBloomFilter(100, 0.01)
+    size = bloom.nbytes
+    for i in range(1000):
+        bloom.add(question_hash(str(i)))
+    assert bloom.nbytes == size
+
+def test_question_hash_normalizes_whitespace_and_case():
+    assert question_hash('  Hva er 2 +\n 3? ') == question_hash('hva er 2 + 3?')
+    assert question_hash('hva er 2 + 3?') != question_hash('hva er 2 + 4?')
+
+# ---- 用户历史 ----
+
+def test_history_evicts_least_recent_user():
+    history = ProblemHistory(max_users=2, capacity=10, error_rate=0.01)
+    digest = question_hash('x')
+    history.add('a', [digest])
+    history.add('b', [digest])
+    history.add('a', [digest])
+    history.add('c', [digest])
+    assert history.seen('a', digest)
+    assert not history.seen('b', digest)
+    assert history.metrics()['evicted_users'] == 1
+
+# ---- 批次去重 ----
+
+def test_select_skips_batch_duplicates_and_prefers_fresh():
+    history = ProblemHistory(max_users=10, capacity=100, error_rate=0.001)
+    history.add('kid', [question_hash(problem(1)['question'])])
+    dedup = ProblemDeduplicator(history, 'kid')
+    assert dedup.claim(problem(2))
+
+    candidates = [problem(1), problem(2), problem(3), problem(3), problem(4)]
+    selected = dedup.select(candidates, 3)
+    # 2 已在批次中，3 在候选中重复；做过的 1 排在新题之后
+    assert [p['question'] for p in selected] == [problem(3)['question'], problem(4)['question'], problem(1)['question']]
+
+def test_select_never_repeats_within_batch():
+    dedup = ProblemDeduplicator(ProblemHistory(10, 100, 0.001), None)
+    selected = dedup.select([problem(1)] * 5 + [problem(2)], 5)
+    assert len(selected) == 2
+
+def test_selected_problems_are_recorded_in_history():
+    history = ProblemHistory(max_users=10, capacity=100, error_rate=0.001)
+    ProblemDeduplicator(history, 'kid').select([problem(1)], 1)
+    assert not ProblemDeduplicator(history, 'kid').is_new(problem(1))
+    assert ProblemDeduplicator(history, 'other').is_new(problem(1))
+
+def test_take_with_accept_leaves_rejected_problems_in_pool():
+    dedup = ProblemDeduplicator(ProblemHistory(10, 100, 0.001), 'kid')
+    dedup.claim(problem(1))
+    dedup.claim(problem(3))
+    pool = make_pool([problem(i) for i in range(1, 7)])
+
+    taken = pool.take(8, None, 2, accept=dedup.claim)
+    assert [p['question'] for p in taken] == [problem(2)['question'], problem(4)['question']]
+    # 被拒绝的题目按原顺序留在池中
+    rest = pool.take(8, None, 10)
+    assert [p['question'] for p in rest] == [problem(i)['question'] for i in (1, 3, 5, 6)]
+
+def test_take_with_accept_returns_copies():
+    source = problem(1)
+    pool = make_pool([source])
+    dedup = ProblemDeduplicator(ProblemHistory(10, 100, 0.001), None)
+    taken = pool.take(8, None, 1, accept=dedup.claim)
+    taken[0]['id'] = 99
+    assert 'id' not in source
+
+def test_take_counts_misses_when_pool_is_short():
+    pool = make_pool([problem(1)])
+    assert len(pool.take(8, None, 3)) == 1
+    metrics = pool.metrics()
+    assert metrics['hits'] == 1
+    assert metrics['misses'] == 2
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, select, update
+from app.core.explanation_cache import ExplanationCache, make_explanation_key
+from app.models.cache import ExplanationCacheEntry
+
+def run(coro):
+    return asyncio.run(coro)
+
+def make_cache(tmp_path, **overrides):
+    options = {'max_entries': 10, 'ttl_seconds': 3600}
+    options.update(overrides)
+    engine = create_engine(f'sqlite:///{tmp_path}/cache.db')
+    return ExplanationCache(engine=engine, **options), engine
+
+def age_rows(engine, seconds, key=None):
+    statement = update(ExplanationCacheEntry).values(created_at=datetime.utcnow() - timedelta(seconds=seconds))
+    if key is not None:
+        statement = statement.where(ExplanationCacheEntry.key == key)
+    with engine.begin() as conn:
+        conn.execute(statement)
+
+def row_count(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(ExplanationCacheEntry)).scalar()
+
+def test_key_ignores_formatting():
+    assert make_explanation_key('Hva er  2+3?', 5, 'basic', 8) == make_explanation_key(' hva er 2+3? ', 5.0, 'Basic', 8)
+    assert make_explanation_key('Hva er 2+3?', 5, 'basic', 8) != make_explanation_key('Hva er 2+3?', 5, 'basic', 9)
+
+def test_persistent_hit_fills_memory(tmp_path):
+    async def scenario():
+        cache, engine = make_cache(tmp_path)
+        await cache.set('k', {'text': 'forklaring'})
+        # 新进程只有数据库中的数据
+        fresh = ExplanationCache(max_entries=10, ttl_seconds=3600, engine=engine)
+        assert await fresh.get('k') == {'text': 'forklaring'}
+        assert await fresh.get('k') == {'text': 'forklaring'}
+        metrics = fresh.metrics()
+        assert metrics['persistent_hits'] == 1
+        assert metrics['memory_hits'] == 1
+    run(scenario())
+
+def test_expired_row_is_deleted_on_read(tmp_path):
+    async def scenario():
+        cache, engine = make_cache(tmp_path)
+        await cache.set('k', {'text': 'gammel'})
+        age_rows(engine, 7200)
+        fresh = ExplanationCache(max_entries=10, ttl_seconds=3600, engine=engine)
+        assert await fresh.get('k') is None
+        metrics = fresh.metrics()
+        assert metrics['expired'] == 1
+        assert metrics['misses'] == 1
+        assert row_count(engine) == 0
+    run(scenario())
+
+def test_set_purges_expired_rows_once_per_interval(tmp_path):
+    async def scenario():
+        cache, engine = make_cache(tmp_path)
+        for key in ('a', 'b', 'c'):
+            await cache.set(key, {'text': key})
+        age_rows(engine, 7200, 'a')
+        age_rows(engine, 7200, 'b')
+
+        # 第一次写入时已经清理过，间隔内不再清理
+        await cache.set('d', {'text': 'd'})
+        assert row_count(engine) == 4
+
+        cache._next_purge = 0.0
+        await cache.set('e', {'text': 'e'})
+        assert row_count(engine) == 3
+        assert cache.metrics()['purged'] == 2
+    run(scenario())
+
+def test_memory_is_bounded_and_expires(tmp_path):
+    async def scenario():
+        cache = ExplanationCache(max_entries=2, ttl_seconds=0)
+        await cache.set('a', {'text': 'a'})
+        assert await cache.get('a') is None
+        assert cache.metrics()['expired'] == 1
+
+        cache.ttl_seconds = 3600
+        for key in ('a', 'b', 'c'):
+            await cache.set(key, {'text': key})
+        assert await cache.get('a') is None
+        assert await cache.get('c') == {'text': 'c'}
+        assert cache.metrics()['memory_entries'] == 2
+    run(scenario())
@@ -0,0 +1,547 @@
+import asyncio
+import json
+import time
+import pytest
+from app.core import grok_client as grok_module
+from app.core.grok_client import (
+    CircuitBreaker,
+    GrokAPIError,
+    GrokClient,
+    GrokScheduler,
+    GrokUnavailableError,
+    RequestPriority
+)
+from app.core.llm_usage import estimate_tokens
+
+OK_BODY = '{"choices": [{"message": {"content": "{\\"problems\\": []}"}}]}'
+
+def run(coro):
+    return asyncio.run(coro)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def client(monkeypatch):
+    client = GrokClient()
+    # 测试中不等待退避时间
+    monkeypatch.setattr(client, '_retry_delay', lambda attempt: 0.0)
+    return client
+
+def make_data(client):
+    return client._build_request('prompt', 1)
+
+# ---- 熔断器 ----
+
+def test_breaker_opens_after_threshold_and_recovers(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # half_open 只放行一个试探请求
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+    assert breaker.metrics()['opened'] == 1
+
+def test_breaker_reopens_when_probe_fails(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_cancelled_probe_releases_half_open_slot(client):
+    async def scenario():
+        client.breaker.record_failure()
+        client.breaker._state = CircuitBreaker.HALF_OPEN
+        started = asyncio.Event()
+
+        async def hang(*args):
+            started.set()
+            await asyncio.sleep(10)
+
+        client._send_hedged = hang
+        task = asyncio.ensure_future(
+            client._generate_content(make_data(client), RequestPriority.BACKGROUND, time.monotonic() + 5, 'test')
+        )
+        await started.wait()
+        assert not client.breaker.allow_request()
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 被取消的试探请求归还名额，下一个请求可以继续试探
+        assert client.breaker.state == CircuitBreaker.HALF_OPEN
+        assert client.breaker.allow_request()
+    run(scenario())
+
+def test_open_breaker_fails_fast(client):
+    async def scenario():
+        client.breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+        client.breaker.record_failure()
+        with pytest.raises(GrokUnavailableError):
+            await client.generate_content('prompt', deadline=time.monotonic() + 1)
+    run(scenario())
+
+# ---- 重试分类 ----
+
+@pytest.mark.parametrize('status, retryable', [
+    (429, True),
+    (500, True),
+    (502, True),
+    (503, True),
+    (400, False),
+    (401, False),
+    (403, False),
+    (404, False),
+    (422, False)
+])
+def test_api_error_retryable(status, retryable):
+    assert GrokAPIError(status, '').retryable is retryable
+
+def scripted_send(responses, calls):
+    async def send(data, priority, timeout, hedge, call_site):
+        calls.append(priority)
+        response = responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+        return response
+    return send
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_retryable_status_is_retried(client, status):
+    async def scenario():
+        calls = []
+        client._send_hedged = scripted_send([(status, 'busy'), (200, OK_BODY)], calls)
+        content = await client._generate_content(
+            make_data(client), RequestPriority.BACKGROUND, time.monotonic() + 5, 'test'
+        )
+        assert content == '{"problems": []}'
+        assert len(calls) == 2
+        assert client.metrics()['retries'] == 1
+    run(scenario())
+
+def test_transient_error_is_retried(client):
+    async def scenario():
+        calls = []
+        client._send_hedged = scripted_send([asyncio.TimeoutError(), (200, OK_BODY)], calls)
+        await client._generate_content(make_data(client), RequestPriority.BACKGROUND, time.monotonic() + 5, 'test')
+        assert len(calls) == 2
+    run(scenario())
+
+@pytest.mark.parametrize('status', [400, 401, 404])
+def test_client_error_is_not_retried(client, status):
+    async def scenario():
+        calls = []
+        client._send_hedged = scripted_send([(status, 'bad request'), (200, OK_BODY)], calls)
+        with pytest.raises(GrokAPIError) as error:
+            await client._generate_content(
+                make_data(client), RequestPriority.BACKGROUND, time.monotonic() + 5, 'test'
+            )
+        assert error.value.status == status
+        assert len(calls) == 1
+        # 请求本身有误不代表上游故障
+        assert client.breaker.metrics()['consecutive_failures'] == 0
+    run(scenario())
+
+def test_retries_stop_at_max_retries(client, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(grok_module.settings, 'GROK_MAX_RETRIES', 2)
+        client.breaker = CircuitBreaker(failure_threshold=100, recovery_timeout=60)
+        calls = []
+        client._send_hedged = scripted_send([(503, 'down')] * 5, calls)
+        with pytest.raises(GrokAPIError):
+            await client._generate_content(
+                make_data(client), RequestPriority.BACKGROUND, time.monotonic() + 5, 'test'
+            )
+        assert len(calls) == 3
+    run(scenario())
+
+# ---- 对冲 ----
+
+def prime_hedge(client, monkeypatch, delay=0.02):
+    """让对冲阈值等于 delay"""
+    monkeypatch.setattr(grok_module.settings, 'GROK_HEDGE_MIN_DELAY', delay)
+    client._latencies[RequestPriority.INTERACTIVE].extend([0.001] * grok_module._HEDGE_MIN_SAMPLES)
+
+def scripted_sends(client, behaviours):
+    """按调用顺序为每次 _send 指定 (延迟, 结果)，记录被取消的调用"""
+    cancelled = []
+    index = iter(range(len(behaviours)))
+
+    async def send(data, priority, call_site):
+        i = next(index)
+        delay, result = behaviours[i]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(i)
+            raise
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    client._send = send
+    return cancelled
+
+def test_hedge_not_sent_when_first_is_fast(client, monkeypatch):
+    async def scenario():
+        prime_hedge(client, monkeypatch, delay=0.2)
+        scripted_sends(client, [(0.0, (200, 'first'))])
+        result = await client._send_hedged({}, RequestPriority.INTERACTIVE, 2, hedge=True)
+        assert result == (200, 'first')
+        assert client.metrics()['hedged'] == 0
+    run(scenario())
+
+def test_hedge_wins_and_slow_request_is_cancelled(client, monkeypatch):
+    async def scenario():
+        prime_hedge(client, monkeypatch)
+        cancelled = scripted_sends(client, [(5, (200, 'first')), (0.0, (200, 'hedge'))])
+        result = await client._send_hedged({}, RequestPriority.INTERACTIVE, 2, hedge=True)
+        assert result == (200, 'hedge')
+        assert cancelled == [0]
+        metrics = client.metrics()
+        assert metrics['hedged'] == 1
+        assert metrics['hedge_wins'] == 1
+    run(scenario())
+
+def test_first_request_wins_over_hedge(client, monkeypatch):
+    async def scenario():
+        prime_hedge(client, monkeypatch)
+        cancelled = scripted_sends(client, [(0.05, (200, 'first')), (5, (200, 'hedge'))])
+        result = await client._send_hedged({}, RequestPriority.INTERACTIVE, 2, hedge=True)
+        assert result == (200, 'first')
+        assert cancelled == [1]
+        assert client.metrics()['hedge_wins'] == 0
+    run(scenario())
+
+def test_failed_response_waits_for_other_request(client, monkeypatch):
+    async def scenario():
+        prime_hedge(client, monkeypatch)
+        scripted_sends(client, [(0.05, (503, 'down')), (0.1, (200, 'hedge'))])
+        result = await client._send_hedged({}, RequestPriority.INTERACTIVE, 2, hedge=True)
+        assert result == (200, 'hedge')
+    run(scenario())
+
+def test_hedged_request_times_out(client, monkeypatch):
+    async def scenario():
+        prime_hedge(client, monkeypatch)
+        cancelled = scripted_sends(client, [(5, (200, 'first')), (5, (200, 'hedge'))])
+        with pytest.raises(asyncio.TimeoutError):
+            await client._send_hedged({}, RequestPriority.INTERACTIVE, 0.1, hedge=True)
+        assert sorted(cancelled) == [0, 1]
+    run(scenario())
+
+class FakeContent:
+    """流式响应：逐行返回 SSE 数据，每行之前等待 line_delay 秒"""
+
+    def __init__(self, lines, line_delay):
+        self.lines = list(lines)
+        self.line_delay = line_delay
+
+    async def readline(self):
+        await asyncio.sleep(self.line_delay)
+        if not self.lines:
+            return b''
+        return (self.lines.pop(0) + '\n').encode('utf-8')
+
+class FakeResponse:
+    def __init__(self, delay, status, body, line_delay=0):
+        self.delay = delay
+        self.status = status
+        self.body = body
+        if isinstance(body, list):
+            self.content = FakeContent(body, line_delay)
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def text(self):
+        return self.body if isinstance(self.body, str) else ''
+
+class FakeSession:
+    """按调用顺序返回 (延迟, 状态码, 响应体)"""
+    closed = False
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.timeouts = []
+
+    def post(self, url, json, timeout=None):
+        self.timeouts.append(timeout)
+        return FakeResponse(*self.responses.pop(0))
+
+def usage_body(prompt_tokens, completion_tokens):
+    return json.dumps({
+        'choices': [{'message': {'content': '{"problems": []}'}}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+    })
+
+def test_cancelled_hedges_do_not_leak_scheduler_slots(client, monkeypatch):
+    """对冲请求在调度器中排队时被取消，不能占住槽位"""
+    async def scenario():
+        prime_hedge(client, monkeypatch)
+        client.scheduler = GrokScheduler(1, 10)
+        client._session = FakeSession([(5, 200, OK_BODY)] * 10)
+        for _ in range(5):
+            with pytest.raises(asyncio.TimeoutError):
+                await client._send_hedged(make_data(client), RequestPriority.INTERACTIVE, 0.05, hedge=True)
+            assert client.scheduler._active == 0
+            assert client.scheduler._waiters == []
+    run(scenario())
+
+# ---- 用量统计 ----
+
+def test_retried_attempts_are_counted(client):
+    async def scenario():
+        client._session = FakeSession([(0, 503, 'down'), (0, 200, usage_body(100, 50))])
+        content = await client._generate_content(
+            make_data(client), RequestPriority.BACKGROUND, time.monotonic() + 5, 'word_problems'
+        )
+        assert content == '{"problems": []}'
+
+        site = client.usage.metrics()['call_sites']['word_problems']
+        assert site['calls'] == 1
+        assert site['attempts'] == 2
+        # 503 不计费
+        assert site['prompt_tokens'] == 100
+        assert site['completion_tokens'] == 50
+    run(scenario())
+
+def test_response_without_usage_is_estimated(client):
+    async def scenario():
+        body = json.dumps({'choices': [{'message': {'content': 'x' * 400}}]})
+        client._session = FakeSession([(0, 200, body)])
+        data = make_data(client)
+        await client._send(data, RequestPriority.BACKGROUND, 'word_problems')
+
+        site = client.usage.metrics()['call_sites']['word_problems']
+        assert site['estimated_attempts'] == 1
+        assert site['prompt_tokens'] == estimate_tokens(data['messages'][0]['content'])
+        assert site['completion_tokens'] == 100
+    run(scenario())
+
+def test_hedge_loser_is_charged(client, monkeypatch):
+    async def scenario():
+        prime_hedge(client, monkeypatch)
+        client._session = FakeSession([(5, 200, usage_body(1, 1)), (0, 200, usage_body(100, 50))])
+        data = make_data(client)
+        status, _ = await client._send_hedged(data, RequestPriority.INTERACTIVE, 2, True, 'explanations')
+        assert status == 200
+
+        site = client.usage.metrics()['call_sites']['explanations']
+        assert site['attempts'] == 2
+        # 被取消的慢请求已经发出，按提示词估算费用
+        assert site['estimated_attempts'] == 1
+        assert site['prompt_tokens'] == 100 + estimate_tokens(data['messages'][0]['content'])
+        assert site['completion_tokens'] == 50
+    run(scenario())
+
+def test_error_responses_are_not_charged(client):
+    async def scenario():
+        client._session = FakeSession([(0, 429, 'slow down'), (0, 500, 'down')])
+        for _ in range(2):
+            await client._send(make_data(client), RequestPriority.BACKGROUND, 'similar_problems')
+        site = client.usage.metrics()['call_sites']['similar_problems']
+        assert site['attempts'] == 2
+        assert site['prompt_tokens'] == 0
+        assert site['cost_usd'] == 0
+    run(scenario())
+
+def test_coalesced_call_is_not_charged(client):
+    async def scenario():
+        client._session = FakeSession([(0.05, 200, usage_body(100, 50))])
+        await asyncio.gather(
+            client.generate_content('prompt', call_site='word_problems'),
+            client.generate_content('prompt', call_site='similar_problems')
+        )
+        sites = client.usage.metrics()['call_sites']
+        assert sites['word_problems']['attempts'] == 1
+        assert sites['word_problems']['prompt_tokens'] == 100
+        assert sites['similar_problems']['coalesced'] == 1
+        assert sites['similar_problems']['attempts'] == 0
+    run(scenario())
+
+def sse(content_parts, usage=None):
+    lines = [
+        'data: ' + json.dumps({'choices': [{'delta': {'content': part}}]})
+        for part in content_parts
+    ]
+    if usage is not None:
+        lines.append('data: ' + json.dumps({'choices': [], 'usage': usage}))
+    return lines + ['data: [DONE]']
+
+STREAM_PARTS = ['{"problems": [{"question": "a", "answer": 1},', ' {"question": "b", "answer": 2}]}']
+
+def test_stream_attempts_are_counted(client):
+    async def scenario():
+        client._session = FakeSession([
+            (0, 503, 'down'),
+            (0, 200, sse(STREAM_PARTS, {'prompt_tokens': 100, 'completion_tokens': 20}))
+        ])
+        stream = client.generate_problems_stream('prompt', 2, call_site='word_problems')
+        problems = [problem async for problem in stream]
+        assert [p['question'] for p in problems] == ['a', 'b']
+        await asyncio.sleep(0)
+
+        site = client.usage.metrics()['call_sites']['word_problems']
+        assert site['calls'] == 1
+        assert site['outcomes'] == {'success': 1}
+        assert site['attempts'] == 2
+        assert site['prompt_tokens'] == 100
+        assert site['completion_tokens'] == 20
+    run(scenario())
+
+def test_stream_closed_early_is_estimated(client):
+    async def scenario():
+        client._session = FakeSession([(0, 200, sse(STREAM_PARTS * 20))])
+        stream = client.generate_problems_stream('prompt', 40, call_site='word_problems')
+        assert (await stream.__anext__())['question'] == 'a'
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+
+        site = client.usage.metrics()['call_sites']['word_problems']
+        assert site['attempts'] == 1
+        assert site['estimated_attempts'] == 1
+        assert site['completion_tokens'] > 0
+    run(scenario())
+
+# ---- 流式请求的截止时间 ----
+
+async def drain(stream):
+    return [problem async for problem in stream]
+
+def test_stream_expired_deadline_sends_nothing(client):
+    async def scenario():
+        client._session = FakeSession([])
+        data = client._build_request('prompt', 2, stream=True)
+        with pytest.raises(asyncio.TimeoutError):
+            await drain(client._stream_problems(data, RequestPriority.BACKGROUND, time.monotonic(), 'word_problems'))
+        assert client.usage.metrics()['call_sites']['word_problems']['attempts'] == 0
+    run(scenario())
+
+def test_stream_does_not_back_off_past_deadline(client, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(client, '_retry_delay', lambda attempt: 1.0)
+        client._session = FakeSession([(0, 503, 'down'), (0, 200, sse(STREAM_PARTS))])
+        data = client._build_request('prompt', 2, stream=True)
+        started = time.monotonic()
+        with pytest.raises(GrokAPIError):
+            await drain(client._stream_problems(data, RequestPriority.BACKGROUND, started + 0.2, 'word_problems'))
+        # 退避会超过截止时间，不再重试
+        assert time.monotonic() - started < 0.5
+        assert len(client._session.responses) == 1
+    run(scenario())
+
+def test_stream_queue_wait_counts_against_deadline(client):
+    async def scenario():
+        client.scheduler = GrokScheduler(1, 10)
+        await client.scheduler.acquire(RequestPriority.INTERACTIVE)
+        client._session = FakeSession([(0, 200, sse(STREAM_PARTS))])
+        data = client._build_request('prompt', 2, stream=True)
+        with pytest.raises(asyncio.TimeoutError):
+            await drain(client._stream_problems(
+                data, RequestPriority.BACKGROUND, time.monotonic() + 0.05, 'word_problems'
+            ))
+        # 超时的请求离开队列，没有发出
+        assert client.scheduler._waiters == []
+        assert client.scheduler._active == 1
+        assert len(client._session.responses) == 1
+    run(scenario())
+
+def test_stream_retries_within_deadline(client):
+    async def scenario():
+        client._session = FakeSession([(0, 503, 'down'), (0, 200, sse(STREAM_PARTS))])
+        stream = client.generate_problems_stream(
+            'prompt', 2, deadline=time.monotonic() + 5, call_site='word_problems'
+        )
+        assert [p['question'] for p in await drain(stream)] == ['a', 'b']
+    run(scenario())
+
+def test_coalesced_stream_subscribers_get_their_own_error(client):
+    async def scenario():
+        client._session = FakeSession([(0.05, 400, 'bad request')])
+        results = await asyncio.gather(
+            drain(client.generate_problems_stream('prompt', 2)),
+            drain(client.generate_problems_stream('prompt', 2)),
+            return_exceptions=True
+        )
+        assert all(isinstance(error, GrokUnavailableError) for error in results)
+        assert results[0] is not results[1]
+        cause = results[0].__cause__
+        assert isinstance(cause, GrokAPIError) and cause.status == 400
+        assert results[1].__cause__ is cause
+        assert client.metrics()['coalesced'] == 1
+    run(scenario())
+
+def test_stream_uses_read_timeout_instead_of_total(client):
+    async def scenario():
+        client._session = FakeSession([(0, 200, sse(STREAM_PARTS))])
+        await drain(client.generate_problems_stream('prompt', 2))
+        timeout = client._session.timeouts[0]
+        assert timeout.total is None
+        assert timeout.sock_read == grok_module.settings.GROK_STREAM_READ_TIMEOUT
+    run(scenario())
+
+def test_slow_stream_is_cut_at_deadline(client):
+    async def scenario():
+        # 每个字符一行、每行间隔 0.05 秒，整个流需要几十秒
+        parts = ['{"problems": [' + ', '.join(['{"question": "q", "answer": 1}'] * 20)] + [']}']
+        client._session = FakeSession([(0, 200, sse(list(parts[0]) + parts[1:]), 0.05)])
+        data = client._build_request('prompt', 20, stream=True)
+        started = time.monotonic()
+        problems = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for problem in client._stream_problems(data, RequestPriority.BACKGROUND, started + 0.3, 'word_problems'):
+                problems.append(problem)
+        assert time.monotonic() - started < 0.6
+        # 上游输出正常，截止时间用完不计为失败
+        assert client.breaker.metrics()['consecutive_failures'] == 0
+    run(scenario())
+
+def test_stream_longer_than_request_timeout_completes(client, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(grok_module.settings, 'GROK_REQUEST_TIMEOUT', 0.1)
+        client._session = FakeSession([(0, 200, sse(STREAM_PARTS * 5), 0.02)])
+        problems = await drain(client.generate_problems_stream(
+            'prompt', 10, deadline=time.monotonic() + 5
+        ))
+        # 整个流超过 GROK_REQUEST_TIMEOUT，仍按调用方的截止时间读完
+        assert len(problems) == 2
+    run(scenario())
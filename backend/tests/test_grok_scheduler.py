@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from app.core.grok_client import GrokQueueFullError, GrokScheduler, RequestPriority
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_release_skips_waiter_cancelled_before_it_runs():
+    """等待者被取消后、还没来得及出队时持有者释放槽位，槽位不能泄漏"""
+    async def scenario():
+        scheduler = GrokScheduler(1, 10)
+        await scheduler.acquire(RequestPriority.INTERACTIVE)
+        waiter = asyncio.ensure_future(scheduler.acquire(RequestPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+        assert len(scheduler._waiters) == 1
+
+        # cancel() 立即取消等待中的 future，release() 在等待者的 except 运行之前执行
+        waiter.cancel()
+        scheduler.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert scheduler._active == 0
+        assert scheduler._waiters == []
+        await asyncio.wait_for(scheduler.acquire(RequestPriority.INTERACTIVE), 1)
+        assert scheduler._active == 1
+    run(scenario())
+
+def test_release_hands_slot_to_next_live_waiter():
+    async def scenario():
+        scheduler = GrokScheduler(1, 10)
+        await scheduler.acquire(RequestPriority.INTERACTIVE)
+        cancelled = asyncio.ensure_future(scheduler.acquire(RequestPriority.INTERACTIVE))
+        live = asyncio.ensure_future(scheduler.acquire(RequestPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        scheduler.release()
+        await asyncio.wait_for(live, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+        assert scheduler._active == 1
+        assert scheduler._waiters == []
+    run(scenario())
+
+def test_cancel_after_slot_granted_returns_slot():
+    async def scenario():
+        scheduler = GrokScheduler(1, 10)
+        await scheduler.acquire(RequestPriority.INTERACTIVE)
+        waiter = asyncio.ensure_future(scheduler.acquire(RequestPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+        # 槽位已经分配给等待者，但等待者在恢复运行前被取消
+        scheduler.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert scheduler._active == 0
+    run(scenario())
+
+def test_waiters_are_served_by_priority():
+    async def scenario():
+        scheduler = GrokScheduler(1, 10)
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.slot(priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire(RequestPriority.INTERACTIVE)
+        tasks = [
+            asyncio.ensure_future(request('background', RequestPriority.BACKGROUND)),
+            asyncio.ensure_future(request('interactive', RequestPriority.INTERACTIVE))
+        ]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+        assert order == ['interactive', 'background']
+        assert scheduler._active == 0
+    run(scenario())
+
+def test_full_queue_rejects():
+    async def scenario():
+        scheduler = GrokScheduler(1, 1)
+        await scheduler.acquire(RequestPriority.INTERACTIVE)
+        waiter = asyncio.ensure_future(scheduler.acquire(RequestPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+        with pytest.raises(GrokQueueFullError):
+            await scheduler.acquire(RequestPriority.BACKGROUND)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+    run(scenario())
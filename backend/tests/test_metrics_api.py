@@ -0,0 +1,31 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import metrics
+from app.api.auth import get_current_user
+from app.models.user import User, UserType
+
+ROUTES = sorted(route.path for route in metrics.router.routes)
+
+def make_client(role):
+    app = FastAPI()
+    app.include_router(metrics.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, username='u', role=role)
+    return TestClient(app)
+
+def test_every_metrics_route_is_listed():
+    assert '/metrics/llm-usage' in ROUTES
+    assert len(ROUTES) == 11
+
+@pytest.mark.parametrize('role', [UserType.STUDENT, UserType.PARENT])
+@pytest.mark.parametrize('path', ROUTES)
+def test_non_admin_is_forbidden(role, path):
+    response = make_client(role).get('/api' + path)
+    assert response.status_code == 403
+
+def test_admin_can_read_metrics():
+    client = make_client(UserType.ADMIN)
+    response = client.get('/api/metrics/llm-usage')
+    assert response.status_code == 200
+    assert 'call_sites' in response.json()
+    assert client.get('/api/metrics/grok').status_code == 200
@@ -0,0 +1,67 @@
+import json
+import pytest
+from app.core.grok_client import ProblemStreamParser
+
+PROBLEMS = [
+    {"question": "Ola har 3 epler og får 2 til. Hvor mange har han?", "answer": 5, "type": "word_problem"},
+    {"question": "Kari sier \"hei\" og deler {12} kaker på 4 venner.", "answer": 3, "type": "word_problem"},
+    {"question": "En sti C:\\mappe\\ og ] og [ og } { i teksten", "answer": 1.5, "type": "word_problem"},
+    {"question": "Slutter med backslash \\", "answer": 0, "sub_type": "time", "meta": {"nested": [1, {"a": "}"}]}},
+    {"question": "Æ, ø og å – «sitater» og \u00e9", "answer": 7, "type": "word_problem"}
+]
+
+DOCUMENTS = [
+    json.dumps({"problems": PROBLEMS}, ensure_ascii=False),
+    json.dumps({"problems": PROBLEMS}, ensure_ascii=True, indent=2),
+    '```json\n' + json.dumps({"note": "x", "problems": PROBLEMS}, ensure_ascii=False) + '\n```',
+    json.dumps({"problems": []})
+]
+
+def parse(parts):
+    parser = ProblemStreamParser()
+    problems = []
+    for part in parts:
+        problems.extend(parser.feed(part))
+    return problems
+
+def expected(document):
+    return json.loads(document.strip('`').replace('json\n', '', 1))['problems']
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_whole_document(document):
+    assert parse([document]) == expected(document)
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_split_at_every_offset(document):
+    """在任意位置切成两段（包括字符串内部、反斜杠之后、字符串中的括号上）结果都一致"""
+    target = expected(document)
+    for offset in range(len(document) + 1):
+        assert parse([document[:offset], document[offset:]]) == target, offset
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_one_character_at_a_time(document):
+    assert parse(list(document)) == expected(document)
+
+def test_split_at_every_pair_of_offsets():
+    document = json.dumps({"problems": PROBLEMS[1:4]}, ensure_ascii=False)
+    target = expected(document)
+    for first in range(0, len(document) + 1, 3):
+        for second in range(first, len(document) + 1, 5):
+            parts = [document[:first], document[first:second], document[second:]]
+            assert parse(parts) == target, (first, second)
+
+def test_problem_returned_as_soon_as_it_closes():
+    parser = ProblemStreamParser()
+    first = json.dumps(PROBLEMS[0], ensure_ascii=False)
+    assert parser.feed('{"problems": [' + first[:-1]) == []
+    assert parser.feed(first[-1] + ', {"question": "') == [PROBLEMS[0]]
+
+def test_text_after_array_is_ignored():
+    parser = ProblemStreamParser()
+    problems = parser.feed('{"problems": [{"answer": 1}]}')
+    assert problems == [{"answer": 1}]
+    assert parser.feed(', "extra": [{"answer": 2}]}') == []
+
+def test_invalid_object_is_skipped():
+    problems = parse(['{"problems": [{"answer": 1,}, {"answer": 2}]}'])
+    assert problems == [{"answer": 2}]
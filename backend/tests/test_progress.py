@@ -0,0 +1,67 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, select
+from app.core.answers import make_answer_key
+from app.core.progress import apply_progress, classify_knowledge_point
+from app.models.progress import ProgressDaily
+
+@pytest.mark.parametrize('problem, point', [
+    ({'type': 'basic', 'question': '3 + 4 = ?', 'answer': 7}, 'addition_basic'),
+    ({'type': 'basic', 'question': '9 - 4 = ?', 'answer': 5}, 'subtraction_basic'),
+    ({'type': 'basic', 'question': '3 × 4 = ?', 'answer': 12}, 'multiplication_basic'),
+    ({'type': 'basic', 'question': '8 ÷ 4 = ?', 'answer': 2}, 'division_basic'),
+    # 分数、小数答案优先
+    ({'type': 'basic', 'question': '1 ÷ 3 = ?', 'answer': 0.3333}, 'fraction_concept'),
+    ({'type': 'basic', 'question': '5 ÷ 2 = ?', 'answer': 2.5}, 'decimal_concept'),
+    ({'type': 'basic', 'question': 'ukjent', 'answer': 1}, 'addition_basic'),
+    ({'type': 'word_problem', 'sub_type': 'time', 'answer': 30}, 'time'),
+    ({'type': 'word_problem', 'sub_type': 'geometric_volume', 'answer': 24}, 'volume'),
+    ({'type': 'word_problem', 'sub_type': 'annet', 'answer': 3}, 'addition_basic')
+])
+def test_classify_knowledge_point(problem, point):
+    problem['answer_key'] = make_answer_key(problem['answer'])
+    assert classify_knowledge_point(problem).value == point
+
+def attempt(user_id, point, correct, day=1):
+    return {'user_id': user_id, 'knowledge_point': point, 'correct': correct, 'created_at': datetime(2026, 3, day, 12)}
+
+def totals(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(select(ProgressDaily)).all()
+    return {(row.user_id, row.knowledge_point, row.day.day): (row.attempts, row.correct) for row in rows}
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/progress.db')
+    ProgressDaily.metadata.create_all(bind=engine, tables=[ProgressDaily.__table__])
+    return engine
+
+def apply(engine, attempts):
+    with engine.begin() as conn:
+        apply_progress(conn, attempts)
+
+def check_aggregation(engine):
+    apply(engine, [
+        attempt(1, 'addition_basic', True),
+        attempt(1, 'addition_basic', False),
+        attempt(1, 'addition_basic', True, day=2),
+        attempt(1, 'time', True),
+        attempt(2, 'addition_basic', True)
+    ])
+    # 第二批累加到已有的行
+    apply(engine, [attempt(1, 'addition_basic', True), attempt(2, 'addition_basic', False)])
+    apply(engine, [])
+    assert totals(engine) == {
+        (1, 'addition_basic', 1): (3, 2),
+        (1, 'addition_basic', 2): (1, 1),
+        (1, 'time', 1): (1, 1),
+        (2, 'addition_basic', 1): (2, 1)
+    }
+
+def test_upsert_aggregates_batches(engine):
+    check_aggregation(engine)
+
+def test_generic_update_then_insert(engine, monkeypatch):
+    # 不支持 ON CONFLICT 的数据库走先更新后插入的路径
+    monkeypatch.setattr(engine.dialect, 'name', 'other')
+    check_aggregation(engine)
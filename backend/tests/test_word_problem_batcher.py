@@ -0,0 +1,195 @@
+import asyncio
+import pytest
+from app.core.word_problem_batcher import WordProblemBatcher, WordProblemBatchError
+
+def run(coro):
+    return asyncio.run(coro)
+
+class FakePool:
+    def __init__(self):
+        self.returned = []
+
+    def put(self, age, rules, problems):
+        self.returned.append((age, rules, [p['n'] for p in problems]))
+        return len(problems)
+
+class FakeGenerator:
+    """记录每次调用的参数；每道题之前可以等待一个事件"""
+
+    def __init__(self, extra=0, gate_after=None, error=None, pace=True):
+        self.calls = []
+        self.extra = extra            # 比请求数量多生成的题数
+        self.gate_after = gate_after  # 生成这么多道题后等待 gate
+        self.gate = asyncio.Event()
+        self.error = error
+        self.pace = pace              # False: 像整批生成一样连续返回，中间不让出事件循环
+        self.produced = 0
+
+    async def __call__(self, age, count, rules, deadline):
+        self.calls.append((age, count, rules))
+        if self.error is not None:
+            raise self.error
+        for _ in range(count + self.extra):
+            if self.gate_after is not None and self.produced == self.gate_after:
+                await self.gate.wait()
+            self.produced += 1
+            yield {'n': self.produced}
+            if self.pace:
+                await asyncio.sleep(0)
+
+def make_batcher(generator, pool=None, window=0.05, max_problems=40):
+    return WordProblemBatcher(generator, pool=pool, window=window, max_problems=max_problems)
+
+async def collect(stream, limit=None):
+    problems = []
+    async for problem in stream:
+        problems.append(problem['n'])
+        if limit is not None and len(problems) >= limit:
+            break
+    await stream.aclose()
+    return problems
+
+def test_demands_in_one_window_share_one_call():
+    async def scenario():
+        generator = FakeGenerator()
+        batcher = make_batcher(generator)
+        results = await asyncio.gather(
+            collect(batcher.stream(8, None, 3)),
+            collect(batcher.stream(8, None, 2)),
+            collect(batcher.stream(8, ['regel'], 1))
+        )
+        assert sorted(generator.calls) == [(8, 1, ['regel']), (8, 5, None)]
+        assert [len(r) for r in results] == [3, 2, 1]
+        # 同一窗口内的批次不会拿到同一道题
+        assert not set(results[0]) & set(results[1])
+        metrics = batcher.metrics()
+        assert metrics['requests'] == 3
+        assert metrics['upstream_calls'] == 2
+    run(scenario())
+
+def test_window_waits_before_flushing():
+    async def scenario():
+        generator = FakeGenerator()
+        batcher = make_batcher(generator, window=0.1)
+        task = asyncio.ensure_future(collect(batcher.stream(8, None, 2)))
+        await asyncio.sleep(0.02)
+        assert generator.calls == []
+        await task
+        assert generator.calls == [(8, 2, None)]
+    run(scenario())
+
+def test_full_window_flushes_immediately():
+    async def scenario():
+        generator = FakeGenerator()
+        batcher = make_batcher(generator, window=10, max_problems=5)
+        results = await asyncio.wait_for(collect(batcher.stream(8, None, 5)), 1)
+        assert results == [1, 2, 3, 4, 5]
+        assert generator.calls == [(8, 5, None)]
+    run(scenario())
+
+def test_demand_that_does_not_fit_starts_new_window():
+    async def scenario():
+        generator = FakeGenerator()
+        batcher = make_batcher(generator, window=0.05, max_problems=5)
+        results = await asyncio.gather(
+            collect(batcher.stream(8, None, 3)),
+            collect(batcher.stream(8, None, 3))
+        )
+        # 第一个窗口装不下第二个需求时立即发出，第二个需求进入新窗口
+        assert generator.calls == [(8, 3, None), (8, 3, None)]
+        assert [len(r) for r in results] == [3, 3]
+    run(scenario())
+
+def test_largest_shortfall_is_served_first():
+    async def scenario():
+        generator = FakeGenerator()
+        batcher = make_batcher(generator)
+        big, small = await asyncio.gather(
+            collect(batcher.stream(8, None, 4)),
+            collect(batcher.stream(8, None, 2))
+        )
+        # 缺口 (4,2) -> 1:big (3,2) -> 2:big (2,2) -> 3:big (1,2) -> 4:small (1,1) -> 5:big -> 6:small
+        assert big == [1, 2, 3, 5]
+        assert small == [4, 6]
+    run(scenario())
+
+def test_leftovers_go_to_pool():
+    async def scenario():
+        generator = FakeGenerator(extra=3, pace=False)
+        pool = FakePool()
+        batcher = make_batcher(generator, pool=pool)
+        await asyncio.gather(
+            collect(batcher.stream(8, ['regel'], 2)),
+            collect(batcher.stream(8, ['regel'], 1))
+        )
+        await asyncio.sleep(0.01)
+        assert pool.returned == [(8, ['regel'], [4, 5, 6])]
+        assert batcher.metrics()['returned_to_pool'] == 3
+    run(scenario())
+
+def test_early_leave_redistributes_queued_problems():
+    async def scenario():
+        generator = FakeGenerator(extra=2, gate_after=3, pace=False)
+        pool = FakePool()
+        batcher = make_batcher(generator, pool=pool)
+        first = batcher.stream(8, None, 3)
+        second = asyncio.ensure_future(collect(batcher.stream(8, None, 3)))
+
+        # 1 -> first, 2 -> second, 3 -> first；first 只取一道题就离开
+        assert (await first.__anext__())['n'] == 1
+        await asyncio.sleep(0.01)
+        await first.aclose()
+
+        # 3 转给 second，继续生成的 4 补满 second，其余 5-8 放回题池
+        generator.gate.set()
+        assert await asyncio.wait_for(second, 1) == [2, 3, 4]
+        await asyncio.sleep(0.01)
+        assert pool.returned == [(8, None, [5, 6, 7, 8])]
+    run(scenario())
+
+def test_early_leave_after_generation_returns_problems_to_pool():
+    async def scenario():
+        generator = FakeGenerator()
+        pool = FakePool()
+        batcher = make_batcher(generator, pool=pool)
+        stream = batcher.stream(8, None, 4)
+        assert (await stream.__anext__())['n'] == 1
+        await asyncio.sleep(0.02)
+        # 生成已经结束，未取走的 2、3、4 放回题池
+        await stream.aclose()
+        assert pool.returned == [(8, None, [2, 3, 4])]
+    run(scenario())
+
+def test_all_demands_leaving_cancels_generation():
+    async def scenario():
+        generator = FakeGenerator(gate_after=1)
+        batcher = make_batcher(generator, pool=FakePool())
+        assert await collect(batcher.stream(8, None, 5), limit=1) == [1]
+        await asyncio.sleep(0.01)
+        assert batcher.metrics()['in_flight'] == 0
+    run(scenario())
+
+def test_each_demand_gets_its_own_error():
+    async def scenario():
+        cause = RuntimeError('upstream failed')
+        batcher = make_batcher(FakeGenerator(error=cause))
+        results = await asyncio.gather(
+            collect(batcher.stream(8, None, 2)),
+            collect(batcher.stream(8, None, 2)),
+            return_exceptions=True
+        )
+        assert all(isinstance(error, WordProblemBatchError) for error in results)
+        assert results[0] is not results[1]
+        assert all(error.__cause__ is cause for error in results)
+    run(scenario())
+
+def test_close_ends_open_windows():
+    async def scenario():
+        generator = FakeGenerator()
+        batcher = make_batcher(generator, window=10)
+        task = asyncio.ensure_future(collect(batcher.stream(8, None, 2)))
+        await asyncio.sleep(0.01)
+        await batcher.close()
+        assert await asyncio.wait_for(task, 1) == []
+        assert generator.calls == []
+    run(scenario())
@@ -0,0 +1,33 @@
+import random
+import pytest
+from app.core.answers import parse_answer
+from app.core.word_templates import _TEMPLATES, generate_word_problem, generate_word_problems, get_word_problem_types
+
+@pytest.mark.parametrize('age', [3, 4, 5, 6, 7, 8, 9, 10, 12, 15, 18])
+def test_every_age_gets_valid_problems(age):
+    rng = random.Random(age)
+    for problem in generate_word_problems(age, 200, rng):
+        assert problem['question']
+        assert parse_answer(problem['answer']) is not None
+        assert problem['answer'] >= 0
+        assert problem['sub_type'] in get_word_problem_types(age)
+        # 题目保留学生的真实年龄
+        assert problem['age'] == age
+
+@pytest.mark.parametrize('age', [3, 5])
+def test_younger_children_use_youngest_templates(age):
+    rng = random.Random(0)
+    problems = generate_word_problems(age, 200, rng)
+    assert {problem['sub_type'] for problem in problems} <= {'shopping', 'sharing'}
+    # 与 6 岁相同的答案上限
+    assert max(problem['answer'] for problem in problems) <= 20
+
+def test_older_children_get_all_types():
+    rng = random.Random(1)
+    sub_types = {generate_word_problem(16, rng)['sub_type'] for _ in range(2000)}
+    assert sub_types == set(_TEMPLATES)
+
+def test_answer_limit_follows_age():
+    rng = random.Random(2)
+    assert max(problem['answer'] for problem in generate_word_problems(6, 500, rng)) <= 20
+    assert max(problem['answer'] for problem in generate_word_problems(9, 500, rng)) <= 100
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { educationService } from '../../services/educationService';
-import { parseFraction, formatAnswer } from '../../utils/mathUtils';
+import { formatAnswer } from '../../utils/mathUtils';
 import Logger from '../../utils/logger';
 
 function MathGame() {
@@ -29,6 +29,7 @@ function MathGame() {
     const [isSpeaking, setIsSpeaking] = useState(false);
     const [customRules, setCustomRules] = useState('');  // 添加新状态
     const [availableRules, setAvailableRules] = useState([]);
+    const [streamFailed, setStreamFailed] = useState(false);  // 推送流失败时回退到轮询
 
     // 添加useEffect来加载规则
     useEffect(() => {
@@ -332,17 +333,17 @@ function MathGame() {
         if (!userAnswer) return;
 
         try {
-            const parsedAnswer = parseFraction(userAnswer);
+            // 原样提交，由后端统一解析逗号小数和分数
             Logger.debug('Submitting answer:', {
                 problemId: currentProblem.id,
                 batchId: localStorage.getItem('currentBatchId'),
-                userAnswer: parsedAnswer,
+                userAnswer,
                 currentProblem
             });
 
             const result = await educationService.checkAnswer(
                 currentProblem.id,
-                parsedAnswer,
+                userAnswer,
                 localStorage.getItem('currentBatchId')  // 确保传递 batchId
             );
 
@@ -554,10 +555,43 @@ function MathGame() {
         }
     }, [problems.length]);
 
-    // 修改轮询效果
+    // 订阅剩余题目的推送流，题目生成后立即显示
+    useEffect(() => {
+        const batchId = localStorage.getItem('currentBatchId');
+        if (!gameStarted || !batchId) {
+            return undefined;
+        }
+
+        setStreamFailed(false);
+        const controller = new AbortController();
+
+        educationService.streamRemainingProblems(batchId, {
+            signal: controller.signal,
+            onProblem: (problem) => {
+                setProblems(prev => {
+                    if (prev.some(p => p.id === problem.id)) {
+                        return prev;
+                    }
+                    return [...prev, problem].sort((a, b) => a.id - b.id);
+                });
+                // 题目ID从1开始连续分配
+                setLoadedCount(prev => Math.max(prev, problem.id));
+            }
+        }).catch(error => {
+            if (controller.signal.aborted) {
+                return;
+            }
+            Logger.error('Problem stream failed, falling back to polling:', error);
+            setStreamFailed(true);
+        });
+
+        return () => controller.abort();
+    }, [gameStarted]);
+
+    // 推送流不可用时回退到轮询
     useEffect(() => {
         let interval;
-        if (gameStarted && problems.length > 0) {
+        if (gameStarted && streamFailed && problems.length > 0) {
             interval = setInterval(fetchRemainingProblems, 2000);
         }
         return () => {
@@ -565,7 +599,7 @@ function MathGame() {
                 clearInterval(interval);
             }
         };
-    }, [gameStarted, problems.length, fetchRemainingProblems]);
+    }, [gameStarted, streamFailed, problems.length, fetchRemainingProblems]);
 
     // 使用 useEffect 监听题目变化
     useEffect(() => {
@@ -182,7 +182,7 @@ export const educationService = {
             
             const response = await axios.post(`${API_URL}/education/math/check`, {
                 problem_id: problemId,
-                answer: parseFloat(answer),
+                answer: String(answer).trim(),
                 batch_id: batchId
             }, {
                 headers: {
@@ -232,6 +232,71 @@ export const educationService = {
         }
     },
 
+    // 订阅批次题目的推送流（Server-Sent Events），每生成一道题推送一次
+    streamRemainingProblems: async (batchId, { onProblem, onComplete, signal, after = 0 }) => {
+        const response = await fetch(
+            `${API_URL}/education/math/problems/${batchId}/stream?after=${after}`,
+            {
+                headers: {
+                    ...getAuthHeader(),
+                    'Accept': 'text/event-stream'
+                },
+                signal
+            }
+        );
+
+        if (!response.ok || !response.body) {
+            throw new Error(`Problem stream failed with status ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                throw new Error('Problem stream closed before completion');
+            }
+
+            buffer += decoder.decode(value, { stream: true });
+
+            // 事件之间以空行分隔
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+
+                if (!data) {
+                    continue;  // 心跳
+                }
+
+                const payload = JSON.parse(data);
+                if (event === 'problem') {
+                    onProblem(payload);
+                } else if (event === 'complete') {
+                    Logger.debug('Problem stream complete:', payload);
+                    if (onComplete) {
+                        onComplete(payload);
+                    }
+                    return;
+                } else {
+                    throw new Error(`Problem stream ended with ${event}: ${data}`);
+                }
+            }
+        }
+    },
+
     getRules: async (age) => {
         try {
             const response = await axios.get(`${API_URL}/education/math/rules/${age}`, {